@@ -0,0 +1,254 @@
+"""
+IDM Traffic Simulator - space-time analysis of recorded runs.
+Bins the trajectories of a recording (.npy directory or the CSV files) into a space-time speed grid,
+detects jam fronts, estimates the propagation speed of stop-and-go waves and their amplitude spectra.
+Recordings are read in chunks of frames, so files larger than the memory can be analysed.
+"""
+
+import argparse
+import csv
+import itertools
+import math
+import os
+
+import numpy
+
+from recorder import Recording, DEF_ROAD_LENGTH
+
+CHUNK_VALUES = 1 << 22      # Vehicle samples read per chunk, the frames per chunk follow from the number of cars
+DEF_CELL_TIME = 1.0         # Time bin of the grid [s]
+DEF_CELL_LENGTH = 10.0      # Space bin of the grid [m], about one car spacing in a jam so jammed cells are not empty
+JAM_RATIO = 0.5             # Cells slower than this fraction of the mean speed of their row are jammed
+DEF_WAVE_LAG = 10.0         # Time lag of the cross-correlation used for the wave speed [s]
+MAX_WAVE_SPEED = 15.0       # Largest wave speed searched for in either direction [m/s]
+MIN_DEVIATION = 0.01        # Speed differences along the ring below this are uniform flow [m/s]
+
+# Kinds of jam fronts, vehicles enter a jam at its upstream front and leave it at the downstream front
+UPSTREAM = 'upstream'
+DOWNSTREAM = 'downstream'
+
+# Read a recording in chunks of frames, yields (time, position, speed) in s, m and m/s
+# A directory with time.npy is a binary recording, otherwise the CSV files written by saveData are read
+def readChunks(path, chunkValues=CHUNK_VALUES):
+    if os.path.exists(os.path.join(path, 'time.npy')):
+        recording = Recording(path)
+        frames = recording.getFrames()
+        chunk = max(1, chunkValues//max(1, recording.pos.shape[1]))
+        for start in range(0, frames, chunk):
+            stop = min(frames, start + chunk)
+            yield (numpy.asarray(recording.time[start:stop], dtype=float),
+                   numpy.asarray(recording.pos[start:stop], dtype=float),
+                   numpy.asarray(recording.speed[start:stop], dtype=float))
+        return
+
+    with open(os.path.join(path, 'pos.csv'), newline='') as fPos, open(os.path.join(path, 'speed.csv'), newline='') as fSpeed:
+        posRows = csv.reader(fPos)
+        speedRows = csv.reader(fSpeed)
+        chunk = None
+        while True:
+            posChunk = list(itertools.islice(posRows, chunk or 1))
+            if not posChunk:
+                break
+            pos = numpy.array(posChunk, dtype=float)
+            speed = numpy.array(list(itertools.islice(speedRows, len(posChunk))), dtype=float)
+            chunk = chunk or max(1, chunkValues//max(1, pos.shape[1] - 1))
+            yield pos[:, 0], pos[:, 1:], speed[:, 1:]
+
+# Road length of a recording [m], CSV files do not store it
+def readRoadLength(path):
+    roadFile = os.path.join(path, 'road.npy')
+    return float(numpy.load(roadFile)[0]) if os.path.exists(roadFile) else DEF_ROAD_LENGTH
+
+# Mean speed in cells of time x position along the ring, filled one chunk of frames at a time.
+# Every sample is binned at once with a single bincount over the flat cell index, rows are added
+# as the recording gets longer, so the grid never needs the whole recording in memory.
+class SpaceTimeGrid:
+    def __init__(self, roadLength, cellTime=DEF_CELL_TIME, cellLength=DEF_CELL_LENGTH):
+        self.roadLength = roadLength
+        self.cellTime = cellTime
+        self.cells = max(1, int(round(roadLength/cellLength)))
+        self.cellLength = roadLength/self.cells     # Whole number of cells around the ring
+        self.start = None
+        self.rows = 0
+        self.sums = numpy.zeros((0, self.cells))
+        self.counts = numpy.zeros((0, self.cells))
+
+    # Add a chunk of frames, position and speed are (frames, cars)
+    def add(self, time, pos, speed):
+        if not len(time):
+            return
+        if self.start is None:
+            self.start = time[0]
+        row = numpy.floor((time - self.start)/self.cellTime).astype(int)
+        col = numpy.floor(numpy.mod(pos, self.roadLength)/self.cellLength).astype(int) % self.cells
+        rows = row[-1] + 1
+        if rows > len(self.sums):
+            grow = max(rows, 2*len(self.sums)) - len(self.sums)
+            self.sums = numpy.concatenate([self.sums, numpy.zeros((grow, self.cells))])
+            self.counts = numpy.concatenate([self.counts, numpy.zeros((grow, self.cells))])
+        self.rows = max(self.rows, rows)
+
+        first = row[0]
+        index = ((row[:, None] - first)*self.cells + col).ravel()
+        size = (rows - first)*self.cells
+        self.sums[first:rows] += numpy.bincount(index, speed.ravel(), size).reshape(-1, self.cells)
+        self.counts[first:rows] += numpy.bincount(index, minlength=size).reshape(-1, self.cells)
+
+    # Mean speed of every cell [m/s], empty cells take the speed of the nearest filled cell upstream
+    def getSpeed(self):
+        counts = self.counts[:self.rows]
+        with numpy.errstate(invalid='ignore'):
+            speed = self.sums[:self.rows]/counts
+        return fillEmpty(speed, counts > 0)
+
+    # Start time of every row and start position of every column
+    def getAxes(self):
+        start = 0 if self.start is None else self.start
+        return start + numpy.arange(self.rows)*self.cellTime, numpy.arange(self.cells)*self.cellLength
+
+# Fill the empty cells of every row with the last filled cell before them around the ring
+def fillEmpty(grid, filled):
+    cells = grid.shape[1]
+    doubled = numpy.concatenate([grid, grid], axis=1)   # Wraps around the ring
+    index = numpy.where(numpy.concatenate([filled, filled], axis=1), numpy.arange(2*cells), -1)
+    index = numpy.maximum.accumulate(index, axis=1)[:, cells:]
+    rows = numpy.arange(len(grid))[:, None]
+    return numpy.where(index >= 0, doubled[rows, numpy.maximum(index, 0)], numpy.nan)
+
+# Jammed cells, the threshold follows the mean speed so dense slow rings are not jammed everywhere
+def findJammed(speed, jamRatio=JAM_RATIO):
+    return speed < jamRatio*speed.mean(axis=1, keepdims=True)
+
+# Jam fronts on the boundaries between free and jammed cells, returns time [s], position [m] and kind of every front
+def findFronts(speed, times, positions, cellLength, jamRatio=JAM_RATIO):
+    jammed = findJammed(speed, jamRatio)
+    ahead = numpy.roll(jammed, -1, axis=1)      # Cell downstream, around the ring
+    fronts = []
+    for kind, mask in [(UPSTREAM, ~jammed & ahead), (DOWNSTREAM, jammed & ~ahead)]:
+        rows, cols = numpy.nonzero(mask)
+        fronts.append((times[rows], numpy.mod(positions[cols] + cellLength, cellLength*len(positions)),
+                       numpy.full(len(rows), kind)))
+    time, position, kind = (numpy.concatenate(column) for column in zip(*fronts))
+    order = numpy.lexsort((position, time))
+    return time[order], position[order], kind[order]
+
+# Propagation speed of the speed pattern along the ring [m/s], negative for waves travelling upstream.
+# The circular cross-correlation of rows lag apart is summed over the whole run with FFTs,
+# its peak (refined by a parabola through the neighbouring cells) is the shift of the pattern.
+def waveSpeed(speed, cellTime, cellLength, lag=DEF_WAVE_LAG, maxSpeed=MAX_WAVE_SPEED):
+    rows = max(1, int(round(lag/cellTime)))
+    if len(speed) <= rows:
+        return numpy.nan
+    deviation = speed - speed.mean(axis=1, keepdims=True)
+    spectrum = numpy.fft.rfft(deviation, axis=1)
+    correlation = numpy.fft.irfft((spectrum[rows:]*numpy.conj(spectrum[:-rows])).sum(axis=0), n=speed.shape[1])
+    if numpy.abs(deviation).max() < MIN_DEVIATION:
+        return numpy.nan    # Uniform flow, no pattern to follow
+
+    cells = speed.shape[1]
+    shifts = numpy.arange(cells)
+    shifts[shifts > cells//2] -= cells      # Signed shift of every lag cell
+    reach = min(cells//2, int(math.ceil(maxSpeed*rows*cellTime/cellLength)))
+    candidates = numpy.flatnonzero(numpy.abs(shifts) <= reach)
+    peak = candidates[numpy.argmax(correlation[candidates])]
+    left, centre, right = correlation[(peak - 1) % cells], correlation[peak], correlation[(peak + 1) % cells]
+    curvature = left - 2*centre + right
+    offset = 0.5*(left - right)/curvature if curvature < 0 else 0
+    return (shifts[peak] + offset)*cellLength/(rows*cellTime)
+
+# Amplitude spectrum of the speed along the ring, averaged over time
+# Returns the mode (waves around the ring), wavelength [m] and speed amplitude [m/s] of every mode
+def spatialSpectrum(speed, roadLength):
+    cells = speed.shape[1]
+    amplitude = numpy.abs(numpy.fft.rfft(speed - speed.mean(axis=1, keepdims=True), axis=1))*2/cells
+    modes = numpy.arange(amplitude.shape[1])
+    with numpy.errstate(divide='ignore'):
+        wavelength = numpy.where(modes > 0, roadLength/numpy.maximum(modes, 1), numpy.inf)
+    return modes[1:], wavelength[1:], amplitude.mean(axis=0)[1:]
+
+# Amplitude spectrum of the speed over time seen at a fixed position, averaged over the ring
+# Returns the frequency [Hz] and speed amplitude [m/s] of every frequency
+def temporalSpectrum(speed, cellTime):
+    rows = speed.shape[0]
+    amplitude = numpy.abs(numpy.fft.rfft(speed - speed.mean(axis=0), axis=0))*2/rows
+    return numpy.fft.rfftfreq(rows, cellTime)[1:], amplitude.mean(axis=1)[1:]
+
+# Analyse a recording, returns the grid and a dictionary with the fronts, wave speed and spectra
+def analyse(path, roadLength=None, cellTime=DEF_CELL_TIME, cellLength=DEF_CELL_LENGTH, jamRatio=JAM_RATIO,
+            lag=DEF_WAVE_LAG, start=0):
+    grid = SpaceTimeGrid(roadLength or readRoadLength(path), cellTime, cellLength)
+    for time, pos, speed in readChunks(path):
+        keep = time >= start
+        grid.add(time[keep], pos[keep], speed[keep])
+
+    speed = grid.getSpeed()
+    times, positions = grid.getAxes()
+    results = {'fronts': findFronts(speed, times, positions, grid.cellLength, jamRatio),
+               'jam_fraction': numpy.mean(findJammed(speed, jamRatio)) if speed.size else numpy.nan,
+               'wave_speed': waveSpeed(speed, cellTime, grid.cellLength, lag),
+               'spatial': spatialSpectrum(speed, grid.roadLength),
+               'temporal': temporalSpectrum(speed, cellTime)}
+    return grid, results
+
+# Write the grid, fronts and spectra into a directory
+def saveResults(grid, results, path):
+    os.makedirs(path, exist_ok=True)
+    times, positions = grid.getAxes()
+    numpy.save(os.path.join(path, 'spacetime.npy'), grid.getSpeed().astype(numpy.float32))
+    numpy.save(os.path.join(path, 'spacetime_axes.npy'), numpy.array([times[0] if len(times) else 0, grid.cellTime, grid.cellLength]))
+
+    with open(os.path.join(path, 'fronts.csv'), 'w', newline='') as f:
+        write = csv.writer(f)
+        write.writerow(['time', 'position', 'kind'])
+        write.writerows(zip(*results['fronts']))
+    with open(os.path.join(path, 'spatial_spectrum.csv'), 'w', newline='') as f:
+        write = csv.writer(f)
+        write.writerow(['mode', 'wavelength', 'amplitude'])
+        write.writerows(zip(*results['spatial']))
+    with open(os.path.join(path, 'temporal_spectrum.csv'), 'w', newline='') as f:
+        write = csv.writer(f)
+        write.writerow(['frequency', 'amplitude'])
+        write.writerows(zip(*results['temporal']))
+
+# Print the main results
+def printResults(grid, results):
+    times, kinds = results['fronts'][0], results['fronts'][2]
+    print("Space-time grid: %d x %d cells of %.1fs x %.1fm" % (grid.rows, grid.cells, grid.cellTime, grid.cellLength))
+    print("Jammed cells: %.1f%%" % (100*results['jam_fraction']))
+    print("Jam fronts: %d upstream, %d downstream" % (numpy.sum(kinds == UPSTREAM), numpy.sum(kinds == DOWNSTREAM)))
+    if len(times):
+        print("Jam fronts present from %.1fs" % times[0])
+    print("Wave speed: %.2f m/s (%.1f km/h)" % (results['wave_speed'], 3.6*results['wave_speed']))
+
+    modes, wavelength, amplitude = results['spatial']
+    if len(modes):
+        k = numpy.argmax(amplitude)
+        print("Dominant mode: %d waves on the ring, wavelength %.1fm, amplitude %.2f m/s" % (modes[k], wavelength[k], amplitude[k]))
+    frequency, amplitude = results['temporal']
+    if len(frequency):
+        k = numpy.argmax(amplitude)
+        print("Dominant period: %.1fs, amplitude %.2f m/s" % (1/frequency[k], amplitude[k]))
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(description='Analyse stop-and-go waves in a recorded run of the IDM Traffic Simulator.')
+    parser.add_argument('path', help='recording directory (headless.py --format npy) or directory with pos.csv and speed.csv')
+    parser.add_argument('--road-length', type=float, default=None, help='length of the ring road [m], read from the recording if stored')
+    parser.add_argument('--cell-time', type=float, default=DEF_CELL_TIME, help='time bin of the space-time grid [s]')
+    parser.add_argument('--cell-length', type=float, default=DEF_CELL_LENGTH, help='space bin of the space-time grid [m]')
+    parser.add_argument('--jam-ratio', type=float, default=JAM_RATIO, help='cells slower than this fraction of the mean speed are jammed')
+    parser.add_argument('--lag', type=float, default=DEF_WAVE_LAG, help='time lag used to measure the wave speed [s]')
+    parser.add_argument('--start', type=float, default=0, help='ignore the frames before this time [s]')
+    parser.add_argument('--out', default=None, help='directory for the grid, fronts and spectra')
+    return parser.parse_args(argv)
+
+# Main function definition
+def main(argv=None):
+    args = parseArgs(argv)
+    grid, results = analyse(args.path, args.road_length, args.cell_time, args.cell_length, args.jam_ratio,
+                            args.lag, args.start)
+    printResults(grid, results)
+    if args.out:
+        saveResults(grid, results, args.out)
+
+if __name__ == '__main__':
+    main()
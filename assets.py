@@ -0,0 +1,36 @@
+import pygame
+
+# Defining constants
+SCREEN_WIDTH = 1280
+SCREEN_HEIGHT = 720
+CAPTION = 'IDM Traffic Simulator'
+
+# Process-wide registry of the display, fonts and images.
+# Nothing is created on import: every asset is loaded from the disk on its first use and kept
+# for the lifetime of the process, so importing the visuals has no side effects and no file is read twice.
+class Assets:
+    screen = None
+    fonts = {}
+    images = {}
+
+    # Return the display surface, the window is opened on the first call
+    def getScreen():
+        if Assets.screen is None:
+            Assets.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.RESIZABLE)
+            pygame.display.set_caption(CAPTION)     # Set window title
+        return Assets.screen
+
+    # Return the font of the given file and size
+    def getFont(filename, size):
+        key = (filename, size)
+        if key not in Assets.fonts:
+            if not pygame.font.get_init():
+                pygame.font.init()
+            Assets.fonts[key] = pygame.font.Font(filename, size)
+        return Assets.fonts[key]
+
+    # Return the image of the given file
+    def getImage(filename):
+        if filename not in Assets.images:
+            Assets.images[filename] = pygame.image.load(filename)
+        return Assets.images[filename]
@@ -0,0 +1,190 @@
+"""
+IDM Traffic Simulator - benchmark suite.
+Measures simulation step throughput against the number of vehicles, time multiplier scaling,
+per-frame render time, the overhead of storing and saving data and the start-up time of the
+core and of the GUI. Runs without a display
+(dummy SDL video driver). Results are written as JSON baselines which later runs can be compared to:
+
+    python benchmark.py --out baseline.json
+    python benchmark.py --compare baseline.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')   # Render without opening a window
+
+import numpy
+
+from engine import RingEngine, CONST_ROAD_RADIUS
+from simulation import Simulation, dataManager, DEF_NUM_OF_CARS
+
+VEHICLE_COUNTS = [30, 100, 300, 1000, 3000, 10000]
+QUICK_VEHICLE_COUNTS = [30, 1000]
+TIME_MULTIPLIERS = [1, 10, 100]
+RENDER_VEHICLE_COUNTS = [30, 300, 3000, 10000]
+MIN_TIME = 0.5          # Minimum measured time of every benchmark [s]
+REPEATS = 3             # Best of REPEATS measurements is reported
+REGRESSION = 0.2        # Relative slowdown reported as a regression by --compare
+
+# Start-up phases timed in a fresh interpreter, every snippet prints its elapsed time in seconds
+STARTUP = {
+    'startup/import-core': "import simulation",
+    'startup/import-gui': "import pygame; pygame.init(); import managers",
+    'startup/first-frame': "import pygame; pygame.init(); from managers import simManager; "
+                           "sm = simManager(); sm.simRun(); pygame.display.flip()",
+}
+
+# Return the best time per call of func, calls are repeated until MIN_TIME has passed
+def measure(func):
+    best = float('inf')
+    for r in range(REPEATS):
+        calls = 0
+        start = time.perf_counter()
+        while True:
+            func()
+            calls += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= MIN_TIME:
+                break
+        best = min(best, elapsed/calls)
+    return best
+
+# Ring engine with the default density, the road grows with the number of vehicles
+def scaledEngine(n):
+    return RingEngine(n, roadRadius=CONST_ROAD_RADIUS*n/DEF_NUM_OF_CARS, seed=0)
+
+# Simulated steps per second against the number of vehicles
+def benchSteps(results, counts):
+    for n in counts:
+        engine = scaledEngine(n)
+        engine.setNoise()
+        for i in range(600):
+            engine.step()   # Leave the start-up phase
+        results['step/%d' % n] = {'value': 1/measure(engine.step), 'unit': 'steps/s'}
+
+# Frame time against the time multiplier
+def benchMultiplier(results):
+    sim = Simulation(DEF_NUM_OF_CARS, seed=0)
+    for multiplier in TIME_MULTIPLIERS:
+        results['frame/multiplier-%d' % multiplier] = {'value': 1000*measure(lambda: sim.simStep(multiplier)), 'unit': 'ms'}
+
+# Per-frame cost of storing the data in memory and in a recording, and of saving it as CSV
+def benchData(results, counts):
+    for n in counts:
+        sim = Simulation(n, seed=0)
+        sim.engine = scaledEngine(n)
+        results['store/%d' % n] = {'value': 1000*measure(sim.storeData), 'unit': 'ms'}
+
+        with tempfile.TemporaryDirectory() as path:
+            sim.startRecording(path)
+            results['record/%d' % n] = {'value': 1000*measure(sim.storeData), 'unit': 'ms'}
+            sim.stopRecording()
+
+            frames = 60
+            sim.data_speed = sim.data_speed[:frames]
+            sim.data_acc = sim.data_acc[:frames]
+            sim.data_pos = sim.data_pos[:frames]
+
+            def save():
+                dataManager.initFile(path)
+                sim.saveData(path)
+            results['save/%d' % n] = {'value': 1000*measure(save)/frames, 'unit': 'ms'}
+
+# Per-frame render time of the GUI against the number of vehicles
+def benchRender(results, counts):
+    import pygame
+    pygame.init()
+    from managers import simManager
+    from vehicles import Car
+
+    sm = simManager()
+    sm.simRun()     # Initialise the sliders and events
+    for n in counts:
+        sm.engine = RingEngine(n, seed=0)
+        sm.cars = [Car(sm.engine, i) for i in range(n)]
+        sm.simStep(1)
+        results['render/%d' % n] = {'value': 1000*measure(sm.drawSimulation), 'unit': 'ms'}
+    pygame.quit()
+
+# Start-up time of the core and of the GUI, every phase is timed in a new process so nothing is cached
+def benchStartup(results, render=True):
+    root = os.path.dirname(os.path.abspath(__file__))
+    for key, snippet in STARTUP.items():
+        if not render and key != 'startup/import-core':
+            continue
+        code = "import time; start = time.perf_counter(); %s; print(time.perf_counter() - start)" % snippet
+        best = min(float(subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                                        cwd=root, check=True).stdout.split()[-1]) for r in range(REPEATS))
+        results[key] = {'value': 1000*best, 'unit': 'ms'}
+
+# Version information stored with the results
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ''
+    return {'commit': commit, 'python': platform.python_version(), 'numpy': numpy.__version__,
+            'machine': platform.machine(), 'time': time.strftime('%Y-%m-%d %H:%M:%S')}
+
+# Print the results next to a baseline, flagging slowdowns above REGRESSION
+def compare(results, baseline):
+    regressions = 0
+    for key, result in results.items():
+        if key not in baseline['results']:
+            print("%-24s %12.3f %-8s (new)" % (key, result['value'], result['unit']))
+            continue
+        old = baseline['results'][key]['value']
+        new = result['value']
+        speedup = new/old if result['unit'] == 'steps/s' else old/new   # > 1 is faster
+        flag = ''
+        if speedup < 1 - REGRESSION:
+            flag = 'REGRESSION'
+            regressions += 1
+        print("%-24s %12.3f -> %12.3f %-8s x%.2f %s" % (key, old, new, result['unit'], speedup, flag))
+    return regressions
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the IDM Traffic Simulator.')
+    parser.add_argument('--quick', action='store_true', help='fewer vehicle counts')
+    parser.add_argument('--no-render', action='store_true', help='skip the rendering benchmarks')
+    parser.add_argument('--out', default=None, help='write the results as a JSON baseline')
+    parser.add_argument('--compare', default=None, help='compare the results to a JSON baseline')
+    return parser.parse_args(argv)
+
+# Main function definition
+def main(argv=None):
+    args = parseArgs(argv)
+    counts = QUICK_VEHICLE_COUNTS if args.quick else VEHICLE_COUNTS
+
+    results = {}
+    benchStartup(results, not args.no_render)
+    benchSteps(results, counts)
+    benchMultiplier(results)
+    benchData(results, counts)
+    if not args.no_render:
+        benchRender(results, RENDER_VEHICLE_COUNTS[:2] if args.quick else RENDER_VEHICLE_COUNTS)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f))
+    else:
+        regressions = 0
+        for key, result in results.items():
+            print("%-24s %12.3f %s" % (key, result['value'], result['unit']))
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'environment': environment(), 'results': results}, f, indent=2)
+
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,117 @@
+import json
+
+import numpy
+
+from engine import RingEngine, VEHICLE_ARRAYS
+from detectors import LoopDetectors
+from metrics import OnlineMetrics
+
+VERSION = 1     # Layout version of the checkpoint files
+
+# Engine values which are not vehicle arrays
+ENGINE_VALUES = ['integrator', 'tolerance', 'adaptiveDt', 'steps', 'rejectedSteps']
+OBSTACLE_ARRAYS = ['obstacleX', 'obstacleL', 'obstacleFollower']
+
+# Detector state, the arrays are stored in the file and the values in the JSON header
+DETECTOR_ARRAYS = ['bins', 'totals', 'prevX']
+DETECTOR_VALUES = ['time', 'start', 'bin']
+
+# Streaming statistics of the run, stored the same way
+METRICS_ARRAYS = ['speedBins', 'accBins', 'speedMean', 'speedM2', 'accMean', 'accM2', 'minSpeed', 'maxSpeed',
+                  'minAcc', 'maxAcc', 'minGap', 'slowTime', 'speedHist', 'accHist']
+METRICS_VALUES = ['slowSpeed', 'samples', 'time', 'duration']
+
+# Complete simulation state in a single uncompressed .npz file.
+# Vehicle, obstacle, detector and metrics arrays are stored as they are, everything else
+# (sizes, integrator settings, simulation time and the RNG state) in a JSON header,
+# so a restored run continues exactly like the original one.
+
+# Save the state of a simulation
+def saveCheckpoint(sim, path):
+    engine = sim.engine
+    arrays = {}
+    for name in VEHICLE_ARRAYS + OBSTACLE_ARRAYS:
+        arrays['engine_' + name] = getattr(engine, name)
+
+    header = {
+        'version': VERSION,
+        'engine': {'n': engine.n, 'roadRadius': engine.roadRadius, 'dt': engine.dt,
+                   'rng': engine.rng.bit_generator.state},
+        'sim': {'simTime': sim.simTime, 'first_id': sim.first_id, 'valTrafficFlow': sim.valTrafficFlow,
+                'totalLaps': sim.lapCounter.totalLaps},
+        'lapCounter': detectorState(sim.lapCounter.detector, 'lap_', arrays),
+        'detectors': None,
+        'metrics': None,
+    }
+    for name in ENGINE_VALUES:
+        header['engine'][name] = getattr(engine, name)
+    if sim.detectors is not None:
+        header['detectors'] = detectorState(sim.detectors, 'det_', arrays)
+    if sim.metrics is not None:
+        header['metrics'] = {name: getattr(sim.metrics, name) for name in METRICS_VALUES}
+        for name in METRICS_ARRAYS:
+            arrays['metrics_' + name] = getattr(sim.metrics, name)
+
+    arrays['header'] = numpy.array(json.dumps(header))
+    with open(path, 'wb') as f:
+        numpy.savez(f, **arrays)
+
+# Restore the state of a simulation saved by saveCheckpoint, the engine is replaced
+def loadCheckpoint(sim, path):
+    with numpy.load(path) as data:
+        arrays = {name: data[name] for name in data.files}
+    header = json.loads(str(arrays.pop('header')))
+    if header['version'] != VERSION:
+        raise ValueError("Unsupported checkpoint version: %s" % header['version'])
+
+    values = header['engine']
+    engine = RingEngine(values['n'], values['roadRadius'], values['dt'])
+    engine.rng.bit_generator.state = values['rng']
+    for name in ENGINE_VALUES:
+        setattr(engine, name, values[name])
+    for name in VEHICLE_ARRAYS + OBSTACLE_ARRAYS:
+        setattr(engine, name, arrays['engine_' + name])
+    sim.engine = engine
+
+    values = header['sim']
+    sim.simTime = values['simTime']
+    sim.first_id = values['first_id']
+    sim.valTrafficFlow = values['valTrafficFlow']
+    sim.lapCounter.totalLaps = values['totalLaps']
+    sim.lapCounter.simTime = sim.simTime
+    restoreDetector(sim.lapCounter.detector, header['lapCounter'], 'lap_', arrays, engine)
+
+    sim.detectors = None
+    if header['detectors'] is not None:
+        values = header['detectors']
+        sim.detectors = LoopDetectors(values['positions'], values['windows'], values['resolution'])
+        restoreDetector(sim.detectors, values, 'det_', arrays, engine)
+
+    sim.metrics = None
+    if header.get('metrics') is not None:      # Checkpoints written before the metrics were saved have none
+        sim.metrics = OnlineMetrics(header['metrics']['slowSpeed'], arrays['metrics_speedBins'], arrays['metrics_accBins'])
+        for name in METRICS_VALUES:
+            setattr(sim.metrics, name, header['metrics'][name])
+        for name in METRICS_ARRAYS:
+            setattr(sim.metrics, name, arrays['metrics_' + name])
+        sim.metrics.engine = engine
+
+# Store the arrays of a detector and return its other values
+def detectorState(detector, prefix, arrays):
+    for name in DETECTOR_ARRAYS:
+        if getattr(detector, name) is not None:    # prevX is only set after the first update
+            arrays[prefix + name] = getattr(detector, name)
+    state = {'positions': detector.positions.tolist(), 'windows': detector.windows, 'resolution': detector.resolution}
+    for name in DETECTOR_VALUES:
+        state[name] = getattr(detector, name)
+    return state
+
+def restoreDetector(detector, state, prefix, arrays, engine):
+    detector.reset()
+    if prefix + 'prevX' not in arrays:
+        return
+    for name in DETECTOR_ARRAYS:
+        setattr(detector, name, arrays[prefix + name])
+    for name in DETECTOR_VALUES:
+        setattr(detector, name, state[name])
+    detector.engine = engine
@@ -0,0 +1,73 @@
+import numpy
+
+# States of a run
+CONVERGED_UNIFORM = 'converged-uniform'     # All cars drive at the same constant speed
+CONVERGED_JAMMED = 'converged-jammed'       # A stop-and-go wave of constant shape travels around the ring
+STILL_EVOLVING = 'still-evolving'
+
+WINDOW = 120            # Length of the rolling statistics [s], long enough to see slowly growing waves
+SAMPLE_TIME = 1         # Time between samples of the ring [s]
+UNIFORM_CV = 0.01       # Largest speed variation (std/mean) of a uniform ring
+WAVE_RATIO = 0.5        # Smallest wave amplitude (max - min speed)/mean of a stop-and-go wave
+STATIONARY_TOL = 0.1    # Largest relative change of the statistics between the two halves of the window
+SLOWEST_TOL = 0.05      # Largest change of the slowest car speed (relative to the mean) between the two halves
+UNIFORM_TOL = 0.01      # Largest relative change of the mean speed of a uniform ring between the two halves
+ROUNDING_CV = 1e-6      # Speed variation of a uniform ring caused only by rounding errors
+STOP_SPEED = 0.6        # 0.1 m/s, a ring below this mean speed is standing still
+
+# Samples of the ring kept in a ring buffer: mean speed, speed variation, wave amplitude and slowest car speed
+MEAN, CV, AMPLITUDE, SLOWEST = range(4)
+
+# Online convergence monitor of a run, classifies the run from rolling statistics
+# and stops it once it has converged. Called after every frame like the other onFrame hooks.
+# A run is uniform when the speed variation is small and not growing and the mean speed is constant.
+# It is jammed when a wave is present during the whole window and the mean speed (and so the flow),
+# speed variation, wave amplitude and slowest speed do not change between the two halves of the window.
+class ConvergenceMonitor:
+    def __init__(self, window=WINDOW, sampleTime=SAMPLE_TIME, stop=True):
+        self.sampleTime = sampleTime
+        self.samples = numpy.zeros((max(2, int(round(window/sampleTime))), 4))
+        self.count = 0
+        self.nextSample = 0
+        self.stop = stop
+        self.state = STILL_EVOLVING
+        self.stopTime = None    # Simulation time at which the run converged
+
+    # Sample the ring and stop the simulation when it converged
+    def update(self, sim):
+        if sim.simTime < self.nextSample:
+            return
+        self.nextSample = sim.simTime + self.sampleTime
+
+        speed = sim.engine.speed
+        mean = speed.mean()
+        row = self.samples[self.count % len(self.samples)]
+        row[MEAN] = mean
+        row[CV] = speed.std()/max(mean, STOP_SPEED)
+        row[AMPLITUDE] = (speed.max() - speed.min())/max(mean, STOP_SPEED)
+        row[SLOWEST] = speed.min()/max(mean, STOP_SPEED)
+        self.count += 1
+
+        if self.count >= len(self.samples):
+            self.state = self.classify()
+            if self.state != STILL_EVOLVING and self.stopTime is None:
+                self.stopTime = sim.simTime
+                if self.stop:
+                    sim.run = False
+
+    # Classify the run from the samples of the window
+    def classify(self):
+        window = numpy.roll(self.samples, -(self.count % len(self.samples)), axis=0)   # Oldest sample first
+        half = len(window)//2
+        first = window[:half].mean(axis=0)
+        second = window[half:].mean(axis=0)
+
+        if window[:, MEAN].max() < STOP_SPEED:
+            return CONVERGED_JAMMED     # The whole ring stands still
+        change = numpy.abs(second - first)/numpy.maximum(numpy.abs(first), 1e-9)
+        if window[:, CV].max() < UNIFORM_CV and second[CV] <= max(first[CV], ROUNDING_CV) and change[MEAN] < UNIFORM_TOL:
+            return CONVERGED_UNIFORM
+        stationary = (change[:SLOWEST] < STATIONARY_TOL).all() and abs(second[SLOWEST] - first[SLOWEST]) < SLOWEST_TOL
+        if window[:, AMPLITUDE].min() > WAVE_RATIO and stationary:
+            return CONVERGED_JAMMED
+        return STILL_EVOLVING
@@ -0,0 +1,110 @@
+import numpy
+
+DEF_WINDOWS = [60]      # Measurement windows [s]
+RESOLUTION = 0.1        # Width of the time bins of the ring buffer [s]
+MIN_SPEED = 1e-3        # Lower bound of a spot speed in the space-mean speed [m/s]
+
+# Quantities accumulated per time bin and detector
+COUNT = 0       # Vehicles crossing the detector
+OCCUPIED = 1    # Time the detector is covered by a vehicle [s]
+INV_SPEED = 2   # Sum of the inverse spot speeds of the crossing vehicles [s/m]
+
+# Virtual loop detectors at fixed positions along the ring road.
+# Crossings are found for all vehicles and detectors at once from the previous and the current
+# unwrapped positions, so several crossings in one frame (or several laps with a large multiplier)
+# are all counted. Counts are kept in a ring buffer of time bins with a running total per window,
+# so flow, occupancy and space-mean speed over a window are read in O(1).
+class LoopDetectors:
+    def __init__(self, positions, windows=DEF_WINDOWS, resolution=RESOLUTION):
+        self.positions = numpy.asarray(positions, dtype=float)     # Positions along the ring in simulation units
+        self.windows = list(windows)
+        self.resolution = resolution
+        self.binsPerWindow = [max(1, int(round(w/resolution))) for w in self.windows]
+        self.bins = numpy.zeros((max(self.binsPerWindow), len(self.positions), 3))
+        self.totals = numpy.zeros((len(self.windows), len(self.positions), 3))
+        self.reset()
+
+    # Clear the measurements, the next update only stores the positions
+    def reset(self):
+        self.bins[:] = 0
+        self.totals[:] = 0
+        self.engine = None
+        self.prevX = None
+        self.time = 0
+        self.start = 0
+        self.bin = 0
+
+    # Register the vehicles passing the detectors since the previous update
+    def update(self, engine, simTime):
+        # Start again for a new engine, a different number of cars or a restarted simulation time
+        if engine is not self.engine or self.prevX.shape != engine.x.shape or simTime < self.time:
+            self.reset()
+            self.engine = engine
+            self.prevX = engine.x.copy()
+            self.time = self.start = simTime
+            self.bin = int(simTime // self.resolution)
+            return
+
+        self.advance(int(simTime // self.resolution))
+
+        p = self.positions[:, None]
+        L = engine.roadLength
+        crossed = numpy.floor_divide(engine.x - p, L) - numpy.floor_divide(self.prevX - p, L)
+        covered = numpy.mod(engine.x - p, L) < engine.l     # The detector is below the vehicle body
+
+        values = numpy.empty((len(self.positions), 3))
+        values[:, COUNT] = crossed.sum(axis=1)
+        values[:, OCCUPIED] = covered.any(axis=1)*(simTime - self.time)
+        values[:, INV_SPEED] = (crossed/numpy.maximum(engine.speed/6, MIN_SPEED)).sum(axis=1)   # Speed in m/s
+
+        self.bins[self.bin % len(self.bins)] += values
+        self.totals += values
+        self.prevX[:] = engine.x
+        self.time = simTime
+
+    # Move the ring buffer to the given bin, bins leaving a window are subtracted from its total
+    def advance(self, index):
+        if index - self.bin >= len(self.bins):
+            self.bins[:] = 0
+            self.totals[:] = 0
+            self.bin = index
+            return
+
+        while self.bin < index:
+            self.bin += 1
+            for w, n in enumerate(self.binsPerWindow):
+                self.totals[w] -= self.bins[(self.bin - n) % len(self.bins)]
+            self.bins[self.bin % len(self.bins)] = 0
+        numpy.maximum(self.totals, 0, out=self.totals)  # Rounding of the subtracted times
+
+    # Index of a measurement window, the first window by default
+    def getWindow(self, window=None):
+        return 0 if window is None else self.windows.index(window)
+
+    # Measured time within a window [s]
+    def getCovered(self, window=None):
+        return min(self.windows[self.getWindow(window)], self.time - self.start)
+
+    # Number of vehicles which passed every detector within a window
+    def getCounts(self, window=None):
+        return self.totals[self.getWindow(window), :, COUNT]
+
+    # Flow at every detector [cars/min]
+    def getFlow(self, window=None):
+        covered = self.getCovered(window)
+        if covered <= 0:
+            return numpy.zeros(len(self.positions))
+        return self.getCounts(window)*60/covered
+
+    # Fraction of the time every detector was covered by a vehicle
+    def getOccupancy(self, window=None):
+        covered = self.getCovered(window)
+        if covered <= 0:
+            return numpy.zeros(len(self.positions))
+        return self.totals[self.getWindow(window), :, OCCUPIED]/covered
+
+    # Space-mean speed (harmonic mean of the spot speeds) at every detector [m/s], nan without crossings
+    def getSpeed(self, window=None):
+        totals = self.totals[self.getWindow(window)]
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            return numpy.where(totals[:, COUNT] > 0, totals[:, COUNT]/totals[:, INV_SPEED], numpy.nan)
@@ -0,0 +1,340 @@
+import math
+import numpy
+from equilibrium import EquilibriumTable
+
+# Defining constants
+FPS = 60
+                            # Real values
+CONST_TOPSPEED = 180        # 30 m/s
+CONST_T = 1.5               # 1.5 s
+CONST_A_MAX = 4.38          # 0.73 m/s^2
+CONST_B_MAX = 10.02         # 1.67 m/s^2
+CONST_A_MIN = -28.2         # Deceleration applied once b_max is exceeded
+CONST_S0 = 15               # 2.5 m
+CONST_CAR_LENGTH = 30       # 5 m
+CONST_ROAD_RADIUS = 300
+CONST_DT = 1/(FPS)
+
+# Integration methods, adaptive uses the embedded Dormand-Prince 5(4) pair with step size control
+INTEGRATORS = ['euler', 'ballistic', 'rk4', 'adaptive']
+DEF_INTEGRATOR = 'euler'
+ADAPTIVE_TOLERANCE = 1e-3   # Maximum local error of positions and speeds per step (simulation units)
+ADAPTIVE_MIN_DT = 1e-6      # Steps this small are accepted regardless of the error
+
+# Dormand-Prince 5(4) coefficients: stage matrix, 5th order weights and error weights (5th - 4th order)
+DP_A = [[],
+        [1/5],
+        [3/40, 9/40],
+        [44/45, -56/15, 32/9],
+        [19372/6561, -25360/2187, 64448/6561, -212/729],
+        [9017/3168, -355/33, 46732/5247, 49/176, -5103/18656],
+        [35/384, 0, 500/1113, 125/192, -2187/6784, 11/84]]
+DP_B = [35/384, 0, 500/1113, 125/192, -2187/6784, 11/84, 0]
+DP_E = [71/57600, 0, -71/16695, 71/1920, -17253/339200, 22/525, -1/40]
+
+# Names of the arrays holding one entry per vehicle
+VEHICLE_ARRAYS = ['x', 'speed', 'a', 'l', 'prevAngle', 'a_max', 'b_max', 'T', 'topspeed', 's0', 'sqrt_ab',
+                  'core_a_max', 'core_b_max', 'core_T', 'core_topspeed', 'noise', 'autonomous', 'obstacleAhead']
+
+# Autonomous vehicle parameters
+AV_A_MAX = 22.8
+AV_T = 0.6
+AV_TOPSPEED = 12
+
+# Struct-of-arrays simulation engine for a single lane ring road.
+# Vehicle i is stored at index i of every array, vehicles are ordered along the ring
+# and never overtake, so the leader of vehicle i is always vehicle i+1 (mod N).
+# Positions are not wrapped, x stays sorted along the ring and only the last car
+# sees its leader one road length ahead, so the order never has to be sorted again.
+# The step only works along the last axis, so subclasses may stack independent rings (see ensemble.py).
+class RingEngine:
+    def __init__(self, n, roadRadius=CONST_ROAD_RADIUS, dt=CONST_DT, seed=None):
+        self.n = n
+        self.roadRadius = roadRadius
+        self.roadLength = 2*math.pi*roadRadius
+        self.dt = dt
+        self.rng = numpy.random.default_rng(seed)
+
+        # Integration method and statistics
+        self.integrator = DEF_INTEGRATOR
+        self.tolerance = ADAPTIVE_TOLERANCE
+        self.adaptiveDt = dt    # Step size proposed by the adaptive integrator
+        self.steps = 0          # Accepted integration steps
+        self.rejectedSteps = 0  # Adaptive steps rejected by the error control
+
+        # Kinematics, cars are evenly spaced on the circle and start at rest
+        angDist = 2*math.pi/n
+        self.x = numpy.arange(n)*angDist*roadRadius    # Position along the road
+        self.speed = numpy.zeros(n)
+        self.a = numpy.zeros(n)
+        self.l = numpy.full(n, float(CONST_CAR_LENGTH))
+        self.prevAngle = self.getAngles()
+
+        # IDM parameters
+        self.a_max = numpy.full(n, CONST_A_MAX)
+        self.b_max = numpy.full(n, CONST_B_MAX)
+        self.T = numpy.full(n, CONST_T)
+        self.topspeed = numpy.full(n, float(CONST_TOPSPEED))
+        self.s0 = numpy.full(n, float(CONST_S0))
+        self.sqrt_ab = 2*numpy.sqrt(self.a_max*self.b_max)
+
+        # Core parameters (noise-resistant)
+        self.core_a_max = self.a_max.copy()
+        self.core_b_max = self.b_max.copy()
+        self.core_T = self.T.copy()
+        self.core_topspeed = self.topspeed.copy()
+
+        self.noise = numpy.zeros(n)
+        self.autonomous = numpy.zeros(n, dtype=bool)
+
+        # Static obstacles (position along the road, length and the car directly behind)
+        # obstacleAhead holds for every car the nearest obstacle before its leader, -1 if none
+        self.obstacleX = numpy.zeros(0)
+        self.obstacleL = numpy.zeros(0)
+        self.obstacleFollower = numpy.zeros(0, dtype=int)
+        self.obstacleAhead = numpy.full(n, -1)
+
+    # Angular position of every car, in range from 0 to 2pi
+    def getAngles(self):
+        return numpy.mod(self.x/self.roadRadius, 2*math.pi)
+
+    # Distance to the leading road object and the difference of speed for the whole ring
+    def getGaps(self, x, v):
+        gap = numpy.roll(x, -1, axis=-1) - x
+        gap[..., -1] += self.roadLength         # The last car follows the first one
+        delta_x = gap - numpy.roll(self.l, -1, axis=-1)
+        delta_v = v - numpy.roll(v, -1, axis=-1)
+
+        # Cars directly behind an obstacle follow the obstacle instead of the next car
+        if self.obstacleX.size:
+            ahead = self.obstacleAhead
+            blocked = ahead >= 0
+            obsGap = numpy.mod(self.obstacleX[ahead] - x, self.roadLength)
+            delta_x = numpy.where(blocked, obsGap - self.obstacleL[ahead], delta_x)
+            delta_v = numpy.where(blocked, v, delta_v)
+
+        return delta_x, delta_v
+
+    # IDM Implementation
+    def idmStep(self, v, delta_v, delta_x):
+
+        # Calculating alpha value -> used in acceleration calculations
+        alpha = (self.s0 + numpy.maximum(0, self.T*v + delta_v*v/self.sqrt_ab)) / delta_x
+
+        # Update acceleration based on max acceleration and alpha
+        a = self.a_max * (1 - (v/self.topspeed)**4 - alpha**2)
+
+        # Limiting decceleration
+        a = numpy.where(a < -self.b_max, CONST_A_MIN, a)
+
+        self.a = a
+
+        return a
+
+    # Acceleration of every car for the given positions and speeds of the whole ring
+    def acceleration(self, x, v):
+        delta_x, delta_v = self.getGaps(x, v)
+        return self.idmStep(v, delta_v, delta_x)
+
+    # Perform one step of Euler integration for the whole ring
+    def eulerStep(self, dt):
+        self.speed = self.speed + self.acceleration(self.x, self.speed)*dt
+        self.x = self.x + self.speed*dt
+
+        # Negative speed fix
+        stopped = (self.speed + self.a*dt < 0) & (self.a != 0)
+        if stopped.any():
+            self.x[stopped] -= 1/2*self.speed[stopped]**2/self.a[stopped]
+            self.speed[stopped] = 0
+
+    # Perform one ballistic update, cars which would reverse within the step stop at the stopping point
+    def ballisticStep(self, dt):
+        v = self.speed
+        a = self.acceleration(self.x, v)
+        stopped = v + a*dt < 0
+        stopA = numpy.where(stopped, a, -1)
+        self.x = numpy.where(stopped, self.x - 1/2*v*v/stopA, self.x + v*dt + 1/2*a*dt*dt)
+        self.speed = numpy.where(stopped, 0, v + a*dt)
+
+    # Perform one step of RK4 integration for the whole ring, gaps are re-evaluated at every stage
+    def rk4Step(self, dt):
+        v = self.speed
+        x = self.x
+
+        k1v = self.acceleration(x, v)
+        k1x = v
+
+        k2v = self.acceleration(x + 0.5 * k1x * dt, v + 0.5 * k1v * dt)
+        k2x = v + 0.5 * k1v * dt
+
+        k3v = self.acceleration(x + 0.5 * k2x * dt, v + 0.5 * k2v * dt)
+        k3x = v + 0.5 * k2v * dt
+
+        k4v = self.acceleration(x + k3x * dt, v + k3v * dt)
+        k4x = v + k3v * dt
+
+        self.speed = numpy.maximum(0, v + (dt / 6.0) * (k1v + 2 * k2v + 2 * k3v + k4v))
+        self.x = x + (dt / 6.0) * (k1x + 2 * k2x + 2 * k3x + k4x)
+        self.a = k1v
+
+    # Perform one Dormand-Prince 5(4) step, returns the new state, the initial acceleration
+    # and the error estimate relative to the tolerance (accepted if <= 1)
+    def dormandPrinceStep(self, dt):
+        x = self.x
+        v = self.speed
+        kx = []
+        kv = []
+        for row in DP_A:
+            xi = x + dt*sum(c*k for c, k in zip(row, kx) if c)
+            vi = v + dt*sum(c*k for c, k in zip(row, kv) if c)
+            kx.append(vi)
+            kv.append(self.acceleration(xi, vi))
+
+        newX = x + dt*sum(c*k for c, k in zip(DP_B, kx) if c)
+        newV = v + dt*sum(c*k for c, k in zip(DP_B, kv) if c)
+        errX = dt*sum(c*k for c, k in zip(DP_E, kx) if c)
+        errV = dt*sum(c*k for c, k in zip(DP_E, kv) if c)
+        error = max(numpy.abs(errX).max(), numpy.abs(errV).max())/self.tolerance
+        return newX, newV, kv[0], error
+
+    # Integrate over the given duration with the largest steps which meet the tolerance
+    def adaptiveAdvance(self, duration):
+        t = 0
+        lastA = self.a     # Kept if the duration allows no step
+        while t < duration:
+            dt = min(self.adaptiveDt, duration - t)
+            newX, newV, a, error = self.dormandPrinceStep(dt)
+            if error <= 1 or dt <= ADAPTIVE_MIN_DT:
+                self.x = newX
+                self.speed = numpy.maximum(0, newV)
+                t += dt
+                self.steps += 1
+                lastA = a
+            else:
+                self.rejectedSteps += 1
+
+            # Standard step size control of a 5th order method
+            factor = 5 if error == 0 else min(5, max(0.2, 0.9*error**(-1/5)))
+            self.adaptiveDt = max(ADAPTIVE_MIN_DT, dt*factor)
+        self.a = lastA
+
+    # Advance every car on the ring by the given number of time steps
+    def advance(self, steps=1):
+        if self.integrator == 'adaptive':
+            self.adaptiveAdvance(steps*self.dt)
+            return
+
+        integrate = getattr(self, self.integrator + 'Step')
+        for i in range(steps):
+            integrate(self.dt)
+        self.steps += steps
+
+    # Advance every car on the ring by one time step
+    def step(self):
+        self.advance(1)
+
+    # Place the cars in the uniform flow equilibrium of their parameters instead of at rest, all at the same speed
+    # Every car ahead of car 0 is moved forward by perturbation (simulation units), shortening the gap behind car 0.
+    # The gap keeps at least the minimum gap s0, returns the perturbation applied (per ring for stacked rings)
+    def setEquilibrium(self, perturbation=0):
+        applied = numpy.empty(self.x.shape[:-1])
+        self.x = numpy.empty(self.x.shape)
+        self.speed = numpy.empty(self.x.shape)
+        for row in numpy.ndindex(applied.shape):
+            speed, gaps = EquilibriumTable.uniformFlow(self.T[row], self.topspeed[row], self.s0[row], self.l[row], self.roadLength)
+            applied[row] = min(max(perturbation, 0), max(gaps[-1] - self.s0[row][-1], 0))
+            self.x[row] = numpy.concatenate([[0], numpy.cumsum(gaps + numpy.roll(self.l[row], -1))[:-1]])
+            self.x[row][1:] += applied[row]
+            self.speed[row] = speed
+        self.a = numpy.zeros(self.x.shape)
+        self.prevAngle = self.getAngles()
+        return applied[()]
+
+    # Return a mask of cars which started a new lap since the last check
+    def lapCheck(self):
+        angles = self.getAngles()
+        newLap = (angles + 0.1) < self.prevAngle
+        self.prevAngle = angles
+        return newLap
+
+    def setMaxSpeed(self, val):
+        self.topspeed[:] = val
+        self.core_topspeed[:] = val
+
+    def setTimeGap(self, val):
+        self.T[:] = val
+        self.core_T[:] = val
+
+    def setMaxAcc(self, val):
+        self.a_max[:] = val - self.noise
+        self.core_a_max[:] = val
+
+    # Noise value ranges from 0 to 1, applied to max acceleration
+    def setNoise(self):
+        self.noise = self.rng.random(self.n)
+        self.a_max = self.a_max - self.noise
+
+    # Removes noise and restores the default parameter values
+    def removeNoise(self):
+        self.noise[:] = 0
+        self.a_max[:] = self.core_a_max
+        self.b_max[:] = self.core_b_max
+        self.T[:] = self.core_T
+        self.topspeed[:] = self.core_topspeed
+
+    # Sets a random selection of count cars into autonomous mode
+    def setAutonomous(self, count):
+        ids = self.rng.permutation(self.n)[:int(count)]
+        self.a_max[ids] = AV_A_MAX
+        self.T[ids] = AV_T
+        self.topspeed[ids] = AV_TOPSPEED
+        self.autonomous[ids] = True
+
+    # Removes noise and restores the default parameter values, autonomous parameter is disabled as well
+    def setDefault(self):
+        self.removeNoise()
+        self.autonomous[:] = False
+
+    # Index of the car directly behind position p, binary search as x is sorted along the ring
+    def findFollower(self, x, p):
+        p = x[0] + numpy.mod(p - x[0], self.roadLength)
+        return numpy.searchsorted(x, p, side='right') - 1
+
+    # Make obstacle k the leader of car f (in the given ring) if it is nearer than its current obstacle
+    def linkObstacle(self, row, f, k):
+        ahead = self.obstacleAhead[row + (f,)]
+        x = self.x[row + (f,)]
+        if ahead < 0 or numpy.mod(self.obstacleX[k] - x, self.roadLength) < numpy.mod(self.obstacleX[ahead] - x, self.roadLength):
+            self.obstacleAhead[row + (f,)] = k
+
+    # Place a static obstacle at position x along the road
+    # Cars cannot pass an obstacle, so its follower only changes when obstacles are added or removed
+    def addObstacle(self, x, l):
+        k = self.obstacleX.size
+        self.obstacleX = numpy.append(self.obstacleX, numpy.mod(x, self.roadLength))
+        self.obstacleL = numpy.append(self.obstacleL, l)
+
+        follower = numpy.empty(self.x.shape[:-1], dtype=int)
+        for row in numpy.ndindex(follower.shape):
+            follower[row] = self.findFollower(self.x[row], self.obstacleX[k])
+            self.linkObstacle(row, follower[row], k)
+        self.obstacleFollower = numpy.concatenate([self.obstacleFollower, follower[..., None]], axis=-1)
+
+    # Remove obstacle k, its follower falls back to the next obstacle in front of it or to its leader
+    def removeObstacle(self, k):
+        self.obstacleX = numpy.delete(self.obstacleX, k)
+        self.obstacleL = numpy.delete(self.obstacleL, k)
+        followers = self.obstacleFollower[..., k]
+        self.obstacleFollower = numpy.delete(self.obstacleFollower, k, axis=-1)
+
+        self.obstacleAhead[self.obstacleAhead == k] = -1
+        self.obstacleAhead[self.obstacleAhead > k] -= 1
+        for row in numpy.ndindex(followers.shape):
+            for j in numpy.flatnonzero(self.obstacleFollower[row] == followers[row]):
+                self.linkObstacle(row, followers[row], j)
+
+    def clearObstacles(self):
+        self.obstacleX = numpy.zeros(0)
+        self.obstacleL = numpy.zeros(0)
+        self.obstacleFollower = numpy.zeros(self.x.shape[:-1] + (0,), dtype=int)
+        self.obstacleAhead[:] = -1
@@ -0,0 +1,153 @@
+"""
+IDM Traffic Simulator - Monte-Carlo ensembles.
+Advances many independent replicas of the ring at once as (replicas x cars) arrays.
+Every replica has its own seed, noise draw and AV placement, the run reports
+the distributions of traffic flow and stop-and-go wave onset time. Replicas start in the
+uniform flow equilibrium of their vehicles with a small perturbation, like the sweeps.
+"""
+
+import argparse
+import csv
+import time
+
+import numpy
+
+from engine import RingEngine, VEHICLE_ARRAYS, AV_A_MAX, AV_T, AV_TOPSPEED, CONST_ROAD_RADIUS, CONST_DT
+from engine import CONST_TOPSPEED, CONST_T, CONST_A_MAX
+from headless import DEF_TIME_MULTIPLIER, START_MODES
+from simulation import DEF_NUM_OF_CARS, DEFAULT_NOISE, DEFUALT_NUM_AV, FINAL_TIME
+from sweep import DEF_PERTURBATION
+
+DEF_REPLICAS = 100
+MEASURE_TIME = 60       # Flow is measured over the last minute of the run
+WAVE_RATIO = 0.5        # A wave has formed once the speed range exceeds this fraction of the mean speed
+
+# Ring engine holding independent replicas of the ring in the rows of every vehicle array
+class EnsembleEngine(RingEngine):
+    def __init__(self, replicas, n, seeds, roadRadius=CONST_ROAD_RADIUS, dt=CONST_DT):
+        super().__init__(n, roadRadius, dt)
+        self.replicas = replicas
+        self.rngs = [numpy.random.default_rng(seed) for seed in seeds]
+
+        for name in VEHICLE_ARRAYS:
+            setattr(self, name, numpy.tile(getattr(self, name), (replicas, 1)))
+        self.clearObstacles()
+
+    # Every replica draws its own noise values
+    def setNoise(self):
+        self.noise = numpy.stack([rng.random(self.n) for rng in self.rngs])
+        self.a_max = self.a_max - self.noise
+
+    # Every replica places its autonomous vehicles independently
+    def setAutonomous(self, count):
+        for r, rng in enumerate(self.rngs):
+            ids = rng.permutation(self.n)[:int(count)]
+            self.a_max[r, ids] = AV_A_MAX
+            self.T[r, ids] = AV_T
+            self.topspeed[r, ids] = AV_TOPSPEED
+            self.autonomous[r, ids] = True
+
+# Run an ensemble, returns per-replica seeds, traffic flow [cars/min] and wave onset time [s] (nan if none)
+# start 'equilibrium' places every replica in its uniform flow with car 0 moved back by perturbation (simulation units).
+# The wave detector of a replica is armed once its speeds are close together, so the warm-up of a ring
+# started at rest (AVs pulling away from the human drivers) does not count as a wave
+def runEnsemble(replicas=DEF_REPLICAS, numCars=DEF_NUM_OF_CARS, topspeed=CONST_TOPSPEED, timeGap=CONST_T,
+                maxAcc=CONST_A_MAX, numAVs=DEFUALT_NUM_AV, noise=DEFAULT_NOISE, finalTime=FINAL_TIME,
+                timeMultiplier=DEF_TIME_MULTIPLIER, seed=None, start='equilibrium', perturbation=DEF_PERTURBATION):
+    seeds = numpy.random.SeedSequence(seed).generate_state(replicas)
+    engine = EnsembleEngine(replicas, numCars, seeds)
+
+    # Apply the model parameters in the same order as Simulation.setParameters
+    engine.setMaxSpeed(topspeed)
+    engine.setTimeGap(timeGap)
+    engine.setMaxAcc(maxAcc)
+    engine.setDefault()
+    engine.setAutonomous(numAVs)
+    if noise:
+        engine.setNoise()
+    if start == 'equilibrium':
+        engine.setEquilibrium(perturbation)
+
+    simTime = 0
+    laps = numpy.zeros(replicas, dtype=int)
+    onset = numpy.full(replicas, numpy.nan)
+    armed = numpy.zeros(replicas, dtype=bool)
+    measureStart = max(0, finalTime - MEASURE_TIME)
+
+    while simTime < finalTime:
+        for i in range(timeMultiplier):
+            engine.step()
+            simTime += engine.dt
+
+        # Count every car crossing the start line during the measurement window
+        crossings = engine.lapCheck().sum(axis=-1)
+        if simTime >= measureStart:
+            laps += crossings
+
+        # Record the first frame at which the speed range of a replica shows a stop-and-go wave
+        mean = engine.speed.mean(axis=-1)
+        amplitude = engine.speed.max(axis=-1) - engine.speed.min(axis=-1)
+        waves = armed & numpy.isnan(onset) & (amplitude > WAVE_RATIO*mean)
+        onset[waves] = simTime
+        armed |= (mean > 0) & (amplitude <= WAVE_RATIO*mean)
+
+    measured = simTime - measureStart
+    flow = laps/(measured/60) if measured > 0 else numpy.full(replicas, numpy.nan)
+    return seeds, flow, onset
+
+# Print the distribution of a per-replica value
+def printDistribution(name, values):
+    values = values[~numpy.isnan(values)]
+    if not values.size:
+        print("%s: no replicas" % name)
+        return
+    p5, p50, p95 = numpy.percentile(values, [5, 50, 95])
+    print("%s: mean %.2f, std %.2f, 5%% %.2f, median %.2f, 95%% %.2f (%d replicas)"
+          % (name, values.mean(), values.std(), p5, p50, p95, values.size))
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(description='Run a Monte-Carlo ensemble of the IDM Traffic Simulator.')
+    parser.add_argument('--replicas', type=int, default=DEF_REPLICAS, help='number of independent rings')
+    parser.add_argument('--cars', type=int, default=DEF_NUM_OF_CARS, help='number of vehicles on each ring')
+    parser.add_argument('--topspeed', type=float, default=CONST_TOPSPEED, help='desired speed in simulation units (180 = 30 m/s)')
+    parser.add_argument('--time-gap', type=float, default=CONST_T, help='desired time headway [s]')
+    parser.add_argument('--max-acc', type=float, default=CONST_A_MAX, help='max acceleration in simulation units (4.38 = 0.73 m/s^2)')
+    parser.add_argument('--avs', type=int, default=DEFUALT_NUM_AV, help='number of autonomous vehicles on each ring')
+    parser.add_argument('--noise', action=argparse.BooleanOptionalAction, default=DEFAULT_NOISE, help='parameter noise')
+    parser.add_argument('--time', type=float, default=FINAL_TIME, help='simulated time [s]')
+    parser.add_argument('--start', choices=START_MODES, default='equilibrium',
+                        help='start the replicas in the uniform flow equilibrium (no warm-up) or at rest')
+    parser.add_argument('--perturbation', type=float, default=DEF_PERTURBATION/6,
+                        help='equilibrium start: gap taken from the car behind car 0 [m]')
+    parser.add_argument('--multiplier', type=int, default=DEF_TIME_MULTIPLIER, help='time steps per frame')
+    parser.add_argument('--seed', type=int, default=None, help='seed of the ensemble')
+    parser.add_argument('--out', default=None, help='CSV file for the per-replica results')
+    args = parser.parse_args(argv)
+    if args.time <= 0:
+        parser.error("--time must be positive")
+    if args.perturbation < 0:
+        parser.error("--perturbation must not be negative")
+    return args
+
+# Main function definition
+def main(argv=None):
+    args = parseArgs(argv)
+
+    start = time.perf_counter()
+    seeds, flow, onset = runEnsemble(args.replicas, args.cars, args.topspeed, args.time_gap, args.max_acc,
+                                     args.avs, args.noise, args.time, args.multiplier, args.seed, args.start,
+                                     args.perturbation*6)
+    print("Simulated %d replicas in %.2fs" % (args.replicas, time.perf_counter() - start))
+
+    printDistribution('Traffic flow Q [cars/min]', flow)
+    printDistribution('Wave onset time [s]', onset)
+
+    if args.out:
+        with open(args.out, 'w', newline='') as f:
+            write = csv.writer(f)
+            write.writerow(['replica', 'seed', 'flow', 'onset'])
+            for r in range(args.replicas):
+                write.writerow([r, seeds[r], flow[r], onset[r]])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+import numpy
+
+TABLE_SIZE = 1000           # Speeds tabulated per parameter combination
+MAX_SPEED_SHARE = 0.999     # Highest tabulated speed as a share of the desired speed, the gap grows without bound towards it
+
+# Equilibrium gap of the IDM at speed v, the gap at which a car following a leader
+# at the same speed neither accelerates nor brakes: 1 - (v/v0)^4 - ((s0 + vT)/s)^2 = 0
+def equilibriumGap(v, T, topspeed, s0):
+    return (s0 + T*v)/numpy.sqrt(1 - (v/topspeed)**4)
+
+# Memoized speed-gap tables of the IDM equilibrium.
+# The equilibrium only depends on the time gap, the desired speed and the minimum gap (the accelerations
+# cancel out, so the noise on the max acceleration does not matter), every combination of these is
+# tabulated once per process and shared by all rings. The speeds are spaced densely towards the
+# desired speed, where the gap changes fastest.
+class EquilibriumTable:
+    tables = {}
+
+    # Speeds and equilibrium gaps of a parameter combination, both increasing
+    def getTable(T, topspeed, s0):
+        key = (float(T), float(topspeed), float(s0))
+        if key not in EquilibriumTable.tables:
+            speeds = topspeed*(1 - numpy.geomspace(1, 1 - MAX_SPEED_SHARE, TABLE_SIZE))
+            EquilibriumTable.tables[key] = (speeds, equilibriumGap(speeds, T, topspeed, s0))
+        return EquilibriumTable.tables[key]
+
+    # Equilibrium speed at the given gaps
+    def getSpeed(gap, T, topspeed, s0):
+        speeds, gaps = EquilibriumTable.getTable(T, topspeed, s0)
+        return numpy.interp(gap, gaps, speeds)
+
+    # Uniform flow on a ring: every vehicle drives at the same speed at its own equilibrium gap.
+    # The parameters are arrays over the vehicles, vehicles sharing a parameter combination share a table.
+    # Returns the common speed and the gap of every vehicle, the gaps add up to the free road length exactly
+    def uniformFlow(T, topspeed, s0, l, roadLength):
+        combos, inverse, counts = numpy.unique(numpy.column_stack([T, topspeed, s0]), axis=0,
+                                               return_inverse=True, return_counts=True)
+        inverse = inverse.reshape(-1)
+        free = roadLength - numpy.sum(l)    # Road length not covered by the vehicles
+
+        # Sum of all gaps against the speed, at the tabulated speeds of the slowest combination
+        speeds = EquilibriumTable.getTable(*combos[combos[:, 1].argmin()])[0]
+        total = sum(count*numpy.interp(speeds, *EquilibriumTable.getTable(*combo)) for combo, count in zip(combos, counts))
+        speed = numpy.interp(free, total, speeds)
+
+        # Vehicles too dense to move or too sparse to follow anyone keep the closest gaps, stretched to the road
+        gaps = numpy.array([numpy.interp(speed, *EquilibriumTable.getTable(*combo)) for combo in combos])[inverse]
+        return speed, gaps*free/gaps.sum()
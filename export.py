@@ -0,0 +1,162 @@
+"""
+IDM Traffic Simulator - offscreen video export.
+Renders a recording (or a headless run recorded first) with the simulation visuals at a fixed
+output frame rate, without a window. The frames are split into contiguous segments which are
+rendered and encoded by a pool of worker processes, so a long run exports much faster than real time.
+Video files (.mp4, .mkv, .mov, .webm, .avi) are encoded with ffmpeg, any other output is a directory of PNG frames.
+"""
+
+import argparse
+import math
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+
+from recorder import Recording
+from headless import runScenario
+from simulation import DEF_NUM_OF_CARS, DEFUALT_NUM_AV, FINAL_TIME
+
+DEF_FPS = 30            # Frames per second of the video
+DEF_SPEED = 10          # Simulated seconds per video second, same as the default time multiplier
+VIDEO_FORMATS = ['.mp4', '.mkv', '.mov', '.webm', '.avi']
+VIDEO_CODEC = ['-c:v', 'libx264', '-preset', 'fast', '-crf', '20', '-pix_fmt', 'yuv420p']
+
+# Times of the exported frames, from the start of the recording at a fixed step of simulated time
+def frameTimes(recording, fps=DEF_FPS, speed=DEF_SPEED, start=None, end=None):
+    first = float(recording.time[0]) if start is None else start
+    last = float(recording.time[-1]) if end is None else end
+    return first + numpy.arange(int(math.floor((last - first)*fps/speed)) + 1)*speed/fps
+
+# Render and encode one segment of frames, executed in a worker process
+# Returns the file names written, a video segment or the PNG frames
+def renderSegment(path, times, output, first, fps, title):
+    # Frames are drawn on the display surface, so every worker opens one with a dummy video driver
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    import pygame
+    pygame.init()
+    from visualise import Draw, SCREEN_WIDTH, SCREEN_HEIGHT
+    from assets import Assets
+    from vehicles import Car
+    from engine import RingEngine
+
+    recording = Recording(path)
+    n = recording.pos.shape[1]
+    engine = RingEngine(n, recording.roadLength*6/(2*math.pi))
+    engine.autonomous = recording.avs.copy()
+    cars = [] if Draw.useBand(n) else [Car(engine, i) for i in range(n)]
+    avs = '%d out of %d' % (engine.autonomous.sum(), n)
+
+    video = os.path.splitext(output)[1].lower() in VIDEO_FORMATS
+    if video:
+        segment = '%s.part%06d%s' % (output, first, os.path.splitext(output)[1])
+        encoder = subprocess.Popen(['ffmpeg', '-y', '-loglevel', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+                                    '-s', '%dx%d' % (SCREEN_WIDTH, SCREEN_HEIGHT), '-r', str(fps), '-i', '-']
+                                   + VIDEO_CODEC + [segment], stdin=subprocess.PIPE)
+    written = []
+    screen = Assets.getScreen()
+
+    for i, t in enumerate(times):
+        frame = recording.getFrame(t)
+        engine.x = recording.pos[frame]*6       # Converting position back to simulation units
+        engine.speed = recording.speed[frame]*6
+        engine.a = recording.acc[frame]*6
+        for car in cars:
+            car.updateVisuals()
+        Draw.drawExport(Draw, cars, [title, '%.2f' % t, '%.2f' % (engine.speed.mean()/6), avs],
+                        engine if not cars else None)
+
+        if video:
+            encoder.stdin.write(pygame.image.tobytes(screen, 'RGB'))
+        else:
+            name = os.path.join(output, 'frame_%06d.png' % (first + i))
+            pygame.image.save(screen, name)
+            written.append(name)
+
+    if video:
+        encoder.stdin.close()
+        if encoder.wait():
+            raise RuntimeError("ffmpeg failed to encode " + segment)
+        written.append(segment)
+    pygame.quit()
+    return written
+
+# Join the video segments into the output file without encoding them again
+def joinSegments(segments, output):
+    with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+        for segment in segments:
+            f.write("file '%s'\n" % os.path.abspath(segment).replace("'", "'\\''"))
+        listFile = f.name
+    try:
+        subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0', '-i', listFile,
+                        '-c', 'copy', output], check=True)
+    finally:
+        os.remove(listFile)
+        for segment in segments:
+            os.remove(segment)
+
+# Export a recording, the frames are split into one contiguous segment per worker
+def exportRecording(path, output, fps=DEF_FPS, speed=DEF_SPEED, start=None, end=None, workers=None, title=None):
+    video = os.path.splitext(output)[1].lower() in VIDEO_FORMATS
+    if video and shutil.which('ffmpeg') is None:
+        raise RuntimeError("Video export needs ffmpeg on the PATH, export PNG frames to a directory instead")
+    if not video:
+        os.makedirs(output, exist_ok=True)
+
+    recording = Recording(path)
+    if not recording.getFrames():
+        raise ValueError("Empty recording: " + path)
+    times = frameTimes(recording, fps, speed, start, end)
+    workers = workers or os.cpu_count() or 1
+    title = title or os.path.basename(os.path.abspath(path))
+    segments = [segment for segment in numpy.array_split(numpy.arange(len(times)), min(workers, len(times))) if len(segment)]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(renderSegment, path, times[segment], output, int(segment[0]), fps, title)
+                   for segment in segments]
+        written = [future.result() for future in futures]  # In the order of the segments
+
+    if video:
+        joinSegments([files[0] for files in written], output)
+    return len(times)
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(description='Export a run of the IDM Traffic Simulator as a video or PNG frames.')
+    parser.add_argument('output', help='video file (needs ffmpeg) or directory for the PNG frames')
+    parser.add_argument('--recording', default=None, help='recording directory made with headless.py --format npy, '
+                                                          'a headless run is recorded first if not given')
+    parser.add_argument('--fps', type=float, default=DEF_FPS, help='frames per second of the video')
+    parser.add_argument('--speed', type=float, default=DEF_SPEED, help='simulated seconds per video second')
+    parser.add_argument('--start', type=float, default=None, help='first exported time [s]')
+    parser.add_argument('--end', type=float, default=None, help='last exported time [s]')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--cars', type=int, default=DEF_NUM_OF_CARS, help='number of vehicles of the headless run')
+    parser.add_argument('--avs', type=int, default=DEFUALT_NUM_AV, help='number of autonomous vehicles of the headless run')
+    parser.add_argument('--time', type=float, default=FINAL_TIME, help='simulated time of the headless run [s]')
+    parser.add_argument('--seed', type=int, default=None, help='random seed of the headless run')
+    return parser.parse_args(argv)
+
+# Main function definition
+def main(argv=None):
+    args = parseArgs(argv)
+
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.recording
+        title = None
+        if path is None:
+            path = tmp
+            title = '%d cars, %d AVs' % (args.cars, args.avs)
+            runScenario(args.cars, numAVs=args.avs, finalTime=args.time, seed=args.seed, recordPath=path)
+            print("Simulated %.2fs in %.2fs" % (args.time, time.perf_counter() - start))
+
+        frames = exportRecording(path, args.output, args.fps, args.speed, args.start, args.end, args.workers, title)
+    elapsed = time.perf_counter() - start
+    print("Exported %d frames (%.1fs of video) in %.2fs" % (frames, frames/args.fps, elapsed))
+
+if __name__ == '__main__':
+    main()
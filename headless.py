@@ -0,0 +1,161 @@
+"""
+IDM Traffic Simulator - headless batch mode.
+Runs a configured scenario without pygame as fast as the CPU allows
+and writes the speed, acceleration, position and AV data files.
+"""
+
+import argparse
+import math
+import os
+import time
+
+from engine import CONST_TOPSPEED, CONST_T, CONST_A_MAX, CONST_ROAD_RADIUS
+from engine import INTEGRATORS, DEF_INTEGRATOR, ADAPTIVE_TOLERANCE
+from simulation import Simulation, dataManager
+from simulation import DEF_NUM_OF_CARS, DEFAULT_NOISE, DEFUALT_NUM_AV, FINAL_TIME
+from detectors import DEF_WINDOWS
+from convergence import ConvergenceMonitor
+from metrics import GROUPS
+
+DEF_TIME_MULTIPLIER = 10    # Time steps per stored frame, same as the GUI default
+START_MODES = ['rest', 'equilibrium']   # Cars start evenly spaced at rest or in the uniform flow equilibrium
+
+# Run a scenario for the given simulated time, data is stored once per frame like in the GUI
+# onFrame (optional) is called with the simulation after every frame
+# recordPath (optional) streams the data into a binary recording instead of keeping it in memory
+# detectors (optional) places loop detectors at the given positions [m]
+# checkpoint (optional) continues from a saved state instead of the given parameters, for another finalTime seconds
+# monitor (optional) is a ConvergenceMonitor which ends the run early once it converged
+# stats collects streaming statistics in sim.metrics, usually with record=False so memory does not grow with the run
+# start 'equilibrium' skips the warm-up from rest, car 0 is moved back by perturbation (simulation units)
+def runScenario(numCars=DEF_NUM_OF_CARS, topspeed=CONST_TOPSPEED, timeGap=CONST_T, maxAcc=CONST_A_MAX,
+                numAVs=DEFUALT_NUM_AV, noise=DEFAULT_NOISE, finalTime=FINAL_TIME,
+                timeMultiplier=DEF_TIME_MULTIPLIER, seed=None, record=True, onFrame=None, recordPath=None,
+                integrator=DEF_INTEGRATOR, tolerance=ADAPTIVE_TOLERANCE, detectors=None, windows=DEF_WINDOWS, checkpoint=None,
+                roadRadius=CONST_ROAD_RADIUS, monitor=None, stats=False, start='rest', perturbation=0):
+    sim = Simulation(numCars, seed, roadRadius)
+    if checkpoint is not None:
+        sim.loadCheckpoint(checkpoint)
+    else:
+        sim.setParameters(topspeed, timeGap, maxAcc, numAVs, noise)
+        sim.engine.integrator = integrator
+        sim.engine.tolerance = tolerance
+        if start == 'equilibrium':
+            applied = sim.engine.setEquilibrium(perturbation)
+            if applied < perturbation:
+                print("Perturbation limited to %.2f m, the gap behind car 0 keeps the minimum gap" % (applied/6))
+    if detectors:
+        sim.addDetectors(detectors, windows)
+    if stats and sim.metrics is None:     # Statistics restored from a checkpoint continue
+        sim.addMetrics()
+    if recordPath is not None:
+        sim.startRecording(recordPath)
+
+    endTime = sim.simTime + finalTime
+    while sim.getRun():
+        sim.simStep(timeMultiplier)
+        if record:
+            sim.storeData()
+        if onFrame is not None:
+            onFrame(sim)
+        if monitor is not None:
+            monitor.update(sim)
+        if sim.simTime >= endTime:
+            sim.run = False
+
+    if recordPath is not None:
+        sim.stopRecording()
+    return sim
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(description='Run the IDM Traffic Simulator without a display.')
+    parser.add_argument('--cars', type=int, default=DEF_NUM_OF_CARS, help='number of vehicles on the ring')
+    parser.add_argument('--topspeed', type=float, default=CONST_TOPSPEED, help='desired speed in simulation units (180 = 30 m/s)')
+    parser.add_argument('--time-gap', type=float, default=CONST_T, help='desired time headway [s]')
+    parser.add_argument('--max-acc', type=float, default=CONST_A_MAX, help='max acceleration in simulation units (4.38 = 0.73 m/s^2)')
+    parser.add_argument('--road-length', type=float, default=2*math.pi*CONST_ROAD_RADIUS/6, help='length of the ring road [m]')
+    parser.add_argument('--avs', type=int, default=DEFUALT_NUM_AV, help='number of autonomous vehicles')
+    parser.add_argument('--noise', action=argparse.BooleanOptionalAction, default=DEFAULT_NOISE, help='parameter noise')
+    parser.add_argument('--time', type=float, default=FINAL_TIME, help='simulated time [s], counted from the checkpoint when continuing from one')
+    parser.add_argument('--multiplier', type=int, default=DEF_TIME_MULTIPLIER, help='time steps per stored frame')
+    parser.add_argument('--seed', type=int, default=None, help='random seed for noise and AV placement')
+    parser.add_argument('--start', choices=START_MODES, default='rest', help='start at rest or in the uniform flow equilibrium')
+    parser.add_argument('--perturbation', type=float, default=0, help='equilibrium start: gap taken from the car behind car 0 [m]')
+    parser.add_argument('--integrator', choices=INTEGRATORS, default=DEF_INTEGRATOR, help='integration method')
+    parser.add_argument('--tolerance', type=float, default=ADAPTIVE_TOLERANCE, help='local error tolerance of the adaptive integrator')
+    parser.add_argument('--detectors', type=float, nargs='*', default=None, help='loop detector positions along the ring [m]')
+    parser.add_argument('--windows', type=float, nargs='+', default=DEF_WINDOWS, help='detector measurement windows [s]')
+    parser.add_argument('--checkpoint', default=None, help='continue from a checkpoint file instead of the scenario parameters')
+    parser.add_argument('--save-checkpoint', default=None, help='save the final state to a checkpoint file')
+    parser.add_argument('--early-stop', action='store_true', help='end the run once it converged to uniform flow or a stable wave')
+    parser.add_argument('--stats', action='store_true', help='keep streaming statistics instead of storing every frame')
+    parser.add_argument('--out', default='.', help='directory for the output files')
+    parser.add_argument('--format', choices=['csv', 'npy'], default='csv', help='CSV files or a binary .npy recording')
+    parser.add_argument('--no-save', action='store_true', help='do not store or write any data')
+    args = parser.parse_args(argv)
+    if args.perturbation < 0:
+        parser.error("--perturbation must not be negative")
+    return args
+
+# Main function definition
+def main(argv=None):
+    args = parseArgs(argv)
+
+    recordPath = None
+    if args.format == 'npy' and not args.no_save and not args.stats:
+        recordPath = args.out
+
+    monitor = ConvergenceMonitor() if args.early_stop else None
+
+    start = time.perf_counter()
+    sim = runScenario(args.cars, args.topspeed, args.time_gap, args.max_acc, args.avs, args.noise,
+                      args.time, args.multiplier, args.seed, record=not args.no_save and not args.stats, recordPath=recordPath,
+                      integrator=args.integrator, tolerance=args.tolerance, detectors=args.detectors, windows=args.windows,
+                      checkpoint=args.checkpoint, roadRadius=args.road_length*6/(2*math.pi), monitor=monitor,
+                      stats=args.stats, start=args.start, perturbation=args.perturbation*6)
+    elapsed = time.perf_counter() - start
+
+    if args.save_checkpoint:
+        sim.saveCheckpoint(args.save_checkpoint)
+
+    if args.stats and not args.no_save:
+        os.makedirs(args.out, exist_ok=True)
+        sim.metrics.save(args.out)
+    elif args.format == 'csv' and not args.no_save:
+        os.makedirs(args.out, exist_ok=True)
+        dataManager.initFile(args.out)
+        sim.saveData(args.out)
+
+    print("Simulated %.2fs in %.2fs, traffic flow Q [cars/min]: %s" % (sim.simTime, elapsed, sim.valTrafficFlow))
+    print("Integration steps: %d accepted, %d rejected" % (sim.engine.steps, sim.engine.rejectedSteps))
+    if monitor is not None:
+        print("Run state: %s" % monitor.state)
+
+    if sim.detectors is not None:
+        printDetectors(sim.detectors)
+    if sim.metrics is not None:
+        printMetrics(sim.metrics)
+
+# Print the flow, occupancy and space-mean speed of every detector and window
+def printDetectors(detectors):
+    print("%10s %10s %12s %10s %12s" % ('Position', 'Window', 'Q [cars/min]', 'Occupancy', 'Speed [m/s]'))
+    for window in detectors.windows:
+        flow = detectors.getFlow(window)
+        occupancy = detectors.getOccupancy(window)
+        speed = detectors.getSpeed(window)
+        for i, position in enumerate(detectors.positions):
+            print("%10.1f %10.1f %12.2f %10.3f %12.2f" % (position/6, window, flow[i], occupancy[i], speed[i]))
+
+# Print the summary of the streaming statistics for the fleet, AVs and human drivers
+def printMetrics(metrics):
+    summary = metrics.summary()
+    print("%-22s" % 'Statistic' + ''.join("%12s" % group for group in GROUPS))
+    print("%-22s" % 'vehicles' + ''.join("%12d" % summary[group]['vehicles'] for group in GROUPS))
+    for name, label in [('mean_speed', 'mean speed [m/s]'), ('speed_std', 'speed std [m/s]'),
+                        ('min_speed', 'min speed [m/s]'), ('max_speed', 'max speed [m/s]'),
+                        ('mean_acc', 'mean acc [m/s^2]'), ('acc_std', 'acc std [m/s^2]'),
+                        ('min_gap', 'min gap [m]'), ('slow_fraction', 'time below %g m/s' % (metrics.slowSpeed/6))]:
+        print("%-22s" % label + ''.join("%12.3f" % summary[group][name] for group in GROUPS))
+
+if __name__ == '__main__':
+    main()
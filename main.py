@@ -1,29 +1,91 @@
 """
 IDM Traffic Simulator.
 Made by: Jan Slusarski
-Final Year Project Title: Reproducing and eliminating udesirable 
+Final Year Project Title: Reproducing and eliminating udesirable
 traffic phenomena using the IDM and traffic control strategies.
 Date: April 2024
+
+Run with --worker to simulate in a separate process, so the window keeps its
+frame rate with heavy time multipliers or many vehicles.
+Press P for a timing overlay of the frame phases, run with --trace <file>
+to write the phase timings as a trace-event file (chrome://tracing, Perfetto).
+Run with --road-length <m> for a longer ring, the default number of vehicles scales with it
+and vehicles are drawn as a speed and density heat band once their sprites would overlap.
+Run with --replay <dir> to play back a recording made with headless.py --format npy.
+Run with --serve [port] to stream the vehicle states to clients on localhost (see server.py),
+--serve-rate <fps> and --serve-stride <k> send fewer frames and every k-th vehicle.
+Press M (or run with --max-speed) to run as many steps per frame as fit into the frame budget
+instead of the time multiplier, the achieved speed-up over real time is shown next to the slider.
+New rings start in the uniform flow equilibrium of their parameters, --perturbation <m> moves car 0
+back by the given distance and --rest-start starts the cars at rest instead.
 """
 
+import argparse
+import math
 import pygame # Activate the pygame library
-pygame.init()   # Initiate pygame
 
-from managers import simManager
-from managers import FPS
-from visualise import *
+from engine import CONST_ROAD_RADIUS
+from server import DEF_PORT, DEF_RATE, DEF_STRIDE
 
-clock: pygame.time.Clock = pygame.time.Clock()  # Initialise the simulation clock
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(description='IDM Traffic Simulator with a graphical user interface.')
+    parser.add_argument('--worker', action='store_true', help='simulate in a separate process')
+    parser.add_argument('--road-length', type=float, default=2*math.pi*CONST_ROAD_RADIUS/6, help='length of the ring road [m]')
+    parser.add_argument('--rest-start', action='store_true', help='start new rings at rest instead of in the uniform flow equilibrium')
+    parser.add_argument('--perturbation', type=float, default=0, help='equilibrium start: gap taken from the car behind car 0 [m]')
+    parser.add_argument('--replay', default=None, metavar='DIR', help='play back a recording made with headless.py --format npy')
+    parser.add_argument('--serve', type=int, nargs='?', const=DEF_PORT, default=None, metavar='PORT',
+                        help='stream the vehicle states to clients on localhost (port %d by default)' % DEF_PORT)
+    parser.add_argument('--serve-rate', type=float, default=DEF_RATE, help='frames per second sent to the clients')
+    parser.add_argument('--serve-stride', type=int, default=DEF_STRIDE, help='send every k-th vehicle')
+    parser.add_argument('--max-speed', action='store_true', help='run as many steps per frame as fit into the frame budget')
+    parser.add_argument('--trace', default=None, metavar='FILE', help='write the frame phase timings as a trace-event file')
+    args = parser.parse_args(argv)
+    if args.road_length <= 0:
+        parser.error("--road-length must be positive")
+    if args.perturbation < 0:
+        parser.error("--perturbation must not be negative")
+    if args.serve_rate <= 0 or args.serve_stride < 1:
+        parser.error("--serve-rate must be positive and --serve-stride at least 1")
+    if args.serve is not None and args.replay is not None:
+        parser.error("--serve streams a running simulation, it cannot be combined with --replay")
+    return args
 
 # Main function definition
-def main():
-    sm = simManager()   # Create simulation manager instance
-    
+def main(argv=None):
+    args = parseArgs(argv)
+    pygame.init()   # Initiate pygame
+
+    from managers import simManager, remoteManager, replayManager
+    from managers import FPS
+
+    clock: pygame.time.Clock = pygame.time.Clock()  # Initialise the simulation clock
+
+    roadRadius = args.road_length*6/(2*math.pi)     # Metres to simulation units
+    perturbation = args.perturbation*6
+    if args.replay is not None:
+        sm = replayManager(args.replay)    # Play back a recording
+    elif args.worker:
+        sm = remoteManager(roadRadius, not args.rest_start, perturbation)   # Simulation runs in the worker process
+    else:
+        sm = simManager(roadRadius, not args.rest_start, perturbation)      # Create simulation manager instance
+
+    if args.serve is not None:
+        sm.startServer(args.serve, args.serve_rate, args.serve_stride)
+
+    if args.max_speed:
+        sm.maxSpeed = True      # Fill the frame budget instead of using the time multiplier
+
+    if args.trace is not None:
+        sm.profiler.startTrace(args.trace)
+
     # Simulation while loop
     while sm.getRun():
         clock.tick(FPS)     # Update the clock
         sm.simRun()         # Run the simulation
 
+    sm.close()      # Stop the simulation worker
     pygame.quit()   # Quit pygame
-    
-main()
\ No newline at end of file
+
+if __name__ == '__main__':
+    main()
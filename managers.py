@@ -2,76 +2,47 @@ from pygame_widgets.slider import Slider
 from pygame_widgets.toggle import Toggle
 import pygame
 import math
-import random
-import csv
-from vehicles import Obstacle, Car
+import os
+import time
+from vehicles import Obstacle, Car, RoadObject
+from engine import RingEngine, CONST_ROAD_RADIUS
+from simulation import Simulation, LapCounter, dataManager
+from worker import SimWorker
+from profiler import Profiler
+from recorder import Recording
+from server import StateServer
+from scheduler import FrameScheduler, SpeedMeter
+from assets import Assets
+from simulation import DEF_NUM_OF_CARS, DEFAULT_NOISE, DEFUALT_NUM_AV, FINAL_TIME
 from visualise import *
 
 # Defining constants
 CONST_TOPSPEED = 180
 CONST_T = 1.5
 CONST_A_MAX = 4.38
-DEF_NUM_OF_CARS = 30
 CONST_DT = 1/(FPS)
 CONST_CIRCLE_CENTRE = (SCREEN_WIDTH/2 + 240,SCREEN_HEIGHT/2)
 BLACK = (0, 0, 0)
-DEFAULT_NOISE = True
-DEFUALT_NUM_AV = 0
-FINAL_TIME = 600
-
-# This class is responsible for calculating Traffic Flow
-class LapCounter:
-    def __init__(self):
-        self.totalLaps = 0
-        self.trafficFlow = 0
-        self.interval = 0
-        self.laps = 0
-        self.lapList = []
-        self.simTime = 0
-   
-   # Register new laps in the list of laps
-    def addLaps(self, cars):
-        for car in cars:
-            if car.lapCheck():
-                self.laps = 1                
-
-        self.lapList.append([self.laps, self.simTime])
-        self.laps = 0
-
-    # Calculate how many laps are in the list, 
-    # trim the list to the data from with the last minute
-    def countTotalLaps(self):
-        laps = []
-        for i in self.lapList:
-            if((self.simTime - i[1]) > 60):
-                self.lapList.pop(0)
-            else:
-                laps.append(i[0])
-        self.totalLaps = sum(laps)
-
-    # Calculate Traffic flow and return as a string
-    def calTrafficFlow(self, cars, simTime):
-        self.simTime = simTime
-        self.addLaps(cars)
-        self.countTotalLaps()
-
-        if simTime >= 60:
-            return str(self.totalLaps)  # if simTime > 60 -> return Traffic flow [cars/min]
-        else:
-            return 'Calculating... [wait '+str(round((60 - simTime),1)) +'s]'
+PROFILE_UPDATE = 30     # Frames between updates of the timing overlay
+CHECKPOINT_FILE = 'checkpoint.npz'  # Saved with F5, restored with F9
+DEF_REPLAY_SPEED = 10   # Replay speed-up over real time, same as the default time multiplier
+REPLAY_SEEK = 10        # Time skipped by the arrow keys in a replay [s]
 
 # This class is responsible for managing the operation of sliders in the GUI
 class SliderManager:
-    def __init__(self):
+    def __init__(self, newEngine=RingEngine, numCars=DEF_NUM_OF_CARS):
+        self.newEngine = newEngine  # Creates the engine when the number of vehicles changes
+        self.numCars = numCars      # Default and maximum number of vehicles
+
         # Initialise sliders
-        self.slider = Slider(SCREEN, 40, 200, 400, 10, min=2, max=30, step=1)
-        self.slider1 = Slider(SCREEN, 40, 280, 400, 10, min=1, max=240, step=1)
-        self.slider2 = Slider(SCREEN, 40, 360, 400, 10, min=0, max=10, step=0.5)
-        self.slider3 = Slider(SCREEN, 40, 440, 400, 10, min=0.2, max=10, step=0.01)
-        self.slider4 = Slider(SCREEN, 40, 520, 400, 10, min=1, max=10, step=1)
-        self.slider5 = Slider(SCREEN, 270, 600, 170, 10, min=0, max=DEF_NUM_OF_CARS, step=1)
-
-        self.slider.setValue(DEF_NUM_OF_CARS)
+        self.slider = Slider(Assets.getScreen(), 40, 200, 400, 10, min=2, max=numCars, step=1)
+        self.slider1 = Slider(Assets.getScreen(), 40, 280, 400, 10, min=1, max=240, step=1)
+        self.slider2 = Slider(Assets.getScreen(), 40, 360, 400, 10, min=0, max=10, step=0.5)
+        self.slider3 = Slider(Assets.getScreen(), 40, 440, 400, 10, min=0.2, max=10, step=0.01)
+        self.slider4 = Slider(Assets.getScreen(), 40, 520, 400, 10, min=1, max=10, step=1)
+        self.slider5 = Slider(Assets.getScreen(), 270, 600, 170, 10, min=0, max=numCars, step=1)
+
+        self.slider.setValue(numCars)
         self.slider1.setValue(CONST_TOPSPEED)
         self.slider2.setValue(CONST_T)
         self.slider3.setValue(CONST_A_MAX)
@@ -89,25 +60,21 @@ class SliderManager:
 
     # Restart the sliders values to default
     def resetSliders(self):
-        self.slider.setValue(DEF_NUM_OF_CARS)
+        self.slider.setValue(self.numCars)
         self.slider1.setValue(CONST_TOPSPEED)
         self.slider2.setValue(CONST_T)
         self.slider3.setValue(CONST_A_MAX)
         self.slider4.setValue(10)
         self.slider5.setValue(DEFUALT_NUM_AV)
 
-    # Update sliders
-    def updateSliders(self, cars):
+    # Update sliders, returns the engine (a new one if the number of vehicles changed)
+    def updateSliders(self, engine):
         # Number of vehicles slider
         self.newValue = self.slider.getValue()
         if self.prevValue != self.newValue:
 
-            # Update the list of cars with the new vehicles
-            # evenly space cars on the circle
-            cars = []
-            angDist = math.radians(360/self.newValue)
-            for i in range(self.newValue):
-                cars.append(Car(i*angDist, cars,angDist))
+            # Create a new engine with the vehicles evenly spaced on the circle
+            engine = self.newEngine(self.newValue)
 
             # Set the values of other sliders to default values
             self.slider1.setValue(CONST_TOPSPEED)
@@ -118,7 +85,7 @@ class SliderManager:
             # Reinitialise AV slider
             self.slider5.disable()
             self.slider5.hide()
-            self.slider5 = Slider(SCREEN, 270, 600, 170, 10, min=0, max=self.newValue, step=1)
+            self.slider5 = Slider(Assets.getScreen(), 270, 600, 170, 10, min=0, max=self.newValue, step=1)
             self.slider5.setValue(0)
             self.resetSimTime = True    # Reset simulation time if num of vehicles changed
             self.prevValue = self.newValue
@@ -126,22 +93,19 @@ class SliderManager:
         # Max speed slider
         self.newValue1 = self.slider1.getValue()
         if self.prevValue1 != self.newValue1:
-            for car in cars:
-                car.setMaxSpeed(round(self.newValue1, 2))
+            engine.setMaxSpeed(round(self.newValue1, 2))
             self.prevValue1 = self.newValue1
 
         # Time gap slider
         self.newValue2 = self.slider2.getValue()
         if self.prevValue2 != self.newValue2:
-            for car in cars:
-                car.setTimeGap(round(self.newValue2, 2))
+            engine.setTimeGap(round(self.newValue2, 2))
             self.prevValue2 = self.slider2.getValue()
 
         # Max acceleration slider
         self.newValue3 = self.slider3.getValue()
         if self.prevValue3 != self.newValue3:
-            for car in cars:
-                car.setMaxAcc(round(self.newValue3, 2))
+            engine.setMaxAcc(round(self.newValue3, 2))
             self.prevValue3 = self.newValue3
 
         # Time multiplier slider
@@ -151,23 +115,38 @@ class SliderManager:
         # Autonomous vehicles sliders
         self.newValue5 = self.slider5.getValue()
         if self.prevValue5 != self.newValue5:
-            for car in cars:
-                car.setDefault()
-            i = 0
-            random.shuffle(cars)
-            for car in cars:
-                if i >= self.newValue5:
-                    break
-                car.setAutonomous()
-                i += 1
+            engine.setDefault()
+            engine.setAutonomous(self.newValue5)
             self.prevValue5 = self.newValue5
 
-            # sort cars
-            cars.sort(key=lambda car: car.angle, reverse=False) 
-            cars = sorted(cars, key=lambda car: car.angle, reverse=False)
-
-        return cars
+        return engine
     
+    # Show the parameters of a restored engine without applying them again
+    def setValues(self, engine):
+        self.slider.setValue(engine.n)
+        self.slider1.setValue(engine.core_topspeed[0])
+        self.slider2.setValue(engine.core_T[0])
+        self.slider3.setValue(engine.core_a_max[0])
+
+        self.slider5.disable()
+        self.slider5.hide()
+        self.slider5 = Slider(Assets.getScreen(), 270, 600, 170, 10, min=0, max=engine.n, step=1)
+        self.slider5.setValue(int(engine.autonomous.sum()))
+
+        self.prevValue = self.slider.getValue()
+        self.prevValue1 = self.slider1.getValue()
+        self.prevValue2 = self.slider2.getValue()
+        self.prevValue3 = self.slider3.getValue()
+        self.prevValue5 = self.slider5.getValue()
+        self.resetSimTime = False
+
+    # Set a slider like the user would, the value is rounded to the slider step and limited to its range
+    # Names: cars, topspeed, time_gap, max_acc, multiplier, avs, values in simulation units
+    def setParameter(self, name, value):
+        slider = {'cars': self.slider, 'topspeed': self.slider1, 'time_gap': self.slider2, 'max_acc': self.slider3,
+                  'multiplier': self.slider4, 'avs': self.slider5}[name]
+        slider.setValue(max(min(slider.round(value), slider.max), slider.min))
+
     # Return the value of resetSimTime variable
     def getResetSimTime(self):
         return self.resetSimTime
@@ -185,23 +164,27 @@ class ToggleManager:
     def __init__(self):
         # Initialise the toggle switch
         if DEFAULT_NOISE:
-            self.toggle = Toggle(SCREEN, 40, 595, 60, 15,startOn=True)
+            self.toggle = Toggle(Assets.getScreen(), 40, 595, 60, 15,startOn=True)
             self.prevState = False  # Leaving this False to ensure settings are applied
         else:
-            self.toggle = Toggle(SCREEN, 40, 595, 60, 15)
+            self.toggle = Toggle(Assets.getScreen(), 40, 595, 60, 15)
             self.prevState = False
 
     # Check the switch state and update relevant variables
-    def toggleCheck(self, cars):
+    def toggleCheck(self, engine):
         if (self.toggle.getValue() & (self.toggle.getValue() != self.prevState)):
-            for car in cars:
-                car.setNoise()      # Switch triggered -> add noise to model parameters
+            engine.setNoise()       # Switch triggered -> add noise to model parameters
         elif ((not self.toggle.getValue()) & (self.toggle.getValue() != self.prevState)):
-            for car in cars:
-                car.removeNoise()   # Switch disabled -> remove noise to model parameters
+            engine.removeNoise()    # Switch disabled -> remove noise to model parameters
 
         self.prevState = self.toggle.getValue()
 
+    # Show the noise state of a restored engine without applying it again
+    def setState(self, noise):
+        if noise != self.toggle.getValue():
+            self.toggle.toggle()
+        self.prevState = noise
+
     # Reset the switch state to default
     def toggleReset(self):
         if (DEFAULT_NOISE != self.toggle.getValue()):
@@ -215,78 +198,66 @@ class buttonManager:
         self.button_reset = pygame.Rect(250,640,210,60)
         self.button_obstacle = pygame.Rect(800,520,160,40)
 
-# This class manages the simulation data saved as a CSV
-class dataManager:
-
-    # Initialise / Clear the data file
-    def initFile():
-        # Using csv.writer method from CSV package
-        with open('speed.csv', 'w', newline='') as f:
-            write = csv.writer(f)
-        with open('acc.csv', 'w', newline='') as f:
-            write = csv.writer(f)
-        with open('pos.csv', 'w', newline='') as f:
-            write = csv.writer(f)
-        with open('avs.csv', 'w', newline='') as f:
-            write = csv.writer(f)
-        
-    # Append more data to the file
-    def appendData(data, filename):
-        with open(filename, 'a', newline='') as f:
-            # using csv.writer method from CSV package
-            write = csv.writer(f)
-            for row in data:
-                write.writerow(row)
-            f.close()
-
 # The simulation manager class which is the main class of the whole program
-class simManager:
+class simManager(Simulation):
 
     # Initialise simulation variables
-    def __init__(self):
-        self.run = True
-        self.cars = []
-        self.cars_unsorted = []
-        angDist = math.radians(360/DEF_NUM_OF_CARS)
-        for i in range(DEF_NUM_OF_CARS):
-            self.cars.append(Car(i*angDist, self.cars, angDist))
+    # The number of vehicles scales with the road length, so the default density stays the same
+    # New rings start in the uniform flow equilibrium, car 0 moved back by perturbation (simulation units), or at rest
+    def __init__(self, roadRadius=CONST_ROAD_RADIUS, equilibrium=True, perturbation=0):
+        self.roadRadius = roadRadius
+        self.equilibrium = equilibrium
+        self.perturbation = perturbation
+        numCars = max(2, round(DEF_NUM_OF_CARS*roadRadius/CONST_ROAD_RADIUS))
+        super().__init__(numCars, roadRadius=roadRadius)
+        self.placeCars(self.engine)
+        self.cars = [Car(self.engine, i) for i in range(self.engine.n)]
         self.roadObjects = []
         self.plotData = []
         self.obstacles = []
-        self.simTime = 0
-        self.data_speed = []
-        self.data_acc = []
-        self.data_pos = []
-        self.lapCounter = LapCounter()
-        self.sm = SliderManager()
+        self.sm = SliderManager(self.newEngine, numCars)
         self.tm = ToggleManager()
         self.bm = buttonManager()
         self.events = pygame.event.get()
-        self.valTrafficFlow = ""
-        self.first_id = 0
         self.deltaT = 30
+        self.profiler = Profiler()  # Times the phases of every frame
+        self.showProfile = False    # Timing overlay, toggled with the P key
+        self.profileRows = []
+        self.server = None          # Optional state-streaming server, see startServer
+        self.maxSpeed = False       # Steps per frame chosen by the scheduler instead of the time multiplier, toggled with the M key
+        self.scheduler = FrameScheduler(FPS)
+        self.speedMeter = SpeedMeter()
         #dataManager.initFile()
 
     # Run the simulation
     def simRun(self):
+        self.profiler.startFrame()
         self.updateEvents()         # Check for keyboard inputs
+        self.applyCommands()        # Parameter commands of the streaming clients
+        self.profiler.mark('events')
         self.updateCarParams()      # Check for changes in noise toggle
+        self.profiler.mark('params')
         self.updateRoadObjects()    # Check for changes in slider values
 
         # If new vehicles were added, reset the simulation
         if self.sm.getResetSimTime():   
             self.resetSimulation()
+        self.profiler.mark('objects')
 
-        for i in range(self.sm.getTimeStep()):
-            self.sortRoadObejcts()      # Sort the list of Road Objects
-            self.updateCarPositions()   # Calculate car positions using IDM
-            self.updateSimTime()        # Update Simulation Time by delta_t
-        
-        # Calcuate Traffic Flow
-        self.valTrafficFlow = self.lapCounter.calTrafficFlow(self.cars, self.simTime)
+        # Calculate car positions using IDM, update Simulation Time and Traffic Flow
+        steps = self.getSteps()
+        self.simStep(steps)
+        self.profiler.mark('flow')
+        self.speedMeter.update(self.simTime)
         
         self.storeData()            # Store the Position, Speed and Acceleration data
+        if self.server is not None:
+            self.server.publish(self)   # Only hands a copy of the state to the server thread
+        self.profiler.mark('store')
         self.drawSimulation()       # Draw the simulation results to the window
+        self.profiler.mark('draw')
+        self.profiler.endFrame()
+        self.updateScheduler(steps)
 
         # TO SAVE THE DATA, UNCOMMENT THE SECTION BELOW
         """
@@ -296,6 +267,18 @@ class simManager:
             self.saveData()
         """
 
+    # Steps of the next frame, the time multiplier or as many as fit into the frame budget
+    def getSteps(self):
+        if self.maxSpeed:
+            return self.scheduler.steps
+        return self.sm.getTimeStep()
+
+    # Give the scheduler the step time and the rest of the frame time measured by the profiler
+    def updateScheduler(self, steps):
+        current = self.profiler.current
+        stepTime = current[self.profiler.index['physics']]
+        self.scheduler.update(stepTime, steps, sum(current) - stepTime)
+
     # Check for user inputs
     def updateEvents(self):
         self.events = pygame.event.get()
@@ -312,19 +295,58 @@ class simManager:
                 if self.bm.button_obstacle.collidepoint(event.pos):
                     if self.obstacles:
                         self.obstacles = []
+                        self.engine.clearObstacles()
                     else:
                         self.obstacles.append(Obstacle(math.pi/2, self.cars))
+                        self.engine.addObstacle(self.obstacles[-1].x, self.obstacles[-1].l)
                         print("An obstacle introduced at: " + "%.2f" % self.simTime + "s")
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_DOWN:
                     self.slowDownFirst()
                 if event.key == pygame.K_UP:
                     self.restartFirst()
+                if event.key == pygame.K_p:
+                    self.showProfile = not self.showProfile
+                if event.key == pygame.K_m:
+                    self.maxSpeed = not self.maxSpeed
+                if event.key == pygame.K_F5:
+                    self.saveCheckpoint(CHECKPOINT_FILE)
+                    print("Checkpoint saved at: " + "%.2f" % self.simTime + "s")
+                if event.key == pygame.K_F9:
+                    self.loadCheckpoint(CHECKPOINT_FILE)
     
+    # Stream the state to clients on localhost, see server.py
+    def startServer(self, port, rate, stride):
+        self.server = StateServer(port=port, rate=rate, stride=stride)
+        print("Streaming the simulation state on port %d" % self.server.port)
+
+    # Apply the commands of the streaming clients through the sliders, the noise toggle and the reset button
+    def applyCommands(self):
+        if self.server is None:
+            return
+        for name, value in self.server.getCommands():
+            if name == 'reset':
+                self.resetSimulation()
+                self.sm.resetSliders()
+            elif name == 'noise':
+                if bool(value) != self.tm.toggle.getValue():
+                    self.tm.toggle.toggle()
+            elif value is not None:
+                self.sm.setParameter(name, value)
+
+    # Updates cars position, timed separately from the traffic flow calculation
+    def updateCarPositions(self, steps=1):
+        super().updateCarPositions(steps)
+        self.profiler.mark('physics')
+
     # Update the list of road objects (check for new cars / obstacles)
     def updateRoadObjects(self):
-        self.roadObjects = []
-        self.roadObjects = self.sm.updateSliders(self.cars)
+        engine = self.sm.updateSliders(self.engine)
+        if engine is not self.engine:
+            self.engine = engine
+            self.cars = [Car(engine, i) for i in range(engine.n)]
+
+        self.roadObjects = list(self.cars)
         if self.obstacles:
             for ob in self.obstacles:
                 self.roadObjects.append(ob)
@@ -334,92 +356,299 @@ class simManager:
         self.simTime = 0
         self.sm.resetSimTime = False
         self.obstacles = []
+        self.engine.clearObstacles()
         self.tm.toggleReset()
         #dataManager.initFile()
 
-    # Sorts the road objects list to determine their order (required for distance recognition)
-    def sortRoadObejcts(self):
-        self.roadObjects.sort(key=lambda ro: ro.angle, reverse=False) 
-        self.roadObjects = sorted(self.roadObjects, key=lambda ro: ro.angle, reverse=False)
-
-    # Updates cars position & the list of cars
-    def updateCarPositions(self):
-        self.cars = []
-        roadObjects_tmp = self.roadObjects
-        for ro in self.roadObjects:
-            if ro.isCar:
-                ro.updatePosition(roadObjects_tmp)
-                self.cars.append(ro)
-            
+    # Create the engine for the given number of vehicles on the configured road
+    def newEngine(self, n):
+        engine = RingEngine(n, self.roadRadius)
+        self.placeCars(engine)
+        return engine
+
+    # Start a new ring in the equilibrium of its parameters, the cars of a ring started at rest stay evenly spaced
+    def placeCars(self, engine):
+        if self.equilibrium:
+            applied = engine.setEquilibrium(self.perturbation)
+            if applied is not None and applied < self.perturbation:     # None if the worker did not answer
+                print("Perturbation limited to %.2f m, the gap behind car 0 keeps the minimum gap" % (applied/6))
+
+    # Continue from a checkpoint
+    def loadCheckpoint(self, path):
+        super().loadCheckpoint(path)
+        self.restoreControls(self.engine)
+
+    # Match the controls, cars and obstacles to the engine restored from a checkpoint
+    def restoreControls(self, engine):
+        self.roadRadius = engine.roadRadius
+        self.sm.setValues(engine)
+        self.tm.setState(bool(engine.noise.any()))
+        self.cars = [Car(self.engine, i) for i in range(self.engine.n)]
+        self.obstacles = [RoadObject(x/engine.roadRadius) for x in engine.obstacleX]
+
     # Update car parameters
     def updateCarParams(self):
-        self.tm.toggleCheck(self.cars)  # Check if switch state changed
-
-    # Update simulation time
-    def updateSimTime(self):
-        self.simTime = self.simTime + self.cars[0].dt
+        self.tm.toggleCheck(self.engine)  # Check if switch state changed
 
     # Draw the simulation
+    # Small numbers of vehicles are drawn as sprites, a heat band is drawn when the sprites would overlap
     def drawSimulation(self):
+        band = None
+        if Draw.useBand(self.engine.n):
+            band = self.engine
+        else:
+            for car in self.cars:
+                car.updateVisuals()     # Update car textures and positions on the circle
+
         # Creating a list of strings used as labels in the GUI
-        labels = [self.valTrafficFlow, str(len(self.cars)), str(round(self.sm.slider1.getValue()/6,2)), str(self.sm.slider2.getValue()), str(round(self.sm.slider3.getValue()/6,2)), str(self.sm.slider4.getValue()), str(round(self.simTime,2)), str(self.sm.getACNum())]
-        Draw.drawSimulation(Draw, self.cars, labels, self.bm, self.events, self.obstacles)
+        labels = [self.valTrafficFlow, str(len(self.cars)), str(round(self.sm.slider1.getValue()/6,2)), str(self.sm.slider2.getValue()), str(round(self.sm.slider3.getValue()/6,2)), self.getSpeedupText(), str(round(self.simTime,2)), str(self.sm.getACNum())]
+
+        # Timing overlay, the percentiles are only recalculated every few frames
+        overlay = None
+        if self.showProfile:
+            if self.profiler.frames % PROFILE_UPDATE == 0 or not self.profileRows:
+                self.profileRows = self.profiler.summaryRows()
+            overlay = self.profileRows
+        Draw.drawSimulation(Draw, self.cars, labels, self.bm, self.events, self.obstacles, overlay, band)
+
+    # Achieved speed-up over real time and what sets it, the time multiplier or the scheduler
+    def getSpeedupText(self):
+        speedup = self.speedMeter.getSpeedup()
+        achieved = '-' if math.isnan(speedup) else '%.1f' % speedup
+        return 'x%s (%s)' % (achieved, 'max' if self.maxSpeed else 'set %d' % self.sm.getTimeStep())
+
+    # Stop writing the timing trace and the streaming server
+    def close(self):
+        self.profiler.stopTrace()
+        if self.server is not None:
+            self.server.close()
+
+# Mirror of the engine running in the worker process, parameter changes are sent to the worker as commands
+class EngineProxy(RingEngine):
+    def __init__(self, n, worker, roadRadius=CONST_ROAD_RADIUS):
+        super().__init__(n, roadRadius)
+        self.worker = worker
+        self.worker.reserve(n)
+        self.worker.send('cars', n, roadRadius)
+
+    # Read the state published by the worker, positions are extrapolated to the current time
+    # Returns the header values, None until the worker published a ring with the same number of cars
+    def sync(self):
+        header, arrays = self.worker.state.read()
+        if int(header['n']) != self.n:
+            return None
+        frameTime = header['multiplier']*self.dt                    # Simulated time per published frame
+        lag = min((time.monotonic() - header['wallTime'])*FPS, 1)   # Fraction of the frame since publishing
+        self.x = arrays[0] + arrays[1]*lag*frameTime
+        self.speed = arrays[1]
+        self.a = arrays[2]
+        self.autonomous = arrays[3].astype(bool)
+        return header
+
+    def send(self, name, *args):
+        self.worker.send('engine', name, args)
+
+    def setMaxSpeed(self, val):
+        self.send('setMaxSpeed', val)
+
+    def setTimeGap(self, val):
+        self.send('setTimeGap', val)
+
+    def setMaxAcc(self, val):
+        self.send('setMaxAcc', val)
+
+    def setNoise(self):
+        self.send('setNoise')
+
+    def removeNoise(self):
+        self.send('removeNoise')
+
+    def setAutonomous(self, count):
+        self.send('setAutonomous', count)
+
+    def setDefault(self):
+        self.send('setDefault')
+
+    def addObstacle(self, x, l):
+        self.send('addObstacle', x, l)
+
+    def clearObstacles(self):
+        self.send('clearObstacles')
+
+    # Waits for the worker to return the perturbation it applied
+    def setEquilibrium(self, perturbation=0):
+        return self.worker.call('setEquilibrium', perturbation)
+
+# Simulation manager running the simulation in a worker process, the GUI only draws the shared state
+class remoteManager(simManager):
+    def __init__(self, roadRadius=CONST_ROAD_RADIUS, equilibrium=True, perturbation=0):
+        self.worker = SimWorker()
+        self.multiplier = 0
+        super().__init__(roadRadius, equilibrium, perturbation)
+        self.engine = self.newEngine(self.engine.n)
+        self.cars = [Car(self.engine, i) for i in range(self.engine.n)]
+
+    def newEngine(self, n):
+        engine = EngineProxy(n, self.worker, self.roadRadius)
+        self.placeCars(engine)
+        return engine
+
+    # The worker schedules its own steps in the max speed mode, None asks it to
+    def getSteps(self):
+        if self.maxSpeed:
+            return None
+        return self.sm.getTimeStep()
+
+    # The steps run in the worker, so there is nothing to measure here
+    def updateScheduler(self, steps):
+        pass
+
+    # Read the latest state of the worker instead of stepping the simulation
+    def simStep(self, timeMultiplier):
+        if timeMultiplier != self.multiplier:
+            self.worker.send('multiplier', timeMultiplier)
+            self.multiplier = timeMultiplier
+
+        header = self.engine.sync()
+        if header is not None:
+            self.simTime = header['simTime']
+            self.lapCounter.simTime = self.simTime
+            self.lapCounter.totalLaps = int(header['totalLaps'])
+            self.valTrafficFlow = self.lapCounter.getTrafficFlow()
 
-    # Preparing data for saving in the file
-    def storeData(self):
-        self.cars_unsorted.sort(key=lambda c: c.id, reverse=False) 
-        self.cars_unsorted = sorted(self.cars, key=lambda c: c.id, reverse=False)
-        
-        speed_row = [self.simTime]
-        acc_row = [self.simTime]
-        pos_row = [self.simTime]
-
-        for car in self.cars_unsorted:
-            speed_row.append(car.speed/6)   # Converting speed to m/s
-            acc_row.append(car.a/6)         # Converting acceleration to m/s^2
-            pos_row.append(car.x/6)         # Converting position to m
-        
-        self.data_speed.append(speed_row)   # Converting speed to m/s
-        self.data_acc.append(acc_row)       # Converting acceleration to m/s^2
-        self.data_pos.append(pos_row)       # Converting position to m
+    def resetSimulation(self):
+        super().resetSimulation()
+        self.worker.send('reset')
+
+    def slowDownFirst(self):
+        self.worker.send('sim', 'slowDownFirst', ())
+
+    def restartFirst(self):
+        self.worker.send('sim', 'restartFirst', ())
+
+    def saveCheckpoint(self, path):
+        self.worker.send('sim', 'saveCheckpoint', (path,))
+
+    # The worker restores the checkpoint, a local copy provides the values for the controls
+    def loadCheckpoint(self, path):
+        state = Simulation()
+        state.loadCheckpoint(path)
+        self.roadRadius = state.engine.roadRadius   # The proxy and the view need the road of the checkpoint
+        self.engine = self.newEngine(state.engine.n)
+        self.worker.send('sim', 'loadCheckpoint', (path,))
+        self.restoreControls(state.engine)
+
+    def close(self):
+        super().close()
+        self.worker.close()
+
+# Replays a recording made with headless.py --format npy.
+# The recording is memory-mapped and only the frame on the screen is read,
+# so seeking costs the same anywhere in a run of any length.
+class replayManager:
+    def __init__(self, path):
+        self.run = True
+        self.path = path
+        self.recording = Recording(path)
+        self.frames = self.recording.getFrames()
+        if not self.frames:
+            raise ValueError("Empty recording: " + path)
+
+        # Engine arrays hold the frame on the screen, so the simulation visuals can draw it
+        n = self.recording.pos.shape[1]
+        self.engine = RingEngine(n, self.recording.roadLength*6/(2*math.pi))
+        self.engine.autonomous = self.recording.avs.copy()
+        self.cars = [Car(self.engine, i) for i in range(n)]
+
+        self.startTime = float(self.recording.time[0])
+        self.endTime = float(self.recording.time[-1])
+        self.simTime = self.startTime
+        self.frame = -1     # Frame on the screen
+        self.speed = DEF_REPLAY_SPEED
+        self.playing = True
+
+        self.timeline = Slider(Assets.getScreen(), 40, 200, 400, 10, min=0, max=max(self.frames - 1, 1), step=1)
+        self.timeline.setValue(0)
+        self.bm = buttonManager()
+        self.profiler = Profiler()
+        self.events = []
 
-    def saveData(self):
-        dataManager.appendData(self.data_speed,'speed.csv')
-        dataManager.appendData(self.data_acc,'acc.csv')
-        dataManager.appendData(self.data_pos,'pos.csv')
-        dataManager.appendData(self.listAVs(),'avs.csv')
+    # Show the next frame of the replay
+    def simRun(self):
+        self.profiler.startFrame()
+        self.updateEvents()
+        self.profiler.mark('events')
+
+        if self.timeline.getValue() != self.frame:    # Time slider dragged
+            self.seek(float(self.recording.time[int(self.timeline.getValue())]))
+        elif self.playing:
+            self.seek(self.simTime + self.speed/FPS)
+        self.profiler.mark('objects')
+
+        self.drawReplay()
+        self.profiler.mark('draw')
+        self.profiler.endFrame()
+
+    # Check for user inputs
+    def updateEvents(self):
+        self.events = pygame.event.get()
+        for event in self.events:
+            if event.type == pygame.QUIT:
+                self.run = False
+            if event.type == pygame.MOUSEBUTTONDOWN:
+                if self.bm.button_quit.collidepoint(event.pos):
+                    self.run = False
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_SPACE:
+                    if not self.playing and self.simTime >= self.endTime:
+                        self.seek(self.startTime)   # Play again from the start
+                    self.playing = not self.playing
+                if event.key == pygame.K_LEFT:
+                    self.seek(self.simTime - REPLAY_SEEK)
+                if event.key == pygame.K_RIGHT:
+                    self.seek(self.simTime + REPLAY_SEEK)
+                if event.key == pygame.K_UP:
+                    self.speed = self.speed*2
+                if event.key == pygame.K_DOWN:
+                    self.speed = max(self.speed/2, 0.25)
+                if event.key == pygame.K_HOME:
+                    self.seek(self.startTime)
+                if event.key == pygame.K_END:
+                    self.seek(self.endTime)
+
+    # Show the frame recorded at time t, the replay pauses at the end of the recording
+    def seek(self, t):
+        self.simTime = min(max(t, self.startTime), self.endTime)
+        if self.simTime >= self.endTime:
+            self.playing = False
+
+        frame = self.recording.getFrame(self.simTime)
+        if frame != self.frame:
+            self.engine.x = self.recording.pos[frame]*6         # Converting position back to simulation units
+            self.engine.speed = self.recording.speed[frame]*6
+            self.engine.a = self.recording.acc[frame]*6
+            self.frame = frame
+        self.timeline.setValue(frame)
+
+    # Draw the replay
+    def drawReplay(self):
+        band = None
+        if Draw.useBand(self.engine.n):
+            band = self.engine
+        else:
+            for car in self.cars:
+                car.updateVisuals()
+
+        texts = [os.path.basename(os.path.abspath(self.path)),
+                 '%.2f / %.2f' % (self.simTime, self.endTime),
+                 ('playing' if self.playing else 'paused') + ' x%g' % self.speed,
+                 '%.2f' % (self.engine.speed.mean()/6)]
+        Draw.drawReplay(Draw, self.cars, texts, self.bm, self.events, band)
 
     # Return the run variable
     def getRun(self):
         return self.run
-    
-    # Slow down the leading vehicle
-    def slowDownFirst(self):
-        i = 0
-        for car in self.roadObjects:
-            if car.isCar:
-                if car.getID() == (len(self.cars) - 1):
-                    self.roadObjects[i].topspeed = (self.roadObjects[i].core_topspeed/20)
-                    self.first_id = (len(self.cars) - 1)
-            i += 1
-
-    # Reset the leading vehicle speed to default
-    def restartFirst(self):
-        for ro in self.roadObjects:
-            if ro.isCar:
-                if ro.getID() == self.first_id:
-                    ro.setMaxSpeed(ro.core_topspeed)
-                    break
-
-    # Create a list of IDs of AVs -> Used for plotting the data
-    def listAVs(self):
-        self.cars_unsorted.sort(key=lambda c: c.id, reverse=False) 
-        self.cars_unsorted = sorted(self.cars, key=lambda c: c.id, reverse=False)
-        
-        avList = []
-        for car in self.cars_unsorted:
-            if car.autonomous:
-                avList.append([car.id])
-        return avList
-    
 
+    # Stop writing the timing trace
+    def close(self):
+        self.profiler.stopTrace()
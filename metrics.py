@@ -0,0 +1,155 @@
+import csv
+import os
+
+import numpy
+
+SLOW_SPEED = 30                             # 5 m/s, time below this speed is counted per vehicle
+SPEED_BINS = numpy.linspace(0, 35, 71)      # Speed histogram bin edges [m/s]
+ACC_BINS = numpy.linspace(-5, 2, 71)        # Acceleration histogram bin edges [m/s^2]
+
+# Vehicle groups of the summary, AV membership is taken from the engine at the end of the run
+GROUPS = ['fleet', 'avs', 'humans']
+
+# Columns of the per-vehicle statistics file
+VEHICLE_FIELDS = ['id', 'av', 'mean_speed', 'speed_std', 'min_speed', 'max_speed', 'mean_acc', 'acc_std',
+                  'min_acc', 'max_acc', 'min_gap', 'slow_time']
+
+# Streaming statistics of a run, updated once per frame instead of storing every frame.
+# Speed and acceleration moments are kept per vehicle with Welford's algorithm and merged
+# into the fleet, AV and human moments only for the summary, so memory stays O(N) however long the run is.
+# Speed and acceleration histograms use fixed bins, values outside the range go into the first or last bin.
+class OnlineMetrics:
+    def __init__(self, slowSpeed=SLOW_SPEED, speedBins=SPEED_BINS, accBins=ACC_BINS):
+        self.slowSpeed = slowSpeed
+        self.speedBins = numpy.asarray(speedBins)
+        self.accBins = numpy.asarray(accBins)
+        self.engine = None
+        self.reset(0)
+
+    # Clear the statistics for a ring of n vehicles
+    def reset(self, n):
+        self.samples = 0
+        self.time = None
+        self.duration = 0
+        self.speedMean = numpy.zeros(n)
+        self.speedM2 = numpy.zeros(n)
+        self.accMean = numpy.zeros(n)
+        self.accM2 = numpy.zeros(n)
+        self.minSpeed = numpy.full(n, numpy.inf)
+        self.maxSpeed = numpy.full(n, -numpy.inf)
+        self.minAcc = numpy.full(n, numpy.inf)
+        self.maxAcc = numpy.full(n, -numpy.inf)
+        self.minGap = numpy.full(n, numpy.inf)
+        self.slowTime = numpy.zeros(n)
+        # Histogram counts of AVs (row 0) and human drivers (row 1), the fleet is their sum
+        self.speedHist = numpy.zeros((2, len(self.speedBins) - 1), dtype=numpy.int64)
+        self.accHist = numpy.zeros((2, len(self.accBins) - 1), dtype=numpy.int64)
+
+    # Add the current state of the ring as one sample
+    def update(self, engine, simTime):
+        # Start again for a new engine, a different number of cars or a restarted simulation time
+        if engine is not self.engine or self.speedMean.shape != engine.speed.shape or (self.time is not None and simTime < self.time):
+            self.engine = engine
+            self.reset(engine.n)
+
+        speed = engine.speed/6      # Converting speed to m/s
+        acc = engine.a/6            # Converting acceleration to m/s^2
+        gap = engine.getGaps(engine.x, engine.speed)[0]/6   # Converting gap to m
+        dt = 0 if self.time is None else simTime - self.time
+
+        self.samples += 1
+        self.duration += dt
+        self.time = simTime
+        self.welford(self.speedMean, self.speedM2, speed)
+        self.welford(self.accMean, self.accM2, acc)
+        numpy.minimum(self.minSpeed, speed, out=self.minSpeed)
+        numpy.maximum(self.maxSpeed, speed, out=self.maxSpeed)
+        numpy.minimum(self.minAcc, acc, out=self.minAcc)
+        numpy.maximum(self.maxAcc, acc, out=self.maxAcc)
+        numpy.minimum(self.minGap, gap, out=self.minGap)
+        self.slowTime += (engine.speed < self.slowSpeed)*dt
+
+        human = (~engine.autonomous).astype(int)
+        self.histogram(self.speedHist, self.speedBins, speed, human)
+        self.histogram(self.accHist, self.accBins, acc, human)
+
+    # Welford update of the running mean and sum of squared deviations of every vehicle
+    def welford(self, mean, m2, value):
+        delta = value - mean
+        mean += delta/self.samples
+        m2 += delta*(value - mean)
+
+    # Count the values into the fixed bins, rows selected by the group of every vehicle
+    def histogram(self, hist, bins, values, group):
+        index = numpy.clip(numpy.searchsorted(bins, values, side='right') - 1, 0, len(bins) - 2)
+        hist += numpy.bincount(group*(len(bins) - 1) + index, minlength=hist.size).reshape(hist.shape)
+
+    # Vehicles of a group
+    def groupMask(self, group):
+        avs = self.engine.autonomous if self.engine is not None else numpy.zeros(0, dtype=bool)
+        if group == 'avs':
+            return avs
+        if group == 'humans':
+            return ~avs
+        return numpy.ones(avs.shape, dtype=bool)
+
+    # Pooled mean and standard deviation of a group, merged from the per-vehicle moments
+    def pooled(self, mean, m2, mask):
+        if not mask.any() or not self.samples:
+            return numpy.nan, numpy.nan
+        groupMean = mean[mask].mean()
+        groupM2 = m2[mask].sum() + self.samples*((mean[mask] - groupMean)**2).sum()
+        return groupMean, numpy.sqrt(groupM2/(self.samples*mask.sum()))
+
+    # Histogram counts of a group
+    def getHistogram(self, hist, group):
+        if group == 'avs':
+            return hist[0]
+        if group == 'humans':
+            return hist[1]
+        return hist.sum(axis=0)
+
+    # Summary of every group: moments, extremes, minimum gap and time spent below the slow speed
+    def summary(self):
+        summary = {}
+        for group in GROUPS:
+            mask = self.groupMask(group)
+            meanSpeed, speedStd = self.pooled(self.speedMean, self.speedM2, mask)
+            meanAcc, accStd = self.pooled(self.accMean, self.accM2, mask)
+            empty = not mask.any() or not self.samples
+            summary[group] = {
+                'vehicles': int(mask.sum()),
+                'mean_speed': meanSpeed,
+                'speed_std': speedStd,
+                'min_speed': numpy.nan if empty else self.minSpeed[mask].min(),
+                'max_speed': numpy.nan if empty else self.maxSpeed[mask].max(),
+                'mean_acc': meanAcc,
+                'acc_std': accStd,
+                'min_gap': numpy.nan if empty else self.minGap[mask].min(),
+                'slow_fraction': numpy.nan if empty or not self.duration else self.slowTime[mask].mean()/self.duration,
+            }
+        return summary
+
+    # One row of VEHICLE_FIELDS per vehicle
+    def vehicleRows(self):
+        speedStd = numpy.sqrt(self.speedM2/max(self.samples, 1))
+        accStd = numpy.sqrt(self.accM2/max(self.samples, 1))
+        avs = self.groupMask('avs')
+        return [[i, int(avs[i]), self.speedMean[i], speedStd[i], self.minSpeed[i], self.maxSpeed[i], self.accMean[i],
+                 accStd[i], self.minAcc[i], self.maxAcc[i], self.minGap[i], self.slowTime[i]]
+                for i in range(len(self.speedMean))]
+
+    # Write the per-vehicle statistics and the histograms of every group to CSV files
+    def save(self, path='.'):
+        with open(os.path.join(path, 'stats.csv'), 'w', newline='') as f:
+            write = csv.writer(f)
+            write.writerow(VEHICLE_FIELDS)
+            write.writerows(self.vehicleRows())
+
+        for name, hist, bins in [('speed_hist.csv', self.speedHist, self.speedBins), ('acc_hist.csv', self.accHist, self.accBins)]:
+            with open(os.path.join(path, name), 'w', newline='') as f:
+                write = csv.writer(f)
+                write.writerow(['low', 'high'] + GROUPS)
+                counts = [self.getHistogram(hist, group) for group in GROUPS]
+                for i in range(len(bins) - 1):
+                    write.writerow(['%g' % bins[i], '%g' % bins[i + 1]] + [int(c[i]) for c in counts])
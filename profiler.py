@@ -0,0 +1,82 @@
+import os
+import time
+
+import numpy
+
+# Phases of a GUI frame in the order they run in simManager.simRun
+PHASES = ['events', 'params', 'objects', 'physics', 'flow', 'store', 'draw']
+WINDOW = 600                # Frames kept for the rolling percentiles (10 s at 60 FPS)
+PERCENTILES = [50, 95, 99]
+
+# Times the phases of every frame with perf_counter.
+# A phase is the time since the previous mark, so one clock read per phase is enough.
+# The last WINDOW frames are kept in a ring buffer for percentiles, every phase can also be
+# streamed to a trace-event file (chrome://tracing, Perfetto) for offline analysis of long runs.
+class Profiler:
+    def __init__(self, phases=PHASES, window=WINDOW):
+        self.phases = phases
+        self.index = {name: i for i, name in enumerate(phases)}
+        self.times = numpy.zeros((window, len(phases)))     # Phase times of the last frames [s]
+        self.current = [0.0]*len(phases)
+        self.frames = 0
+        self.start = time.perf_counter()
+        self.last = self.start
+        self.frameStart = self.start
+        self.trace = None
+        self.traceEvents = 0
+
+    # Start timing a new frame
+    def startFrame(self):
+        self.current = [0.0]*len(self.phases)
+        self.frameStart = self.last = time.perf_counter()
+
+    # End the phase running since the previous mark
+    def mark(self, name):
+        now = time.perf_counter()
+        self.current[self.index[name]] += now - self.last
+        if self.trace is not None:
+            self.traceEvent(name, self.last, now)
+        self.last = now
+
+    # Store the phase times of the finished frame in the window
+    def endFrame(self):
+        self.times[self.frames % len(self.times)] = self.current
+        self.frames += 1
+        if self.trace is not None:
+            self.traceEvent('frame', self.frameStart, self.last)
+
+    # Percentiles of every phase and of the whole frame over the window [ms]
+    def summary(self):
+        times = self.times[:min(self.frames, len(self.times))]
+        if not len(times):
+            return {}
+        summary = {}
+        for name, column in zip(self.phases + ['frame'], numpy.column_stack([times, times.sum(axis=1)]).T):
+            summary[name] = (1000*numpy.percentile(column, PERCENTILES)).tolist()
+        return summary
+
+    # Table of strings showing the summary, used by the GUI overlay
+    def summaryRows(self):
+        rows = [['[ms]'] + ['p%d' % p for p in PERCENTILES]]
+        for name, values in self.summary().items():
+            rows.append([name] + ['%.2f' % v for v in values])
+        return rows
+
+    # Stream every timed phase to a trace-event file in the JSON array format
+    def startTrace(self, path):
+        self.trace = open(path, 'w')
+        self.trace.write('[\n')
+        self.traceEvents = 0
+
+    def traceEvent(self, name, start, end):
+        if self.traceEvents:
+            self.trace.write(',\n')
+        self.trace.write('{"name": "%s", "cat": "simRun", "ph": "X", "ts": %.1f, "dur": %.1f, "pid": %d, "tid": %d}'
+                         % (name, 1e6*(start - self.start), 1e6*(end - start), os.getpid(), name == 'frame'))
+        self.traceEvents += 1
+
+    def stopTrace(self):
+        if self.trace is not None:
+            self.trace.write('\n]\n')
+            self.trace.close()
+            self.trace = None
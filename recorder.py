@@ -0,0 +1,143 @@
+import math
+import os
+import queue
+import struct
+import threading
+
+import numpy
+
+CHUNK_FRAMES = 1024     # Frames buffered in memory before they are handed to the writer thread
+MAX_PENDING = 2         # Chunks waiting for the writer, recording blocks when the writer falls behind
+HEADER_SIZE = 128       # Fixed .npy header size, so the shape can be rewritten in place
+
+DEF_ROAD_LENGTH = 2*math.pi*300/6     # Road length of recordings without road.npy [m]
+
+# Columns of a recording, every column is one float32 .npy file of shape (frames, cars), time is (frames,)
+COLUMNS = ['speed', 'acc', 'pos']
+
+# Build a .npy (version 1.0) header of fixed size for a float32 array of the given shape
+def npyHeader(shape):
+    header = "{'descr': '<f4', 'fortran_order': False, 'shape': %s, }" % repr(tuple(shape))
+    header = header.ljust(HEADER_SIZE - 11) + '\n'
+    return b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + header.encode('latin1')
+
+# Streams the trajectories of a run into append-only .npy files in a directory.
+# Frames are collected in fixed-size float32 chunks which a background thread appends to the files,
+# so memory use does not grow with the length of the run.
+class Recorder:
+    def __init__(self, path, n, roadLength=DEF_ROAD_LENGTH):
+        self.path = path
+        self.n = n
+        self.frames = 0     # Frames in the current chunk
+        self.written = 0    # Frames handed to the writer
+        os.makedirs(path, exist_ok=True)
+        numpy.save(os.path.join(path, 'road.npy'), numpy.array([roadLength]))     # Road length [m]
+
+        self.files = {}
+        for name, shape in self.shapes(0).items():
+            self.files[name] = open(os.path.join(path, name + '.npy'), 'wb')
+            self.files[name].write(npyHeader(shape))
+        self.chunk = self.newChunk()
+
+        self.queue = queue.Queue(maxsize=MAX_PENDING)
+        self.thread = threading.Thread(target=self.writeChunks, daemon=True)
+        self.thread.start()
+
+    # Shapes of the column files holding the given number of frames
+    def shapes(self, frames):
+        shapes = {'time': (frames,)}
+        for name in COLUMNS:
+            shapes[name] = (frames, self.n)
+        return shapes
+
+    def newChunk(self):
+        chunk = {'time': numpy.empty(CHUNK_FRAMES, dtype=numpy.float32)}
+        for name in COLUMNS:
+            chunk[name] = numpy.empty((CHUNK_FRAMES, self.n), dtype=numpy.float32)
+        return chunk
+
+    # Record one frame of the engine state, converted to m, m/s and m/s^2 like the CSV files
+    def record(self, simTime, engine):
+        i = self.frames
+        self.chunk['time'][i] = simTime
+        self.chunk['speed'][i] = engine.speed/6
+        self.chunk['acc'][i] = engine.a/6
+        self.chunk['pos'][i] = engine.x/6
+        self.frames += 1
+        if self.frames == CHUNK_FRAMES:
+            self.flush()
+
+    # Hand the current chunk to the writer thread
+    def flush(self):
+        if self.frames:
+            self.written += self.frames
+            self.queue.put((self.chunk, self.frames, self.written))
+            self.chunk = self.newChunk()
+            self.frames = 0
+
+    # Writer thread, appends chunks and updates the headers so the files are readable at any time
+    def writeChunks(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            chunk, frames, written = item
+            for name, shape in self.shapes(written).items():
+                f = self.files[name]
+                f.write(chunk[name][:frames].tobytes())
+                f.seek(0)
+                f.write(npyHeader(shape))
+                f.seek(0, os.SEEK_END)
+                f.flush()
+
+    # Flush the remaining frames, write the vehicle header and close the files
+    def close(self, avs):
+        self.flush()
+        self.queue.put(None)
+        self.thread.join()
+        for f in self.files.values():
+            f.close()
+
+        vehicles = numpy.zeros((self.n, 2), dtype=numpy.int32)
+        vehicles[:, 0] = numpy.arange(self.n)   # Vehicle ids
+        vehicles[:, 1] = avs                    # AV flags
+        numpy.save(os.path.join(self.path, 'vehicles.npy'), vehicles)
+
+# Recorded trajectories, every column is memory-mapped and loaded lazily by the operating system
+class Recording:
+    def __init__(self, path):
+        self.path = path
+        self.time = numpy.load(os.path.join(path, 'time.npy'), mmap_mode='r')
+        self.speed = numpy.load(os.path.join(path, 'speed.npy'), mmap_mode='r')
+        self.acc = numpy.load(os.path.join(path, 'acc.npy'), mmap_mode='r')
+        self.pos = numpy.load(os.path.join(path, 'pos.npy'), mmap_mode='r')
+
+        roadFile = os.path.join(path, 'road.npy')
+        self.roadLength = float(numpy.load(roadFile)[0]) if os.path.exists(roadFile) else DEF_ROAD_LENGTH
+
+        vehiclesFile = os.path.join(path, 'vehicles.npy')
+        if os.path.exists(vehiclesFile):
+            vehicles = numpy.load(vehiclesFile)
+            self.ids = vehicles[:, 0]
+            self.avs = vehicles[:, 1].astype(bool)
+        else:   # Recording still in progress
+            self.ids = numpy.arange(self.pos.shape[1])
+            self.avs = numpy.zeros(self.pos.shape[1], dtype=bool)
+
+    def getFrames(self):
+        return self.time.shape[0]
+
+    # Index of the last frame recorded at or before time t, frames are evenly spaced in time
+    # so the index is calculated directly and only corrected by a few steps, without a search
+    def getFrame(self, t):
+        frames = self.getFrames()
+        if frames < 2:
+            return 0
+        t0 = float(self.time[0])
+        frameTime = (float(self.time[-1]) - t0)/(frames - 1)
+        i = int(min(max((t - t0)/frameTime, 0), frames - 1))
+        while i > 0 and self.time[i] > t:
+            i -= 1
+        while i < frames - 1 and self.time[i + 1] <= t:
+            i += 1
+        return i
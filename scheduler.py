@@ -0,0 +1,65 @@
+import collections
+import math
+import time
+
+from engine import FPS
+
+MIN_STEPS = 1
+MAX_STEPS = 2000        # Upper limit of simulation steps per frame
+BUDGET_SHARE = 0.85     # Share of the frame budget filled, the rest is headroom for timing jitter
+RISE = 0.5              # Weight of a new cost above the average, so a slower frame shrinks the steps at once
+FALL = 0.1              # Weight of a new cost below the average, so the steps grow back gradually
+MAX_GROWTH = 2          # The steps grow at most by this factor from one frame to the next
+SPEEDUP_WINDOW = 1      # Wall time over which the achieved speed-up is measured [s]
+
+# Picks the number of simulation steps of every frame so the frame fits the budget of the target frame rate.
+# The cost of one step and the cost of the rest of the frame (events, storing, drawing) are moving
+# averages of the measured times, the steps are whatever fits into the budget left by the rest of the frame.
+class FrameScheduler:
+    def __init__(self, fps=FPS, minSteps=MIN_STEPS, maxSteps=MAX_STEPS):
+        self.budget = BUDGET_SHARE/fps
+        self.minSteps = minSteps
+        self.maxSteps = maxSteps
+        self.steps = minSteps
+        self.stepCost = None    # Average time of one step [s]
+        self.otherCost = None   # Average time of the rest of the frame [s]
+
+    # Moving average which follows rising costs faster than falling ones
+    def smooth(average, value):
+        if average is None:
+            return value
+        return average + (RISE if value > average else FALL)*(value - average)
+
+    # Add the times measured in the last frame [s] and return the steps of the next frame
+    def update(self, stepTime, steps, otherTime):
+        if steps > 0:
+            self.stepCost = FrameScheduler.smooth(self.stepCost, stepTime/steps)
+        self.otherCost = FrameScheduler.smooth(self.otherCost, otherTime)
+        if not self.stepCost:
+            return self.steps
+
+        fit = int((self.budget - self.otherCost)/self.stepCost)
+        self.steps = max(self.minSteps, min(fit, self.steps*MAX_GROWTH, self.maxSteps))
+        return self.steps
+
+# Simulated time per wall-clock second over the last SPEEDUP_WINDOW seconds
+class SpeedMeter:
+    def __init__(self, window=SPEEDUP_WINDOW):
+        self.window = window
+        self.samples = collections.deque()     # (wall time, simulation time) of every frame
+
+    # Add the simulation time reached in a frame, a reset simulation time starts the measurement again
+    def update(self, simTime, now=None):
+        now = time.perf_counter() if now is None else now
+        if self.samples and simTime < self.samples[-1][1]:
+            self.samples.clear()
+        self.samples.append((now, simTime))
+        while len(self.samples) > 2 and now - self.samples[1][0] >= self.window:
+            self.samples.popleft()
+
+    # Achieved speed-up over real time, nan until two frames were measured
+    def getSpeedup(self):
+        if len(self.samples) < 2 or self.samples[-1][0] <= self.samples[0][0]:
+            return math.nan
+        (wall0, sim0), (wall1, sim1) = self.samples[0], self.samples[-1]
+        return (sim1 - sim0)/(wall1 - wall0)
@@ -0,0 +1,289 @@
+"""
+IDM Traffic Simulator - state-streaming server and client.
+The GUI started with --serve streams the vehicle states and the traffic flow to clients on localhost
+and accepts parameter commands from them. Running this module connects to such a GUI
+and prints the received frames, parameters can be changed with --set name=value.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import queue
+import socket
+import struct
+import threading
+import time
+
+import numpy
+
+DEF_HOST = '127.0.0.1'
+DEF_PORT = 8765
+DEF_RATE = 10           # Frames per second sent to the clients
+DEF_STRIDE = 1          # Every stride-th vehicle is sent
+KEYFRAME_INTERVAL = 50  # Frames between full frames, so errors cannot add up
+MAX_BUFFER = 1 << 20    # Frames are skipped for clients with more unsent bytes than this
+
+# Binary frame: a little-endian header followed by the vehicle arrays.
+# Positions are sent in centimetres along the ring and speeds in cm/s. A key frame holds the values
+# (int32 positions, int16 speeds, AV flags packed into bits), a delta frame only the int16 differences
+# to the previous frame sent to the same client. An error frame answers a rejected command, its payload is the
+# UTF-8 message and n its length in bytes. Every frame on the socket is prefixed with its uint32 length.
+MAGIC = b'IDMS'
+VERSION = 1
+KEY = 0
+DELTA = 1
+ERROR = 2
+HEADER = struct.Struct('<4sBBHIIdff')   # magic, version, kind, stride, seq, n, simTime [s], flow [cars/min], road length [m]
+LENGTH = struct.Struct('<I')
+
+# Parameters clients can set, applied through the GUI controls like the sliders and the noise toggle
+COMMANDS = ['cars', 'topspeed', 'time_gap', 'max_acc', 'multiplier', 'avs', 'noise', 'reset']
+NOISE_VALUES = {True: True, False: False, 'on': True, 'off': False}     # Accepted values of the noise command, 1 and 0 included
+
+# Check a command received from a client and convert its value for the GUI controls
+# Returns the name and the value (a finite number, a bool for noise and None for reset), raises ValueError otherwise
+def parseCommand(command):
+    if not isinstance(command, dict) or command.get('cmd') not in COMMANDS:
+        raise ValueError("Unknown command, expected {\"cmd\": name, \"value\": value} with a name out of " + ', '.join(COMMANDS))
+    name, value = command['cmd'], command.get('value')
+    if name == 'reset':
+        return name, None
+    if name == 'noise':
+        if isinstance(value, (bool, int, float, str)) and value in NOISE_VALUES:
+            return name, NOISE_VALUES[value]
+        raise ValueError("noise expects true/false, 1/0 or on/off, got %r" % (value,))
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError("%s expects a number, got %r" % (name, value)) from None
+    if not math.isfinite(number):
+        raise ValueError("%s expects a finite number, got %r" % (name, value))
+    return name, number
+
+# Encode an error frame answering a rejected command
+def encodeError(message):
+    payload = message.encode()
+    return HEADER.pack(MAGIC, VERSION, ERROR, 0, 0, len(payload), math.nan, math.nan, math.nan) + payload
+
+# Quantise the published arrays to the integer units of the frames
+def quantise(snapshot):
+    roadLength = snapshot['roadLength']
+    x = numpy.round(numpy.mod(snapshot['x'], roadLength)*100).astype(numpy.int64)
+    v = numpy.round(snapshot['speed']*100).astype(numpy.int64)
+    return x, v, snapshot['autonomous']
+
+# Encode a frame for a client, a delta frame if it has a compatible previous frame and the differences fit into int16
+# Returns the frame and the quantised arrays the client holds after decoding it
+def encodeFrame(snapshot, seq, previous=None):
+    x, v, avs = quantise(snapshot)
+    kind = KEY
+    if previous is not None and seq % KEYFRAME_INTERVAL:
+        prevX, prevV, prevAvs = previous
+        if prevX.shape == x.shape and numpy.array_equal(prevAvs, avs):
+            cm = int(round(snapshot['roadLength']*100))
+            dx = numpy.mod(x - prevX + cm//2, cm) - cm//2   # Shortest way around the ring
+            dv = v - prevV
+            if x.size == 0 or max(numpy.abs(dx).max(), numpy.abs(dv).max()) < 1 << 15:
+                kind = DELTA
+
+    header = HEADER.pack(MAGIC, VERSION, kind, snapshot['stride'], seq, x.size, snapshot['simTime'],
+                         snapshot['flow'], snapshot['roadLength'])
+    if kind == DELTA:
+        payload = dx.astype('<i2').tobytes() + dv.astype('<i2').tobytes()
+    else:
+        payload = x.astype('<i4').tobytes() + v.astype('<i2').tobytes() + numpy.packbits(avs).tobytes()
+    return header + payload, (x, v, avs)
+
+# Decode a frame, state holds the quantised arrays of the previous frame and is updated in place
+# Returns the header values and the positions [m], speeds [m/s] and AV flags of the sent vehicles,
+# an error frame has no vehicles and holds the message of the server in header['error']
+def decodeFrame(data, state):
+    if len(data) < HEADER.size:
+        raise ValueError("Frame shorter than its header")
+    magic, version, kind, stride, seq, n, simTime, flow, roadLength = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a state frame")
+    payload = memoryview(data)[HEADER.size:]
+    if kind == ERROR:
+        header = {'seq': seq, 'kind': kind, 'n': 0, 'error': bytes(payload[:n]).decode(errors='replace')}
+        return header, numpy.zeros(0), numpy.zeros(0), numpy.zeros(0, dtype=bool)
+    if kind == KEY:
+        x = numpy.frombuffer(payload, '<i4', n).astype(numpy.int64)
+        v = numpy.frombuffer(payload, '<i2', n, 4*n).astype(numpy.int64)
+        avs = numpy.unpackbits(numpy.frombuffer(payload, numpy.uint8, offset=6*n), count=n).astype(bool)
+    elif kind == DELTA:
+        if 'x' not in state:
+            raise ValueError("Delta frame without a previous key frame")
+        cm = int(round(roadLength*100))
+        x = numpy.mod(state['x'] + numpy.frombuffer(payload, '<i2', n), cm)
+        v = state['v'] + numpy.frombuffer(payload, '<i2', n, 2*n)
+        avs = state['avs']
+    else:
+        raise ValueError("Unknown frame kind %d" % kind)
+    state.update(x=x, v=v, avs=avs)
+
+    header = {'seq': seq, 'kind': kind, 'stride': stride, 'n': n, 'simTime': simTime, 'flow': flow, 'roadLength': roadLength}
+    return header, x/100, v/100, avs
+
+# Streams the simulation state to the connected clients from an asyncio loop in a background thread.
+# publish() only copies the decimated arrays into a single slot and wakes the loop, so the simulation
+# never waits for the network: frames are encoded in the server thread and slow clients skip frames.
+class StateServer:
+    def __init__(self, host=DEF_HOST, port=DEF_PORT, rate=DEF_RATE, stride=DEF_STRIDE):
+        self.host = host
+        self.rate = rate
+        self.stride = max(1, int(stride))
+        self.commands = queue.Queue()   # Parameter commands received from the clients
+        self.clients = {}               # Writer of every client: [quantised arrays of the previous frame sent]
+        self.latest = None              # Newest snapshot, replaced by every publish
+        self.pending = False            # A broadcast is scheduled in the server loop
+        self.lock = threading.Lock()
+        self.seq = 0
+        self.nextPublish = 0
+
+        self.loop = asyncio.new_event_loop()
+        self.server = self.loop.run_until_complete(asyncio.start_server(self.handleClient, host, port))
+        self.port = self.server.sockets[0].getsockname()[1]     # Actual port when started with port 0
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    # Offer the current state of the simulation to the clients, limited to the configured rate
+    def publish(self, sim):
+        now = time.monotonic()
+        if now < self.nextPublish or not self.clients:
+            return
+        self.nextPublish = max(self.nextPublish + 1/self.rate, now)
+
+        engine = sim.engine
+        snapshot = {'x': engine.x[::self.stride]/6, 'speed': engine.speed[::self.stride]/6,    # Converting to m and m/s
+                    'autonomous': numpy.array(engine.autonomous[::self.stride], dtype=bool),
+                    'simTime': sim.simTime, 'roadLength': engine.roadLength/6, 'stride': self.stride,
+                    'flow': sim.lapCounter.totalLaps if sim.simTime >= 60 else math.nan}
+        with self.lock:
+            self.latest = snapshot
+            if self.pending:
+                return
+            self.pending = True
+        self.loop.call_soon_threadsafe(self.broadcast)
+
+    # Send the newest snapshot to every client, runs in the server thread
+    def broadcast(self):
+        with self.lock:
+            snapshot = self.latest
+            self.pending = False
+        self.seq += 1
+        for writer, client in list(self.clients.items()):
+            if writer.transport.get_write_buffer_size() > MAX_BUFFER:
+                continue    # The client is not keeping up, it gets a later frame
+            frame, client[0] = encodeFrame(snapshot, self.seq, client[0])
+            writer.write(LENGTH.pack(len(frame)) + frame)
+
+    # Serve a client, every line it sends is a JSON command {"cmd": name, "value": value}
+    # Invalid commands are dropped and answered with an error frame, a line over the stream limit closes the connection
+    async def handleClient(self, reader, writer):
+        self.clients[writer] = [None]
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    self.commands.put(parseCommand(json.loads(line)))
+                except ValueError as error:
+                    frame = encodeError(str(error))
+                    writer.write(LENGTH.pack(len(frame)) + frame)
+        except (ConnectionError, ValueError):
+            pass    # Disconnected or sent a line over the stream limit (LimitOverrunError)
+        finally:
+            del self.clients[writer]
+            writer.close()
+
+    # Return the commands received since the last call
+    def getCommands(self):
+        commands = []
+        while True:
+            try:
+                commands.append(self.commands.get_nowait())
+            except queue.Empty:
+                return commands
+
+    # Disconnect the clients and stop the server thread
+    def close(self):
+        async def shutdown():
+            self.server.close()
+            for writer in list(self.clients):
+                writer.close()
+            await self.server.wait_closed()
+        asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result(timeout=5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+        self.loop.close()
+
+# Blocking client of a StateServer, decodes the frames into the positions, speeds and AV flags of the vehicles
+class StateClient:
+    def __init__(self, host=DEF_HOST, port=DEF_PORT):
+        self.socket = socket.create_connection((host, port))
+        self.state = {}
+
+    def receive(self, size):
+        data = bytearray()
+        while len(data) < size:
+            chunk = self.socket.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("Server closed the connection")
+            data += chunk
+        return bytes(data)
+
+    # Wait for the next frame, returns the header values, positions [m], speeds [m/s] and AV flags
+    def read(self):
+        size = LENGTH.unpack(self.receive(LENGTH.size))[0]
+        return decodeFrame(self.receive(size), self.state)
+
+    # Change a parameter of the simulation, see COMMANDS
+    def send(self, cmd, value=None):
+        self.socket.sendall((json.dumps({'cmd': cmd, 'value': value}) + '\n').encode())
+
+    def close(self):
+        self.socket.close()
+
+# Parse a --set argument, name=value with a number or on/off
+def parseSetting(text):
+    name, _, value = text.partition('=')
+    if value in ('on', 'off'):
+        return name, value == 'on'
+    return name, float(value) if value else None
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(description='Watch a running IDM Traffic Simulator started with --serve.')
+    parser.add_argument('--host', default=DEF_HOST, help='address of the simulator')
+    parser.add_argument('--port', type=int, default=DEF_PORT, help='port of the simulator')
+    parser.add_argument('--set', type=parseSetting, nargs='*', default=[], metavar='NAME=VALUE',
+                        help='change parameters first (%s), e.g. topspeed=120 noise=off reset=' % ', '.join(COMMANDS))
+    parser.add_argument('--frames', type=int, default=None, help='stop after this many frames')
+    return parser.parse_args(argv)
+
+# Main function definition
+def main(argv=None):
+    args = parseArgs(argv)
+    client = StateClient(args.host, args.port)
+    for name, value in args.set:
+        client.send(name, value)
+
+    received = 0
+    try:
+        while args.frames is None or received < args.frames:
+            header, x, v, avs = client.read()
+            if header['kind'] == ERROR:
+                print("Command rejected: " + header['error'])
+                continue
+            received += 1
+            print("t=%8.2fs  %s  cars=%d  AVs=%d  flow=%5s  mean speed=%6.2f m/s"
+                  % (header['simTime'], 'key  ' if header['kind'] == KEY else 'delta', header['n'], avs.sum(),
+                     '-' if math.isnan(header['flow']) else '%d' % header['flow'], v.mean() if len(v) else 0))
+    except KeyboardInterrupt:
+        pass
+    client.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+import os
+import csv
+import numpy
+from engine import RingEngine, CONST_ROAD_RADIUS
+from recorder import Recorder
+from detectors import LoopDetectors, DEF_WINDOWS
+from metrics import OnlineMetrics
+import checkpoint
+
+# Defining constants
+DEF_NUM_OF_CARS = 30
+DEFAULT_NOISE = True
+DEFUALT_NUM_AV = 0
+FINAL_TIME = 600
+FLOW_WINDOW = 60    # Traffic flow is counted over the last minute [s]
+
+# This class is responsible for calculating Traffic Flow
+# Laps are counted by a loop detector on the start line of the ring
+class LapCounter:
+    def __init__(self):
+        self.totalLaps = 0
+        self.trafficFlow = 0
+        self.simTime = 0
+        self.detector = LoopDetectors([0], [FLOW_WINDOW])
+
+    # Register every car crossing the start line
+    def addLaps(self, engine):
+        self.detector.update(engine, self.simTime)
+
+    # Number of laps completed within the last minute
+    def countTotalLaps(self):
+        self.totalLaps = int(self.detector.getCounts()[0])
+
+    # Calculate Traffic flow and return as a string
+    def calTrafficFlow(self, engine, simTime):
+        self.simTime = simTime
+        self.addLaps(engine)
+        self.countTotalLaps()
+        return self.getTrafficFlow()
+
+    # Return the last calculated Traffic flow as a string
+    def getTrafficFlow(self):
+        simTime = self.simTime
+        if simTime >= 60:
+            return str(self.totalLaps)  # if simTime > 60 -> return Traffic flow [cars/min]
+        else:
+            return 'Calculating... [wait '+str(round((60 - simTime),1)) +'s]'
+
+# This class manages the simulation data saved as a CSV
+class dataManager:
+
+    # Initialise / Clear the data file
+    def initFile(path='.'):
+        # Using csv.writer method from CSV package
+        with open(os.path.join(path, 'speed.csv'), 'w', newline='') as f:
+            write = csv.writer(f)
+        with open(os.path.join(path, 'acc.csv'), 'w', newline='') as f:
+            write = csv.writer(f)
+        with open(os.path.join(path, 'pos.csv'), 'w', newline='') as f:
+            write = csv.writer(f)
+        with open(os.path.join(path, 'avs.csv'), 'w', newline='') as f:
+            write = csv.writer(f)
+
+    # Append more data to the file
+    def appendData(data, filename):
+        with open(filename, 'a', newline='') as f:
+            # using csv.writer method from CSV package
+            write = csv.writer(f)
+            for row in data:
+                write.writerow(row)
+            f.close()
+
+# Simulation state shared by the GUI and the headless batch mode, never touches pygame
+class Simulation:
+
+    # Initialise simulation variables
+    def __init__(self, numCars=DEF_NUM_OF_CARS, seed=None, roadRadius=CONST_ROAD_RADIUS):
+        self.run = True
+        self.engine = RingEngine(numCars, roadRadius, seed=seed)
+        self.simTime = 0
+        self.data_speed = []
+        self.data_acc = []
+        self.data_pos = []
+        self.recorder = None    # Streams the data to a recording instead of the lists when set
+        self.lapCounter = LapCounter()
+        self.valTrafficFlow = ""
+        self.detectors = None   # Optional loop detectors at arbitrary positions
+        self.metrics = None     # Optional streaming statistics of the run
+        self.first_id = 0
+
+    # Apply the model parameters in the same order as the GUI sliders and noise toggle
+    def setParameters(self, topspeed, timeGap, maxAcc, numAVs=DEFUALT_NUM_AV, noise=DEFAULT_NOISE):
+        self.engine.setMaxSpeed(topspeed)
+        self.engine.setTimeGap(timeGap)
+        self.engine.setMaxAcc(maxAcc)
+        self.engine.setDefault()
+        self.engine.setAutonomous(numAVs)
+        if noise:
+            self.engine.setNoise()
+
+    # Advance the simulation by one frame made of the given number of time steps
+    def simStep(self, timeMultiplier):
+        self.updateCarPositions(timeMultiplier)     # Calculate car positions using IDM
+        self.updateSimTime(timeMultiplier)          # Update Simulation Time by delta_t
+
+        # Calcuate Traffic Flow
+        self.valTrafficFlow = self.lapCounter.calTrafficFlow(self.engine, self.simTime)
+        if self.detectors is not None:
+            self.detectors.update(self.engine, self.simTime)
+        if self.metrics is not None:
+            self.metrics.update(self.engine, self.simTime)
+
+    # Place loop detectors at the given positions along the ring [m]
+    def addDetectors(self, positions, windows=DEF_WINDOWS):
+        self.detectors = LoopDetectors(numpy.asarray(positions)*6, windows)
+
+    # Collect streaming statistics of every frame, see metrics.py
+    def addMetrics(self):
+        self.metrics = OnlineMetrics()
+
+    # Updates cars position, the whole ring is advanced by the engine's integrator
+    def updateCarPositions(self, steps=1):
+        self.engine.advance(steps)
+
+    # Update simulation time
+    def updateSimTime(self, steps=1):
+        self.simTime = self.simTime + steps*self.engine.dt
+
+    # Preparing data for saving in the file
+    # Engine arrays are already ordered by car id
+    def storeData(self):
+        if self.recorder is not None:
+            self.recorder.record(self.simTime, self.engine)
+            return
+
+        speed_row = [self.simTime] + (self.engine.speed/6).tolist()   # Converting speed to m/s
+        acc_row = [self.simTime] + (self.engine.a/6).tolist()         # Converting acceleration to m/s^2
+        pos_row = [self.simTime] + (self.engine.x/6).tolist()         # Converting position to m
+
+        self.data_speed.append(speed_row)   # Converting speed to m/s
+        self.data_acc.append(acc_row)       # Converting acceleration to m/s^2
+        self.data_pos.append(pos_row)       # Converting position to m
+
+    def saveData(self, path='.'):
+        dataManager.appendData(self.data_speed, os.path.join(path, 'speed.csv'))
+        dataManager.appendData(self.data_acc, os.path.join(path, 'acc.csv'))
+        dataManager.appendData(self.data_pos, os.path.join(path, 'pos.csv'))
+        dataManager.appendData(self.listAVs(), os.path.join(path, 'avs.csv'))
+
+    # Stream the stored data into a binary recording in the given directory
+    def startRecording(self, path):
+        self.recorder = Recorder(path, self.engine.n, self.engine.roadLength/6)
+
+    def stopRecording(self):
+        self.recorder.close(self.engine.autonomous)
+        self.recorder = None
+
+    # Save the complete simulation state to a checkpoint file
+    def saveCheckpoint(self, path):
+        checkpoint.saveCheckpoint(self, path)
+
+    # Continue from a checkpoint file
+    def loadCheckpoint(self, path):
+        checkpoint.loadCheckpoint(self, path)
+
+    # Return the run variable
+    def getRun(self):
+        return self.run
+
+    # Release resources held by the simulation
+    def close(self):
+        pass
+
+    # Slow down the leading vehicle
+    def slowDownFirst(self):
+        self.first_id = self.engine.n - 1
+        self.engine.topspeed[self.first_id] = self.engine.core_topspeed[self.first_id]/20
+
+    # Reset the leading vehicle speed to default
+    def restartFirst(self):
+        if self.first_id < self.engine.n:
+            self.engine.topspeed[self.first_id] = self.engine.core_topspeed[self.first_id]
+
+    # Create a list of IDs of AVs -> Used for plotting the data
+    def listAVs(self):
+        return [[id] for id in numpy.flatnonzero(self.engine.autonomous).tolist()]
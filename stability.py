@@ -0,0 +1,235 @@
+"""
+IDM Traffic Simulator - linear stability predictor.
+Linearises the IDM around the uniform flow equilibrium of the ring and predicts, for whole parameter
+grids at once, whether small disturbances grow into stop-and-go waves. Human drivers and AVs (the
+parameters set by setAutonomous) are treated as two vehicle classes at a common equilibrium speed.
+Reported are the long-wave string stability margin of an open platoon and, for the ring itself,
+the amplification per lap and the growth rate of its most unstable wave. Points close to the
+stability boundary are marked borderline, only those need a full simulation (see sweep.py --prune).
+"""
+
+import argparse
+import csv
+import itertools
+import math
+import time
+
+import numpy
+
+from engine import CONST_TOPSPEED, CONST_T, CONST_A_MAX, CONST_B_MAX, CONST_S0, CONST_CAR_LENGTH, CONST_ROAD_RADIUS
+from engine import AV_A_MAX, AV_T, AV_TOPSPEED
+from equilibrium import equilibriumGap
+from simulation import DEF_NUM_OF_CARS
+
+NOISE_MAX = 1           # Parameter noise lowers the max acceleration of a car by up to this (engine.setNoise)
+BISECTIONS = 60         # Bisection steps of the equilibrium speed
+MAX_SPEED_SHARE = 1 - 1e-9  # Highest equilibrium speed as a share of the lowest desired speed
+FREQUENCIES = numpy.geomspace(1e-4, 10, 200)    # Angular frequencies searched for the ring waves [rad/s]
+CHUNK_VALUES = 1 << 21  # Grid points times frequencies evaluated at once
+BORDER = 0.25           # Waves changing by less than this log factor per lap are borderline
+
+# Predicted states
+STABLE = 'stable'
+UNSTABLE = 'unstable'
+BORDERLINE = 'borderline'
+
+# Columns of the stability map
+FIELDS = ['cars', 'topspeed', 'time_gap', 'max_acc', 'avs', 'noise', 'density', 'speed', 'human_margin',
+          'human_growth', 'av_margin', 'av_growth', 'margin', 'lap_gain', 'growth', 'state']
+
+# Common speed of the uniform flow of a ring of humans and AVs, bisection over all points at once
+# Returns the speed and the equilibrium gaps of humans and AVs, free is the road length not covered by the cars
+def ringEquilibrium(humans, avs, free, human, av):
+    # Every class is evaluated below its own desired speed, absent classes do not limit the speed
+    humanTop = human['topspeed']*MAX_SPEED_SHARE
+    avTop = av['topspeed']*MAX_SPEED_SHARE
+    gaps = lambda speed: (equilibriumGap(numpy.minimum(speed, humanTop), human['T'], human['topspeed'], human['s0']),
+                          equilibriumGap(numpy.minimum(speed, avTop), av['T'], av['topspeed'], av['s0']))
+
+    low = numpy.zeros(numpy.shape(free))
+    high = numpy.minimum(numpy.where(humans > 0, humanTop, numpy.inf), numpy.where(avs > 0, avTop, numpy.inf))
+    for i in range(BISECTIONS):
+        speed = (low + high)/2
+        humanGap, avGap = gaps(speed)
+        fits = humans*humanGap + avs*avGap <= free
+        low = numpy.where(fits, speed, low)
+        high = numpy.where(fits, high, speed)
+    return (low,) + gaps(low)
+
+# Partial derivatives of the IDM acceleration at the equilibrium: gap, own speed and approach rate (v - v_leader)
+# sqrtAb is the 2*sqrt(a*b) term of the engine, which keeps the value of the default parameters
+def derivatives(speed, gap, p):
+    desired = p['s0'] + p['T']*speed
+    fs = 2*p['a_max']*desired**2/gap**3
+    fv = -p['a_max']*(4*speed**3/p['topspeed']**4 + 2*desired*p['T']/gap**2)
+    fdv = -p['a_max']*2*desired*speed/(gap**2*p['sqrtAb'])
+    return fs, fv, fdv
+
+# Long-wave string stability criterion, a platoon is stable if fv^2/2 + fv*fdv - fs >= 0
+# Returns the criterion and its scale fv_total^2/2, their ratio is the relative margin (1 at most)
+def stringCriterion(fs, fv, fdv):
+    return fv**2/2 + fv*fdv - fs, (fv + fdv)**2/2
+
+# Speed transfer function G(iw) = (fs - fdv*iw)/(fs - w^2 - (fv + fdv)*iw) from a leader to its follower
+# Returns the log amplification and the phase at the angular frequencies. The numerator lies in the upper
+# right and the denominator in the lower half plane, so the phase stays within (-pi, pi/2) and is continuous
+def transfer(fs, fv, fdv, omega=FREQUENCIES):
+    fs, fv, fdv = [numpy.expand_dims(f, -1) for f in (fs, fv, fdv)]
+    numerator = -fdv*omega
+    real = fs - omega**2
+    damping = -(fv + fdv)*omega
+    logGain = numpy.log((fs**2 + numerator**2)/(real**2 + damping**2))/2
+    return logGain, numpy.arctan2(numerator*real - fs*damping, fs*real + numerator*damping)
+
+# Waves travelling around a ring of mixed vehicles, classes given as (numbers of cars, derivatives) over the points.
+# A disturbance passes every car once per lap, so the log gains and phase lags of all cars add up and the order
+# of the cars does not matter. The ring supports the waves whose phase lag per lap is a multiple of 2*pi,
+# a wave grows if it is amplified over a lap, at the rate of its log gain over the lap time (the group delay).
+# Returns the largest log gain per lap and the largest growth rate [1/s] of the ring waves, -inf if none was found
+def ringWaves(classes, omega=FREQUENCIES):
+    gain = numpy.zeros((len(classes[0][0]), len(omega)))
+    lag = numpy.zeros(gain.shape)
+    for count, d in classes:
+        present = count > 0     # Only the classes on the ring are evaluated
+        logGain, phase = transfer(*[f[present] for f in d], omega)
+        gain[present] += count[present, None]*logGain
+        lag[present] -= count[present, None]*phase
+
+    mode = numpy.floor(lag/(2*numpy.pi))
+    crossed = numpy.diff(mode, axis=-1) > 0
+    step = numpy.diff(lag, axis=-1)
+    share = (2*numpy.pi*mode[..., 1:] - lag[..., :-1])/numpy.where(crossed, step, 1)
+    waveGain = gain[..., :-1] + share*numpy.diff(gain, axis=-1)
+    delay = step/numpy.diff(omega)
+    return (numpy.where(crossed, waveGain, -numpy.inf).max(axis=-1),
+            numpy.where(crossed, waveGain/numpy.where(crossed, delay, 1), -numpy.inf).max(axis=-1))
+
+# Largest growth rate of the ring modes [1/s] for a ring of n identical cars
+# Mode j turns the phase by 2*pi*j/n from car to car: l^2 - (fv + fdv - fdv*e^(-i*theta))*l + fs*(1 - e^(-i*theta)) = 0
+def ringGrowth(fs, fv, fdv, n):
+    n = numpy.asarray(n)
+    j = numpy.arange(1, max(int(numpy.max(n)), 2))
+    theta = 2*numpy.pi*j/numpy.expand_dims(n, -1)
+    rotation = numpy.exp(-1j*theta)
+    fs, fv, fdv = [numpy.expand_dims(f, -1) for f in (fs, fv, fdv)]
+    b = -(fv + fdv - fdv*rotation)
+    c = fs*(1 - rotation)
+    root = numpy.sqrt(b**2 - 4*c + 0j)
+    growth = numpy.maximum(((-b + root)/2).real, ((-b - root)/2).real)
+    return numpy.where(j < numpy.expand_dims(n, -1), growth, -numpy.inf).max(axis=-1)
+
+# Predict the stability of every point of a grid, the arguments are arrays of the same shape (or scalars)
+# Parameters in simulation units like the sliders, noise lowers the max acceleration of humans by up to NOISE_MAX
+def predict(cars, topspeed=CONST_TOPSPEED, timeGap=CONST_T, maxAcc=CONST_A_MAX, avs=0, noise=False,
+            roadLength=2*math.pi*CONST_ROAD_RADIUS, bMax=CONST_B_MAX, s0=CONST_S0, carLength=CONST_CAR_LENGTH):
+    cars, topspeed, timeGap, maxAcc, avs, noise = numpy.broadcast_arrays(
+        *[numpy.asarray(value, dtype=float) for value in (cars, topspeed, timeGap, maxAcc, avs, noise)])
+    humans = cars - avs
+    sqrtAb = 2*math.sqrt(CONST_A_MAX*bMax)
+    human = {'T': timeGap, 'topspeed': topspeed, 'a_max': maxAcc, 's0': s0, 'sqrtAb': sqrtAb}
+    av = {'T': AV_T, 'topspeed': AV_TOPSPEED, 'a_max': AV_A_MAX, 's0': s0, 'sqrtAb': sqrtAb}
+    speed, humanGap, avGap = ringEquilibrium(humans, avs, roadLength - cars*carLength, human, av)
+
+    # Humans at both ends of the noise range, the lowest max acceleration is the least stable
+    weakest = dict(human, a_max=maxAcc - noise*NOISE_MAX)
+    humanD = derivatives(speed, humanGap, human)
+    weakD = derivatives(speed, humanGap, weakest)
+    avD = derivatives(speed, avGap, av)
+
+    # Head-to-tail criterion of a mixed platoon: the low-frequency gains of all cars multiply,
+    # so the criteria add up weighted by the number of cars and 1/fs^2
+    def mixedMargin(humanD, avD):
+        (humanK, humanScale), (avK, avScale) = stringCriterion(*humanD), stringCriterion(*avD)
+        criterion = humans*humanK/humanD[0]**2 + avs*avK/avD[0]**2
+        scale = humans*humanScale/humanD[0]**2 + avs*avScale/avD[0]**2
+        return criterion/scale
+
+    # Ring waves with the nominal humans at every point and the weakest humans at the points with noise,
+    # evaluated together in chunks of points to bound the memory
+    flat = lambda values: numpy.stack([numpy.broadcast_to(f, cars.shape).ravel() for f in values])
+    noisy = noise.ravel() > 0
+    humanCount = numpy.concatenate([humans.ravel(), humans.ravel()[noisy]])
+    avCount = numpy.concatenate([avs.ravel(), avs.ravel()[noisy]])
+    humanRows = numpy.concatenate([flat(humanD), flat(weakD)[:, noisy]], axis=1)
+    avRows = numpy.concatenate([flat(avD), flat(avD)[:, noisy]], axis=1)
+    size = max(1, CHUNK_VALUES//len(FREQUENCIES))
+    waves = numpy.empty((2, len(humanCount)))     # Log gain per lap and growth rate
+    for start in range(0, len(humanCount), size):
+        part = slice(start, start + size)
+        waves[:, part] = ringWaves([(humanCount[part], humanRows[:, part]), (avCount[part], avRows[:, part])])
+    nominal = waves[:, :cars.size]
+    weak = nominal.copy()
+    weak[:, noisy] = waves[:, cars.size:]
+    logGain, growth = numpy.stack([nominal, weak], axis=1).reshape((2, 2) + cars.shape)
+
+    state = numpy.where(logGain.max(axis=0) < -BORDER, STABLE, numpy.where(logGain.min(axis=0) > BORDER, UNSTABLE, BORDERLINE))
+    hasHumans, hasAvs = humans > 0, avs > 0
+
+    # Rings of one class have an exact growth rate, the estimate from the ring waves is only used for mixed rings
+    humanGrowth = numpy.where(hasHumans, ringGrowth(*weakD, cars), numpy.nan)
+    avGrowth = numpy.where(hasAvs, ringGrowth(*avD, cars), numpy.nan)
+    return {
+        'density': cars/(roadLength/6)*1000,    # Cars per km
+        'speed': speed/6,                       # Converting speed to m/s
+        'human_margin': numpy.where(hasHumans, numpy.divide(*stringCriterion(*weakD)), numpy.nan),
+        'human_growth': humanGrowth,
+        'av_margin': numpy.where(hasAvs, numpy.divide(*stringCriterion(*avD)), numpy.nan),
+        'av_growth': avGrowth,
+        'margin': numpy.minimum(mixedMargin(humanD, avD), mixedMargin(weakD, avD)),
+        'lap_gain': numpy.exp(logGain.max(axis=0)),
+        'growth': numpy.where(hasAvs, numpy.where(hasHumans, growth.max(axis=0), avGrowth), humanGrowth),
+        'state': state,
+    }
+
+# Stability map of the full grid, one row of FIELDS per point
+def stabilityMap(cars, topspeeds, timeGaps, maxAccs, avs, noises, roadLength=2*math.pi*CONST_ROAD_RADIUS):
+    points = [point for point in itertools.product(cars, topspeeds, timeGaps, maxAccs, avs, noises) if point[4] <= point[0]]
+    if not points:
+        return []
+    columns = numpy.array(points, dtype=float).T
+    prediction = predict(*columns[:4], columns[4], columns[5], roadLength)
+    rows = []
+    for i, point in enumerate(points):
+        row = dict(zip(FIELDS[:6], point))
+        row.update({name: values[i] for name, values in prediction.items()})
+        rows.append(row)
+    return rows
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(description='Predict the linear stability of IDM Traffic Simulator parameter grids.')
+    parser.add_argument('--cars', type=int, nargs='+', default=[DEF_NUM_OF_CARS], help='numbers of vehicles')
+    parser.add_argument('--topspeed', type=float, nargs='+', default=[float(CONST_TOPSPEED)], help='desired speeds (simulation units)')
+    parser.add_argument('--time-gap', type=float, nargs='+', default=[CONST_T], help='desired time headways [s]')
+    parser.add_argument('--max-acc', type=float, nargs='+', default=[CONST_A_MAX], help='max accelerations (simulation units)')
+    parser.add_argument('--avs', type=int, nargs='+', default=[0], help='numbers of autonomous vehicles')
+    parser.add_argument('--noise', choices=['on', 'off'], nargs='+', default=['on'], help='parameter noise settings')
+    parser.add_argument('--road-length', type=float, default=2*math.pi*CONST_ROAD_RADIUS/6, help='length of the ring road [m]')
+    parser.add_argument('--out', default=None, help='write the stability map to a CSV file')
+    return parser.parse_args(argv)
+
+# Main function definition
+def main(argv=None):
+    args = parseArgs(argv)
+    start = time.perf_counter()
+    rows = stabilityMap(args.cars, args.topspeed, args.time_gap, args.max_acc, args.avs,
+                        [noise == 'on' for noise in args.noise], args.road_length*6)
+    elapsed = time.perf_counter() - start
+
+    if args.out:
+        with open(args.out, 'w', newline='') as f:
+            write = csv.DictWriter(f, fieldnames=FIELDS)
+            write.writeheader()
+            write.writerows(rows)
+    else:
+        print("%6s %8s %6s %6s %4s %5s %10s %8s %8s %8s %10s" % ('cars', 'topspeed', 'T', 'a_max', 'AVs', 'noise',
+                                                               'speed', 'margin', 'growth', 'lap gain', 'state'))
+        for row in rows:
+            print("%6d %8.1f %6.2f %6.2f %4d %5s %10.2f %8.3f %8.4f %8.3f %10s"
+                  % (row['cars'], row['topspeed'], row['time_gap'], row['max_acc'], row['avs'], 'on' if row['noise'] else 'off',
+                     row['speed'], row['margin'], row['growth'], row['lap_gain'], row['state']))
+    counts = {state: sum(row['state'] == state for row in rows) for state in (STABLE, UNSTABLE, BORDERLINE)}
+    print("%d points in %.1f ms: %d stable, %d unstable, %d borderline"
+          % (len(rows), 1000*elapsed, counts[STABLE], counts[UNSTABLE], counts[BORDERLINE]))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+"""
+IDM Traffic Simulator - parameter sweep runner.
+Runs every point of a parameter grid headless on a process pool and collects
+traffic flow, mean speed and jam statistics into one CSV result table.
+Runs end early once they converged to uniform flow or a stable wave (--no-early-stop runs the full time).
+Runs start in the uniform flow equilibrium of their parameters with a small perturbation, so no time is
+spent accelerating from rest (--start rest starts them at rest like the GUI used to).
+Runs already present in the table are skipped, so an interrupted sweep can be resumed
+by repeating the same command. With --prune only the points the linear stability predictor
+(stability.py) marks as borderline are simulated, the others are stored with the predicted state.
+"""
+
+import argparse
+import csv
+import itertools
+import math
+import os
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy
+
+from engine import CONST_TOPSPEED, CONST_T, CONST_A_MAX, CONST_ROAD_RADIUS
+from headless import runScenario, DEF_TIME_MULTIPLIER, START_MODES
+from simulation import DEF_NUM_OF_CARS, FINAL_TIME
+from convergence import ConvergenceMonitor
+from stability import predict, STABLE, BORDERLINE
+
+JAM_SPEED = 30          # 5 m/s, cars below this speed are counted as jammed
+MEASURE_TIME = 60       # Statistics are collected over the last minute of each run, also of runs ended early
+DEF_PERTURBATION = 6    # 1 m, runs started in the equilibrium need a disturbance to show whether it is stable
+PREDICTED = 'predicted-'  # State prefix of the rows predicted by the linear stability analysis instead of simulated
+
+# Columns identifying a grid point, followed by the measured values
+KEY_FIELDS = ['cars', 'topspeed', 'time_gap', 'max_acc', 'avs', 'noise', 'repeat']
+FIELDS = ['run', 'seed'] + KEY_FIELDS + ['start', 'density', 'flow', 'mean_speed', 'speed_std', 'min_speed',
+                                         'jam_fraction', 'state', 'end_time', 'elapsed']
+
+# Collects speed and jam statistics of a run over a rolling measurement window,
+# one row of sums per frame, so the statistics cover the last frames wherever the run ends
+class RunStats:
+    def __init__(self, window=MEASURE_TIME):
+        self.window = window
+        self.frames = deque()   # (time, samples, speed sum, squared speed sum, jammed, min speed)
+
+    def update(self, sim):
+        speed = sim.engine.speed
+        self.frames.append((sim.simTime, speed.size, speed.sum(), (speed*speed).sum(),
+                            numpy.count_nonzero(speed < JAM_SPEED), speed.min()))
+        while self.frames[0][0] <= sim.simTime - self.window:
+            self.frames.popleft()
+
+    def totals(self):
+        return numpy.array([frame[1:5] for frame in self.frames]).sum(axis=0)
+
+    def meanSpeed(self):
+        samples, speedSum = self.totals()[:2]
+        return speedSum/samples
+
+    def speedStd(self):
+        samples, speedSum, speedSqSum = self.totals()[:3]
+        return math.sqrt(max(0, speedSqSum/samples - (speedSum/samples)**2))
+
+    def jamFraction(self):
+        samples, jammed = self.totals()[[0, 3]]
+        return jammed/samples
+
+    def minSpeed(self):
+        return min(frame[5] for frame in self.frames)
+
+# Key of a grid point, as stored in the result table
+def runKey(run):
+    return tuple(str(run[field]) for field in KEY_FIELDS)
+
+# Derive a reproducible seed from the grid point, so it does not change when the grid is extended
+def runSeed(baseSeed, run):
+    pointHash = zlib.crc32(','.join(runKey(run)).encode())
+    return int(numpy.random.SeedSequence([baseSeed, pointHash]).generate_state(1)[0])
+
+# Build the list of runs of the grid, every run is a dictionary of KEY_FIELDS plus run id and seed
+def buildGrid(cars, topspeeds, timeGaps, maxAccs, avs, noises, repeats, baseSeed):
+    runs = []
+    for point in itertools.product(cars, topspeeds, timeGaps, maxAccs, avs, noises, range(repeats)):
+        run = dict(zip(KEY_FIELDS, point))
+        if run['avs'] > run['cars']:
+            continue
+        run['run'] = len(runs)
+        run['seed'] = runSeed(baseSeed, run)
+        runs.append(run)
+    return runs
+
+# Run a single grid point, executed in a worker process
+def runPoint(run, finalTime=FINAL_TIME, timeMultiplier=DEF_TIME_MULTIPLIER, earlyStop=True, start='equilibrium',
+             perturbation=DEF_PERTURBATION):
+    startTime = time.perf_counter()
+    stats = RunStats()
+    monitor = ConvergenceMonitor(stop=earlyStop)
+    sim = runScenario(run['cars'], run['topspeed'], run['time_gap'], run['max_acc'], run['avs'], run['noise'],
+                      finalTime, timeMultiplier, run['seed'], record=False, onFrame=stats.update, monitor=monitor,
+                      start=start, perturbation=perturbation)
+
+    result = dict(run)
+    result['start'] = start
+    result['density'] = run['cars']/(2*math.pi*CONST_ROAD_RADIUS/6)*1000    # Cars per km
+    result['flow'] = sim.lapCounter.totalLaps                               # Cars per minute
+    result['mean_speed'] = stats.meanSpeed()/6                              # Converting speed to m/s
+    result['speed_std'] = stats.speedStd()/6
+    result['min_speed'] = stats.minSpeed()/6
+    result['jam_fraction'] = stats.jamFraction()
+    result['state'] = monitor.state
+    result['end_time'] = sim.simTime
+    result['elapsed'] = time.perf_counter() - startTime
+    return result
+
+# Return the keys of the runs already stored in the result table
+# Rows predicted by pruneRuns only count with predicted=True, so a sweep without --prune simulates their points
+def loadFinished(filename, predicted=True):
+    finished = set()
+    if os.path.exists(filename):
+        with open(filename, newline='') as f:
+            for row in csv.DictReader(f):
+                if predicted or not row['state'].startswith(PREDICTED):
+                    finished.add(runKey(row))
+    return finished
+
+# Split the runs into the borderline ones, which are simulated, and rows predicted by the linear stability analysis.
+# Stable points are stored with the values of their uniform flow, unstable points only with the predicted state
+def pruneRuns(runs, start='equilibrium'):
+    columns = {field: numpy.array([run[field] for run in runs], dtype=float) for field in KEY_FIELDS[:-1]}
+    prediction = predict(columns['cars'], columns['topspeed'], columns['time_gap'], columns['max_acc'],
+                         columns['avs'], columns['noise'])
+    simulate, predicted = [], []
+    for i, run in enumerate(runs):
+        state = prediction['state'][i]
+        if state == BORDERLINE:
+            simulate.append(run)
+            continue
+        result = dict(run)
+        result.update({'start': start, 'density': prediction['density'][i], 'state': PREDICTED + state, 'elapsed': 0})
+        if state == STABLE:
+            speed = prediction['speed'][i]
+            result.update({'flow': speed*60*prediction['density'][i]/1000, 'mean_speed': speed, 'speed_std': 0,
+                           'min_speed': speed, 'jam_fraction': float(speed*6 < JAM_SPEED)})
+        predicted.append(result)
+    return simulate, predicted
+
+# Run the whole grid on a process pool, results are appended to the table as they complete
+# predicted rows (see pruneRuns) are stored without running them, prune accepts the predicted rows of an earlier sweep
+def runSweep(runs, filename, finalTime=FINAL_TIME, timeMultiplier=DEF_TIME_MULTIPLIER, workers=None, earlyStop=True,
+             start='equilibrium', perturbation=DEF_PERTURBATION, predicted=(), prune=False):
+    finished = loadFinished(filename, prune)
+    pending = [run for run in runs if runKey(run) not in finished]
+    predicted = [row for row in predicted if runKey(row) not in finished]
+    print("%d runs, %d already finished" % (len(runs), len(runs) - len(pending)))
+    if predicted:
+        print("%d runs predicted without simulating them" % len(predicted))
+
+    newFile = not os.path.exists(filename) or os.path.getsize(filename) == 0
+    with open(filename, 'a', newline='') as f:
+        write = csv.DictWriter(f, fieldnames=FIELDS)
+        if newFile:
+            write.writeheader()
+        write.writerows(predicted)
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(runPoint, run, finalTime, timeMultiplier, earlyStop, start, perturbation) for run in pending]
+            for done, future in enumerate(as_completed(futures), 1):
+                write.writerow(future.result())
+                f.flush()   # Keep the table complete if the sweep is interrupted
+                print("Finished %d/%d" % (done, len(pending)))
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(description='Run a parameter sweep of the IDM Traffic Simulator.')
+    parser.add_argument('--cars', type=int, nargs='+', default=[DEF_NUM_OF_CARS], help='numbers of vehicles')
+    parser.add_argument('--topspeed', type=float, nargs='+', default=[float(CONST_TOPSPEED)], help='desired speeds (simulation units)')
+    parser.add_argument('--time-gap', type=float, nargs='+', default=[CONST_T], help='desired time headways [s]')
+    parser.add_argument('--max-acc', type=float, nargs='+', default=[CONST_A_MAX], help='max accelerations (simulation units)')
+    parser.add_argument('--avs', type=int, nargs='+', default=[0], help='numbers of autonomous vehicles')
+    parser.add_argument('--noise', choices=['on', 'off'], nargs='+', default=['on'], help='parameter noise settings')
+    parser.add_argument('--repeats', type=int, default=1, help='runs with different seeds per grid point')
+    parser.add_argument('--time', type=float, default=FINAL_TIME, help='simulated time of each run [s]')
+    parser.add_argument('--multiplier', type=int, default=DEF_TIME_MULTIPLIER, help='time steps per frame')
+    parser.add_argument('--early-stop', action=argparse.BooleanOptionalAction, default=True,
+                        help='end runs once they converged to uniform flow or a stable wave')
+    parser.add_argument('--start', choices=START_MODES, default='equilibrium',
+                        help='start the runs in the uniform flow equilibrium (no warm-up) or at rest')
+    parser.add_argument('--perturbation', type=float, default=DEF_PERTURBATION/6,
+                        help='equilibrium start: gap taken from the car behind car 0 [m]')
+    parser.add_argument('--prune', action='store_true',
+                        help='only simulate the points the linear stability analysis marks as borderline')
+    parser.add_argument('--seed', type=int, default=0, help='base seed of the sweep')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--out', default='sweep.csv', help='result table, resumed if it exists')
+    args = parser.parse_args(argv)
+    if args.perturbation < 0:
+        parser.error("--perturbation must not be negative")
+    return args
+
+# Main function definition
+def main(argv=None):
+    args = parseArgs(argv)
+    noises = [noise == 'on' for noise in args.noise]
+    runs = buildGrid(args.cars, args.topspeed, args.time_gap, args.max_acc, args.avs, noises,
+                     args.repeats, args.seed)
+    predicted = []
+    if args.prune:
+        runs, predicted = pruneRuns(runs, args.start)
+    runSweep(runs, args.out, args.time, args.multiplier, args.workers, args.early_stop, args.start, args.perturbation*6,
+             predicted, args.prune)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+import csv
+
+import numpy
+import pytest
+
+from analysis import SpaceTimeGrid, analyse, readChunks, spatialSpectrum, temporalSpectrum, waveSpeed, findFronts
+from analysis import UPSTREAM, DOWNSTREAM
+
+ROAD = 1000.0       # Road length of the synthetic wave [m]
+WAVES = 3           # Waves around the ring
+CELERITY = -5.0     # Wave speed [m/s], travelling upstream
+DURATION = 400.0    # [s]
+
+# Samples of the speed field 10 + amplitude*sin(2*pi*WAVES*(x - CELERITY*t)/ROAD) at 500 points, every 0.5 s
+def syntheticWave(amplitude=3.0):
+    time = numpy.arange(0, DURATION, 0.5)
+    pos = numpy.tile(numpy.linspace(0, ROAD, 500, endpoint=False) + 0.5, (len(time), 1))
+    speed = 10 + amplitude*numpy.sin(2*numpy.pi*WAVES*(pos - CELERITY*time[:, None])/ROAD)
+    return time, pos, speed
+
+def fullGrid(amplitude=3.0):
+    grid = SpaceTimeGrid(ROAD)
+    grid.add(*syntheticWave(amplitude))
+    return grid
+
+# Cells hold the mean of their samples, empty cells take the cell upstream, rows grow with the chunks
+def test_cell_means():
+    grid = SpaceTimeGrid(100, cellTime=1, cellLength=10)
+    grid.add(numpy.array([0.0, 0.5]), numpy.array([[5.0, 15.0], [7.0, 115.0]]), numpy.array([[1.0, 2.0], [3.0, 4.0]]))
+    grid.add(numpy.array([2.2]), numpy.array([[-5.0, 42.0]]), numpy.array([[5.0, 6.0]]))
+    speed = grid.getSpeed()
+    assert speed.shape == (3, 10)
+    numpy.testing.assert_array_equal(speed[0], [2, 3, 3, 3, 3, 3, 3, 3, 3, 3])
+    assert numpy.isnan(speed[1]).all()
+    numpy.testing.assert_array_equal(speed[2], [5, 5, 5, 5, 6, 6, 6, 6, 6, 5])
+    times, positions = grid.getAxes()
+    numpy.testing.assert_array_equal(times, [0, 1, 2])
+    numpy.testing.assert_array_equal(positions, numpy.arange(0, 100, 10))
+
+def test_chunks_give_the_same_grid():
+    time, pos, speed = syntheticWave()
+    chunked = SpaceTimeGrid(ROAD)
+    for part in numpy.array_split(numpy.arange(len(time)), 7):
+        chunked.add(time[part], pos[part], speed[part])
+    numpy.testing.assert_allclose(chunked.getSpeed(), fullGrid().getSpeed())
+
+def test_dominant_wavelength():
+    modes, wavelength, amplitude = spatialSpectrum(fullGrid().getSpeed(), ROAD)
+    k = numpy.argmax(amplitude)
+    assert modes[k] == WAVES and wavelength[k] == pytest.approx(ROAD/WAVES)
+    assert amplitude[k] == pytest.approx(3, rel=0.05)
+    assert numpy.delete(amplitude, k).max() < 0.05
+
+def test_dominant_frequency():
+    frequency, amplitude = temporalSpectrum(fullGrid().getSpeed(), 1.0)
+    assert frequency[numpy.argmax(amplitude)] == pytest.approx(WAVES*abs(CELERITY)/ROAD)
+
+def test_wave_speed():
+    assert waveSpeed(fullGrid().getSpeed(), 1.0, 10.0) == pytest.approx(CELERITY, abs=0.2)
+    assert numpy.isnan(waveSpeed(numpy.full((50, 100), 10.0), 1.0, 10.0))
+
+# Every jam has one front at each end in every row
+def test_fronts():
+    grid = fullGrid(amplitude=8)
+    times, positions = grid.getAxes()
+    time, position, kind = findFronts(grid.getSpeed(), times, positions, grid.cellLength)
+    assert (kind == UPSTREAM).sum() == (kind == DOWNSTREAM).sum() == WAVES*grid.rows
+    assert (numpy.diff(time) >= 0).all()
+
+# The CSV files of a run are read in chunks and analysed like the arrays
+def test_analyse_csv(tmp_path):
+    time, pos, speed = syntheticWave()
+    for name, values in [('pos.csv', pos), ('speed.csv', speed)]:
+        with open(tmp_path/name, 'w', newline='') as f:
+            csv.writer(f).writerows(numpy.column_stack([time, values]).tolist())
+    chunks = list(readChunks(tmp_path, chunkValues=5000))
+    assert [len(chunk[0]) for chunk in chunks[:3]] == [1, 10, 10]      # The first row gives the number of cars
+    numpy.testing.assert_array_equal(numpy.concatenate([chunk[0] for chunk in chunks]), time)
+    grid, results = analyse(tmp_path, roadLength=ROAD)
+    numpy.testing.assert_allclose(grid.getSpeed(), fullGrid().getSpeed())
+    assert results['wave_speed'] == pytest.approx(CELERITY, abs=0.2)
@@ -0,0 +1,31 @@
+import os
+import subprocess
+import sys
+
+import pygame
+
+from assets import Assets
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Importing the visuals opens no window and loads no font or image
+def test_import_has_no_side_effects():
+    code = ("import pygame, visualise, managers, main\n"
+            "from assets import Assets\n"
+            "assert not pygame.display.get_init() and not pygame.font.get_init()\n"
+            "assert Assets.screen is None and not Assets.fonts and not Assets.images\n")
+    subprocess.run([sys.executable, '-c', code], check=True, cwd=ROOT)
+
+# Every file is read once, on its first use
+def test_loaded_once(monkeypatch):
+    from visualise import IMG_CAR, FONT
+    monkeypatch.chdir(ROOT)     # The asset paths are relative to the repository
+    loads = []
+    load = pygame.image.load
+    monkeypatch.setattr(Assets, 'images', {})
+    monkeypatch.setattr(Assets, 'fonts', {})
+    monkeypatch.setattr(pygame.image, 'load', lambda filename: loads.append(filename) or load(filename))
+    image = Assets.getImage(IMG_CAR)
+    assert Assets.getImage(IMG_CAR) is image and loads == [IMG_CAR]
+    font = Assets.getFont(*FONT)
+    assert Assets.getFont(*FONT) is font and pygame.font.get_init()
@@ -0,0 +1,71 @@
+import numpy
+
+from engine import VEHICLE_ARRAYS
+from checkpoint import ENGINE_VALUES, OBSTACLE_ARRAYS
+from simulation import Simulation
+
+# Simulation with noise, AVs, an obstacle and loop detectors, advanced for a while
+def developedSimulation():
+    sim = Simulation(25, seed=7)
+    sim.setParameters(150, 1.2, 5, numAVs=3, noise=True)
+    sim.engine.integrator = 'rk4'
+    sim.addDetectors([0, 100], [5, 30])
+    sim.addMetrics()
+    sim.engine.addObstacle(500, 30)
+    for i in range(120):
+        sim.simStep(3)
+    return sim
+
+def assertSameState(a, b):
+    for name in VEHICLE_ARRAYS + OBSTACLE_ARRAYS:
+        assert numpy.array_equal(getattr(a.engine, name), getattr(b.engine, name)), name
+    for name in ENGINE_VALUES:
+        assert getattr(a.engine, name) == getattr(b.engine, name), name
+    assert a.engine.rng.bit_generator.state == b.engine.rng.bit_generator.state
+    assert a.simTime == b.simTime
+    assert a.lapCounter.totalLaps == b.lapCounter.totalLaps
+    assert numpy.array_equal(a.detectors.totals, b.detectors.totals)
+    assert numpy.array_equal(a.detectors.bins, b.detectors.bins)
+
+def test_round_trip(tmp_path):
+    sim = developedSimulation()
+    sim.saveCheckpoint(tmp_path/'state.npz')
+    restored = Simulation()
+    restored.loadCheckpoint(tmp_path/'state.npz')
+    assertSameState(sim, restored)
+
+# A restored run continues exactly like the original one, noise draws included
+def test_restored_run_continues_identically(tmp_path):
+    sim = developedSimulation()
+    sim.saveCheckpoint(tmp_path/'state.npz')
+    restored = Simulation()
+    restored.loadCheckpoint(tmp_path/'state.npz')
+    for s in (sim, restored):
+        s.engine.removeNoise()
+        s.engine.setNoise()
+        for i in range(60):
+            s.simStep(3)
+    assertSameState(sim, restored)
+    assert numpy.array_equal(sim.detectors.getFlow(), restored.detectors.getFlow())
+
+# The streaming statistics continue over the restored run instead of starting again
+def test_metrics_continue(tmp_path):
+    sim = developedSimulation()
+    sim.saveCheckpoint(tmp_path/'state.npz')
+    restored = Simulation()
+    restored.loadCheckpoint(tmp_path/'state.npz')
+    assert restored.metrics.samples == sim.metrics.samples
+    for s in (sim, restored):
+        for i in range(30):
+            s.simStep(3)
+    assert restored.metrics.samples == sim.metrics.samples == 150
+    assert restored.metrics.summary() == sim.metrics.summary()
+    assert numpy.array_equal(restored.metrics.speedHist, sim.metrics.speedHist)
+
+def test_no_metrics(tmp_path):
+    sim = Simulation(10)
+    sim.saveCheckpoint(tmp_path/'state.npz')
+    restored = Simulation()
+    restored.addMetrics()
+    restored.loadCheckpoint(tmp_path/'state.npz')
+    assert restored.metrics is None
@@ -0,0 +1,50 @@
+from types import SimpleNamespace
+
+import numpy
+
+from convergence import ConvergenceMonitor, CONVERGED_UNIFORM, CONVERGED_JAMMED, STILL_EVOLVING, WINDOW
+from convergence import AMPLITUDE, WAVE_RATIO
+from headless import runScenario
+
+def monitoredRun(cars, finalTime=3000, stop=True):
+    monitor = ConvergenceMonitor(stop=stop)
+    sim = runScenario(cars, noise=False, finalTime=finalTime, record=False, start='equilibrium', perturbation=6,
+                      monitor=monitor, seed=1)
+    return sim, monitor
+
+# A stable ring settles within the first window and the run ends there
+def test_uniform():
+    sim, monitor = monitoredRun(10)
+    assert monitor.state == CONVERGED_UNIFORM
+    assert WINDOW <= monitor.stopTime < WINDOW + 10
+    assert sim.simTime == monitor.stopTime
+
+# An unstable ring grows a wave which then keeps its shape
+def test_stable_wave():
+    sim, monitor = monitoredRun(22)
+    assert monitor.state == CONVERGED_JAMMED
+    assert 2*WINDOW < monitor.stopTime < 3000
+    speed = sim.engine.speed
+    assert numpy.ptp(speed) > 0.5*speed.mean()
+
+# Without stopping the run continues, the time of convergence is kept
+def test_no_stop():
+    sim, monitor = monitoredRun(10, finalTime=200, stop=False)
+    assert monitor.state == CONVERGED_UNIFORM
+    assert monitor.stopTime < 130 and sim.simTime >= 200
+
+# A wave whose amplitude still grows is not converged, however long it is watched
+def test_growing_wave():
+    monitor = ConvergenceMonitor()
+    sim = SimpleNamespace(simTime=0, run=True, engine=SimpleNamespace())
+    phase = numpy.linspace(0, 2*numpy.pi, 20, endpoint=False)
+    for t in range(3*WINDOW):
+        sim.simTime = t
+        sim.engine.speed = 200 + (60 + t/4)*numpy.sin(phase + t/10)
+        monitor.update(sim)
+    assert monitor.samples[:, AMPLITUDE].min() > WAVE_RATIO
+    assert monitor.state == STILL_EVOLVING and sim.run
+
+def test_short_run_is_still_evolving():
+    sim, monitor = monitoredRun(10, finalTime=WINDOW/2)
+    assert monitor.state == STILL_EVOLVING and monitor.stopTime is None
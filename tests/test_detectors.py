@@ -0,0 +1,50 @@
+import numpy
+import pytest
+
+from detectors import LoopDetectors
+from simulation import Simulation
+
+WINDOWS = [1, 5, 30]
+RESOLUTION = 0.1
+POSITIONS = [0, 150, 1000, 1800]    # Simulation units
+
+# Run a ring with a wave through the detectors and keep the time and positions of every frame
+def detectorRun(multiplier, frames):
+    sim = Simulation(30, seed=2)
+    sim.setParameters(180, 1.5, 4.38, noise=True)
+    detectors = LoopDetectors(POSITIONS, WINDOWS, RESOLUTION)
+    times, positions = [], []
+    for i in range(frames):
+        sim.simStep(multiplier)
+        detectors.update(sim.engine, sim.simTime)
+        times.append(sim.simTime)
+        positions.append(sim.engine.x.copy())
+    return sim, detectors, numpy.array(times), numpy.array(positions)
+
+# Crossings of every detector counted frame by frame over the bins of a window
+def bruteForceCounts(times, positions, roadLength, window):
+    bins = (times // RESOLUTION).astype(int)
+    counts = numpy.zeros(len(POSITIONS))
+    for k in range(1, len(times)):
+        if bins[k] > bins[-1] - int(round(window/RESOLUTION)):
+            for d, p in enumerate(POSITIONS):
+                counts[d] += (numpy.floor((positions[k] - p)/roadLength) - numpy.floor((positions[k - 1] - p)/roadLength)).sum()
+    return counts
+
+@pytest.mark.parametrize('multiplier', [1, 7, 40])
+def test_window_totals_match_brute_force(multiplier):
+    sim, detectors, times, positions = detectorRun(multiplier, 3000//multiplier)
+    for window in WINDOWS:
+        expected = bruteForceCounts(times, positions, sim.engine.roadLength, window)
+        assert numpy.array_equal(detectors.getCounts(window), expected), window
+        assert detectors.getCounts(window).sum() > 0
+
+def test_gap_longer_than_buffer_clears_windows():
+    sim, detectors, times, positions = detectorRun(5, 200)
+    sim.simTime += 100      # No update for longer than the longest window
+    sim.simStep(5)
+    detectors.update(sim.engine, sim.simTime)
+    crossed = numpy.floor_divide(sim.engine.x[None] - numpy.array(POSITIONS)[:, None], sim.engine.roadLength) \
+        - numpy.floor_divide(positions[-1][None] - numpy.array(POSITIONS)[:, None], sim.engine.roadLength)
+    for window in WINDOWS:
+        assert numpy.array_equal(detectors.getCounts(window), crossed.sum(axis=1))
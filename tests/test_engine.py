@@ -0,0 +1,80 @@
+import math
+
+import numpy
+import pytest
+
+from engine import RingEngine, CONST_A_MIN, CONST_DT
+
+# One Euler step of the original per-car update (Car.euler_step and Car.idmStep), every car following
+# its leader as it was at the start of the step, like the engine updates the whole ring at once
+def perCarStep(x, speed, p, roadLength):
+    n = len(x)
+    newX, newSpeed = x.copy(), speed.copy()
+    for i in range(n):
+        leader = (i + 1) % n
+        gap = x[leader] - x[i] + (roadLength if leader == 0 else 0)
+        delta_x = gap - p['l'][leader]
+        delta_v = speed[i] - speed[leader]
+        alpha = (p['s0'][i] + max(0, p['T'][i]*speed[i] + delta_v*speed[i]/p['sqrt_ab'][i]))/delta_x
+        a = p['a_max'][i]*(1 - (speed[i]/p['topspeed'][i])**4 - alpha**2)
+        if a < -p['b_max'][i]:
+            a = CONST_A_MIN
+        newSpeed[i] = speed[i] + a*CONST_DT
+        newX[i] = x[i] + newSpeed[i]*CONST_DT
+        if newSpeed[i] + a*CONST_DT < 0 and a != 0:     # Negative speed fix
+            newX[i] -= 1/2*newSpeed[i]**2/a
+            newSpeed[i] = 0
+    return newX, newSpeed
+
+def test_matches_per_car_loop():
+    engine = RingEngine(12, seed=4)
+    engine.setAutonomous(2)
+    engine.setNoise()
+    engine.x[3] += 25     # A short gap behind car 4 starts a wave
+    x, speed = engine.x.copy(), engine.speed.copy()
+    p = {name: getattr(engine, name).copy() for name in ['l', 's0', 'T', 'sqrt_ab', 'a_max', 'b_max', 'topspeed']}
+    for i in range(600):
+        engine.step()
+        x, speed = perCarStep(x, speed, p, engine.roadLength)
+    numpy.testing.assert_allclose(engine.x, x, rtol=0, atol=1e-9)
+    numpy.testing.assert_allclose(engine.speed, speed, rtol=0, atol=1e-9)
+
+# The gaps come from numpy.roll, the last car follows the first one across the end of the ring
+def test_gaps_wrap_around():
+    engine = RingEngine(4)
+    x = numpy.array([10.0, 100.0, 400.0, 1500.0])
+    v = numpy.array([1.0, 2.0, 3.0, 4.0])
+    delta_x, delta_v = engine.getGaps(x, v)
+    L = engine.roadLength
+    numpy.testing.assert_allclose(delta_x, [60, 270, 1070, 10 + L - 1500 - 30])
+    numpy.testing.assert_allclose(delta_v, [-1, -1, -1, 3])
+
+def test_angles_and_laps():
+    engine = RingEngine(3)
+    engine.x = numpy.array([0, engine.roadLength + 1, 2*engine.roadLength - 1])
+    numpy.testing.assert_allclose(engine.getAngles(), [0, 1/engine.roadRadius, 2*math.pi - 1/engine.roadRadius])
+    engine.prevAngle = numpy.array([0, 2*math.pi - 0.01, 3.0])
+    assert list(engine.lapCheck()) == [False, True, False]
+
+# An obstacle replaces the leader of the car directly behind it, across the end of the ring too
+@pytest.mark.parametrize('position, follower', [(500, 2), (1870, 7), (5, 0)])
+def test_obstacle_follower(position, follower):
+    engine = RingEngine(8)
+    engine.speed[:] = numpy.arange(8) + 1
+    before = engine.getGaps(engine.x, engine.speed)
+    engine.addObstacle(position, 20)
+    delta_x, delta_v = engine.getGaps(engine.x, engine.speed)
+    others = numpy.arange(8) != follower
+    numpy.testing.assert_allclose(delta_x[others], before[0][others])
+    numpy.testing.assert_allclose(delta_v[others], before[1][others])
+    assert delta_x[follower] == pytest.approx(numpy.mod(position - engine.x[follower], engine.roadLength) - 20)
+    assert delta_v[follower] == engine.speed[follower]
+
+def test_obstacle_stops_the_ring():
+    engine = RingEngine(8)
+    engine.addObstacle(1000, 20)
+    for i in range(60*120):
+        engine.step()
+    behind = int(numpy.searchsorted(engine.x, 1000)) - 1
+    gap = 1000 - engine.x[behind] - 20
+    assert 0 < gap and engine.speed[behind] < 1e-3
@@ -0,0 +1,32 @@
+import numpy
+import pytest
+
+from ensemble import parseArgs, runEnsemble
+from headless import DEF_TIME_MULTIPLIER
+from engine import CONST_DT
+
+FRAME = DEF_TIME_MULTIPLIER*CONST_DT
+
+def test_av_ring_warm_up_is_not_a_wave():
+    seeds, flow, onset = runEnsemble(4, 22, numAVs=2, finalTime=60, seed=3, start='rest')
+    assert not numpy.isnan(onset).any()
+    assert (onset > 10*FRAME).all()
+    assert (flow > 0).all()
+
+@pytest.mark.parametrize('avs', [0, 2])
+def test_uniform_flow_start_has_no_wave(avs):
+    seeds, flow, onset = runEnsemble(4, 22, numAVs=avs, noise=False, finalTime=60, seed=3, perturbation=0)
+    assert numpy.isnan(onset).all()
+    if not avs:
+        assert numpy.ptp(flow) == 0
+
+def test_replicas_are_seeded():
+    first = runEnsemble(3, 22, finalTime=30, seed=5, start='rest')
+    second = runEnsemble(3, 22, finalTime=30, seed=5, start='rest')
+    for a, b in zip(first, second):
+        numpy.testing.assert_array_equal(a, b)
+
+@pytest.mark.parametrize('argv', [['--time', '0'], ['--time', '-5'], ['--perturbation', '-1'], ['--start', 'moving']])
+def test_rejected(argv):
+    with pytest.raises(SystemExit):
+        parseArgs(argv)
@@ -0,0 +1,44 @@
+import numpy
+import pytest
+
+from engine import RingEngine
+
+# Gap of every car to its leader, the gap behind car 0 last
+def gaps(engine):
+    return numpy.mod(numpy.roll(engine.x, -1) - engine.x, engine.roadLength) - numpy.roll(engine.l, -1)
+
+@pytest.mark.parametrize('cars, avs', [(30, 0), (30, 4), (10, 0), (40, 0)])
+def test_uniform_flow_is_steady(cars, avs):
+    engine = RingEngine(cars, seed=0)
+    engine.setAutonomous(avs)
+    assert engine.setEquilibrium() == 0
+    assert numpy.ptp(engine.speed) == 0
+    assert abs(gaps(engine).sum() + engine.l.sum() - engine.roadLength) < 1e-6
+    assert numpy.abs(engine.acceleration(engine.x, engine.speed)).max() < 1e-3
+
+def test_perturbation_shortens_the_gap_behind_car_0():
+    engine = RingEngine(30)
+    engine.setEquilibrium()
+    before = gaps(engine)
+    assert engine.setEquilibrium(6) == 6
+    after = gaps(engine)
+    assert after[-1] == pytest.approx(before[-1] - 6)
+    assert after[0] == pytest.approx(before[0] + 6)     # Car 0 stays behind, its leader moves on
+    assert after[1:-1] == pytest.approx(before[1:-1])
+
+# The largest perturbations keep the minimum gap, so the next steps stay finite
+@pytest.mark.parametrize('perturbation', [1e9, numpy.inf, -5])
+def test_perturbation_bounds(perturbation):
+    engine = RingEngine(30)
+    applied = engine.setEquilibrium(perturbation)
+    assert 0 <= applied
+    assert gaps(engine).min() >= engine.s0[0] - 1e-9
+    engine.advance(60)
+    assert numpy.all(numpy.isfinite(engine.speed)) and numpy.all(numpy.isfinite(engine.a))
+
+# A ring with gaps below the minimum gap stands still and takes no perturbation
+def test_dense_ring_takes_no_perturbation():
+    engine = RingEngine(55)
+    assert engine.setEquilibrium(6) == 0
+    assert numpy.all(engine.speed == 0)
+    assert gaps(engine).min() > 0
@@ -0,0 +1,60 @@
+import numpy
+import pytest
+
+from engine import CONST_DT
+from headless import main, parseArgs, runScenario, DEF_TIME_MULTIPLIER
+
+ARGS = ['--cars', '10', '--avs', '2', '--time', '5', '--seed', '1']
+FRAMES = 30     # 5 s of frames of 10 steps
+
+def loadCsv(path):
+    return numpy.loadtxt(path, delimiter=',', ndmin=2)
+
+def test_csv_outputs(tmp_path):
+    main(ARGS + ['--out', str(tmp_path)])
+    speed, acc, pos = (loadCsv(tmp_path/name) for name in ['speed.csv', 'acc.csv', 'pos.csv'])
+    for data in (speed, acc, pos):
+        assert data.shape == (FRAMES, 11)
+        numpy.testing.assert_allclose(data[:, 0], numpy.arange(1, FRAMES + 1)*DEF_TIME_MULTIPLIER*CONST_DT)
+    assert (speed[:, 1:] >= 0).all() and (speed[-1, 1:] > speed[0, 1:]).all()
+    assert (numpy.diff(pos[:, 1:], axis=0) >= 0).all()
+    avs = loadCsv(tmp_path/'avs.csv')
+    assert avs.shape == (2, 1) and set(avs[:, 0]) <= set(range(10))
+
+# The binary recording holds the same frames as the CSV files, as float32
+def test_npy_matches_csv(tmp_path):
+    main(ARGS + ['--out', str(tmp_path/'csv')])
+    main(ARGS + ['--out', str(tmp_path/'npy'), '--format', 'npy'])
+    for column, name in [('speed', 'speed.csv'), ('acc', 'acc.csv'), ('pos', 'pos.csv')]:
+        data = loadCsv(tmp_path/'csv'/name)
+        recorded = numpy.load(tmp_path/'npy'/(column + '.npy'))
+        assert recorded.dtype == numpy.float32
+        numpy.testing.assert_allclose(recorded, data[:, 1:], rtol=1e-6, atol=1e-6)
+    numpy.testing.assert_allclose(numpy.load(tmp_path/'npy'/'time.npy'), data[:, 0], rtol=1e-6)
+
+def test_no_save_writes_nothing(tmp_path):
+    main(ARGS + ['--out', str(tmp_path/'out'), '--no-save'])
+    assert not (tmp_path/'out').exists()
+
+# Without noise and perturbation the equilibrium start is already the uniform flow
+def test_equilibrium_start_is_steady():
+    sim = runScenario(20, noise=False, finalTime=30, record=False, start='equilibrium')
+    assert numpy.ptp(sim.engine.speed) < 1e-6
+    assert sim.engine.speed.min() > 0
+
+def test_perturbation_is_limited(capsys):
+    runScenario(20, noise=False, finalTime=1, record=False, start='equilibrium', perturbation=1e6)
+    assert "Perturbation limited" in capsys.readouterr().out
+    runScenario(20, noise=False, finalTime=1, record=False, start='equilibrium', perturbation=6)
+    assert "Perturbation limited" not in capsys.readouterr().out
+
+def test_start_options():
+    args = parseArgs(['--start', 'equilibrium', '--perturbation', '2'])
+    assert (args.start, args.perturbation) == ('equilibrium', 2)
+    assert parseArgs([]).start == 'rest'
+
+@pytest.mark.parametrize('argv', [['--perturbation', '-1'], ['--perturbation'], ['--start', 'moving'],
+                                  ['--format', 'parquet']])
+def test_rejected(argv):
+    with pytest.raises(SystemExit):
+        parseArgs(argv)
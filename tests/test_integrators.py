@@ -0,0 +1,54 @@
+import numpy
+import pytest
+
+from engine import RingEngine, INTEGRATORS
+
+STEPS = 600     # 10 s of simulated time
+
+# Ring of 20 cars pulling away from rest with one gap shortened, so every integrator has a wave to follow
+def perturbedRing(integrator, tolerance=None):
+    engine = RingEngine(20, seed=1)
+    engine.x[1:] += 30
+    engine.integrator = integrator
+    if tolerance is not None:
+        engine.tolerance = tolerance
+    return engine
+
+# Reference solution of the adaptive Dormand-Prince integrator at a tight tolerance
+@pytest.fixture(scope='module')
+def reference():
+    engine = perturbedRing('adaptive', 1e-8)
+    engine.advance(STEPS)
+    return engine.x.copy(), engine.speed.copy()
+
+@pytest.mark.parametrize('integrator, tolerance', [('euler', 1), ('ballistic', 1), ('rk4', 0.05), ('adaptive', 0.1)])
+def test_integrators_agree(reference, integrator, tolerance):
+    engine = perturbedRing(integrator)
+    engine.advance(STEPS)
+    assert numpy.abs(engine.x - reference[0]).max() < tolerance
+    assert numpy.abs(engine.speed - reference[1]).max() < tolerance
+    assert numpy.all(numpy.isfinite(engine.a))
+
+def test_rk4_more_accurate_than_euler(reference):
+    errors = {}
+    for integrator in ['euler', 'rk4']:
+        engine = perturbedRing(integrator)
+        engine.advance(STEPS)
+        errors[integrator] = numpy.abs(engine.x - reference[0]).max()
+    assert errors['rk4'] < errors['euler']/5
+
+def test_adaptive_takes_fewer_steps():
+    engine = perturbedRing('adaptive')
+    engine.advance(STEPS)
+    assert 0 < engine.steps < STEPS
+
+@pytest.mark.parametrize('integrator', INTEGRATORS)
+def test_advance_zero_keeps_state(integrator):
+    engine = perturbedRing(integrator)
+    engine.advance(5)
+    x, speed, a, steps = engine.x.copy(), engine.speed.copy(), numpy.copy(engine.a), engine.steps
+    engine.advance(0)
+    assert numpy.array_equal(engine.x, x)
+    assert numpy.array_equal(engine.speed, speed)
+    assert numpy.array_equal(engine.a, a)
+    assert engine.steps == steps
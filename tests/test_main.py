@@ -0,0 +1,43 @@
+import math
+
+import pytest
+
+from engine import CONST_ROAD_RADIUS
+from main import parseArgs
+from server import DEF_PORT
+
+def test_defaults():
+    args = parseArgs([])
+    assert not args.worker
+    assert args.trace is None
+    assert args.replay is None
+    assert args.serve is None
+    assert not args.rest_start and args.perturbation == 0
+    assert args.road_length*6/(2*math.pi) == pytest.approx(CONST_ROAD_RADIUS)
+
+def test_options():
+    args = parseArgs(['--worker', '--trace', 'trace.json', '--road-length', '2000'])
+    assert args.worker
+    assert args.trace == 'trace.json'
+    assert args.road_length == 2000
+    args = parseArgs(['--rest-start', '--perturbation', '1.5'])
+    assert args.rest_start and args.perturbation == 1.5
+    assert parseArgs(['--replay', 'results']).replay == 'results'
+
+# --serve takes an optional port and nothing more
+def test_serve():
+    args = parseArgs(['--serve', '--worker'])
+    assert args.serve == DEF_PORT and args.worker
+    args = parseArgs(['--serve', '9000', '--serve-rate', '30', '--serve-stride', '2'])
+    assert (args.serve, args.serve_rate, args.serve_stride) == (9000, 30, 2)
+
+# Missing values, stray arguments and misspelt flags stop with a usage message instead of an exception
+@pytest.mark.parametrize('argv', [['--trace'], ['--worker', 'extra'], ['--tracing', 'trace.json'],
+                                  ['--road-length'], ['--road-length', 'long'], ['--road-length', '0'],
+                                  ['--road-length', '-300'], ['--replay'],
+                                  ['--serve', 'port'], ['--serve', '9000', '9001'], ['--serve-rate', '0'],
+                                  ['--serve-stride', '0'], ['--perturbation'], ['--perturbation', '-1'],
+                                  ['--replay', 'results', '--serve']])
+def test_rejected(argv):
+    with pytest.raises(SystemExit):
+        parseArgs(argv)
@@ -0,0 +1,52 @@
+import numpy
+import pytest
+
+from engine import RingEngine
+from headless import runScenario
+from metrics import SPEED_BINS
+
+# Run with both the stored frames and the streaming statistics, so they can be compared
+@pytest.fixture(scope='module')
+def recordedRun():
+    sim = runScenario(20, numAVs=3, finalTime=200, seed=4, stats=True)
+    speed = numpy.array(sim.data_speed)
+    acc = numpy.array(sim.data_acc)
+    return sim, speed[:, 0], speed[:, 1:], acc[:, 1:]
+
+def test_vehicle_moments_match_numpy(recordedRun):
+    sim, time, speed, acc = recordedRun
+    metrics = sim.metrics
+    assert metrics.samples == len(time)
+    numpy.testing.assert_allclose(metrics.speedMean, speed.mean(axis=0), rtol=1e-10)
+    numpy.testing.assert_allclose(numpy.sqrt(metrics.speedM2/metrics.samples), speed.std(axis=0), rtol=1e-8, atol=1e-10)
+    numpy.testing.assert_allclose(metrics.accMean, acc.mean(axis=0), rtol=1e-8, atol=1e-12)
+    numpy.testing.assert_allclose(numpy.sqrt(metrics.accM2/metrics.samples), acc.std(axis=0), rtol=1e-8, atol=1e-10)
+    numpy.testing.assert_array_equal(metrics.minSpeed, speed.min(axis=0))
+    numpy.testing.assert_array_equal(metrics.maxAcc, acc.max(axis=0))
+
+# The pooled group moments equal the moments of all samples of the group
+def test_group_moments_match_numpy(recordedRun):
+    sim, time, speed, acc = recordedRun
+    summary = sim.metrics.summary()
+    avs = sim.engine.autonomous
+    for group, mask in [('fleet', numpy.ones(avs.shape, dtype=bool)), ('avs', avs), ('humans', ~avs)]:
+        assert summary[group]['vehicles'] == mask.sum()
+        assert abs(summary[group]['mean_speed'] - speed[:, mask].mean()) < 1e-9
+        assert abs(summary[group]['speed_std'] - speed[:, mask].std()) < 1e-9
+        assert abs(summary[group]['acc_std'] - acc[:, mask].std()) < 1e-9
+
+def test_histograms_and_slow_time(recordedRun):
+    sim, time, speed, acc = recordedRun
+    metrics = sim.metrics
+    avs = sim.engine.autonomous
+    assert metrics.speedHist.sum() == speed.size == metrics.accHist.sum()
+    numpy.testing.assert_array_equal(metrics.speedHist[0], numpy.histogram(speed[:, avs], SPEED_BINS)[0])
+    numpy.testing.assert_array_equal(metrics.speedHist[1], numpy.histogram(speed[:, ~avs], SPEED_BINS)[0])
+    dt = numpy.diff(time, prepend=time[0])
+    numpy.testing.assert_allclose(metrics.slowTime, ((speed < 5)*dt[:, None]).sum(axis=0), atol=1e-9)
+    assert abs(metrics.duration - (time[-1] - time[0])) < 1e-9
+
+def test_new_engine_starts_again():
+    sim = runScenario(20, finalTime=10, seed=4, record=False, stats=True)
+    sim.metrics.update(RingEngine(12), sim.simTime)
+    assert sim.metrics.samples == 1 and sim.metrics.speedMean.shape == (12,)
@@ -0,0 +1,43 @@
+import numpy
+
+from recorder import CHUNK_FRAMES, Recording
+from simulation import Simulation
+
+FRAMES = 2*CHUNK_FRAMES + 100   # Several chunks and a partial one
+MULTIPLIER = 3
+
+# Record a run and keep the same frames in memory
+def recordRun(path):
+    sim = Simulation(12, seed=3)
+    sim.setParameters(150, 1.5, 4.38, numAVs=2)
+    sim.startRecording(path)
+    frames = {'time': [], 'speed': [], 'acc': [], 'pos': []}
+    for i in range(FRAMES):
+        sim.simStep(MULTIPLIER)
+        sim.storeData()
+        frames['time'].append(sim.simTime)
+        frames['speed'].append(sim.engine.speed/6)
+        frames['acc'].append(sim.engine.a/6)
+        frames['pos'].append(sim.engine.x/6)
+    sim.stopRecording()
+    return sim, {name: numpy.array(values, dtype=numpy.float32) for name, values in frames.items()}
+
+def test_recording_matches_memory(tmp_path):
+    sim, frames = recordRun(tmp_path)
+    recording = Recording(tmp_path)
+    assert recording.getFrames() == FRAMES
+    for name, values in frames.items():
+        assert numpy.array_equal(getattr(recording, name), values), name
+    assert numpy.array_equal(recording.avs, sim.engine.autonomous)
+    assert abs(recording.roadLength - sim.engine.roadLength/6) < 1e-9
+
+# getFrame finds the last frame at or before a time, like a binary search over the recorded times
+def test_get_frame(tmp_path):
+    recordRun(tmp_path)
+    recording = Recording(tmp_path)
+    times = numpy.asarray(recording.time)
+    rng = numpy.random.default_rng(0)
+    queries = numpy.concatenate([rng.uniform(times[0] - 5, times[-1] + 5, 500), times, [times[0] - 1, times[-1] + 1]])
+    for t in queries:
+        expected = max(numpy.searchsorted(times, t, side='right') - 1, 0)
+        assert recording.getFrame(t) == expected
@@ -0,0 +1,56 @@
+import math
+
+import pytest
+
+from scheduler import FrameScheduler, SpeedMeter, BUDGET_SHARE, MAX_GROWTH
+
+FPS = 60
+
+# Frames of a fake clock, every step costs stepCost and the rest of the frame otherCost [s]
+# Returns the steps and the wall time of every frame
+def runFrames(scheduler, frames, stepCost, otherCost):
+    steps, times = [], []
+    for i in range(frames):
+        n = scheduler.steps
+        scheduler.update(n*stepCost, n, otherCost)
+        steps.append(n)
+        times.append(n*stepCost + otherCost)
+    return steps, times
+
+def test_fills_the_budget():
+    scheduler = FrameScheduler(FPS)
+    steps, times = runFrames(scheduler, 30, 1e-5, 2e-3)
+    assert steps[-1] == int((BUDGET_SHARE/FPS - 2e-3)/1e-5)
+    assert max(times) <= BUDGET_SHARE/FPS + 1e-12
+    assert all(b <= MAX_GROWTH*a for a, b in zip(steps, steps[1:]))
+
+# A slower step shrinks the steps at once, a faster one lets them grow back gradually
+def test_follows_the_step_cost():
+    scheduler = FrameScheduler(FPS)
+    runFrames(scheduler, 30, 1e-5, 2e-3)
+    steps, times = runFrames(scheduler, 10, 4e-5, 2e-3)
+    assert times[0] > 1/FPS and times[1] < times[0]/2
+    assert all(t <= 1/FPS for t in times[3:])
+    steps, times = runFrames(scheduler, 5, 1e-5, 2e-3)
+    assert steps[1] < steps[-1] < int((BUDGET_SHARE/FPS - 2e-3)/1e-5)
+    steps, times = runFrames(scheduler, 100, 1e-5, 2e-3)
+    assert steps[-1] == int((BUDGET_SHARE/FPS - 2e-3)/1e-5)
+
+def test_limits():
+    scheduler = FrameScheduler(FPS, minSteps=2, maxSteps=50)
+    assert runFrames(scheduler, 30, 1e-7, 0)[0][-1] == 50
+    assert runFrames(scheduler, 30, 1e-5, 1/FPS)[0][-1] == 2
+
+def test_speed_meter():
+    meter = SpeedMeter(window=1)
+    assert math.isnan(meter.getSpeedup())
+    for frame in range(120):
+        meter.update(frame*10/FPS, now=frame/FPS)      # 10 simulated seconds per wall second
+    assert meter.getSpeedup() == pytest.approx(10)
+    assert meter.samples[-1][0] - meter.samples[0][0] <= 1 + 1/FPS
+
+    # A reset simulation time starts the measurement again
+    meter.update(0, now=2)
+    assert math.isnan(meter.getSpeedup())
+    meter.update(0.5, now=2.5)
+    assert meter.getSpeedup() == pytest.approx(1)
@@ -0,0 +1,106 @@
+import json
+import math
+
+import numpy
+import pytest
+
+from server import (KEY, DELTA, ERROR, KEYFRAME_INTERVAL, StateServer, StateClient, decodeFrame, encodeError,
+                    encodeFrame, parseCommand)
+
+ROAD_LENGTH = 314.159
+
+def snapshot(x, speed, avs):
+    return {'x': numpy.asarray(x, dtype=float), 'speed': numpy.asarray(speed, dtype=float),
+            'autonomous': numpy.asarray(avs, dtype=bool), 'simTime': 12.5, 'roadLength': ROAD_LENGTH, 'stride': 1,
+            'flow': math.nan}
+
+def test_key_frame_round_trip():
+    rng = numpy.random.default_rng(0)
+    x, speed, avs = rng.uniform(0, ROAD_LENGTH, 37), rng.uniform(0, 30, 37), rng.random(37) < 0.2
+    frame, sent = encodeFrame(snapshot(x, speed, avs), 1)
+    header, decodedX, decodedSpeed, decodedAvs = decodeFrame(frame, {})
+    assert header['kind'] == KEY and header['n'] == 37 and header['simTime'] == 12.5
+    assert numpy.abs(decodedX - numpy.round(x*100)/100).max() < 1e-9
+    assert numpy.abs(decodedSpeed - speed).max() <= 0.005 + 1e-9
+    assert numpy.array_equal(decodedAvs, avs)
+
+# Delta frames across the end of the ring decode to the same values as key frames
+def test_delta_frames_follow_key_frames():
+    rng = numpy.random.default_rng(1)
+    x, speed, avs = rng.uniform(0, ROAD_LENGTH, 20), rng.uniform(0, 30, 20), rng.random(20) < 0.3
+    state, previous = {}, None
+    for seq in range(1, 2*KEYFRAME_INTERVAL):
+        x = numpy.mod(x + speed/10, ROAD_LENGTH)
+        speed = numpy.maximum(0, speed + rng.normal(0, 0.5, 20))
+        frame, previous = encodeFrame(snapshot(x, speed, avs), seq, previous)
+        header, decodedX, decodedSpeed, decodedAvs = decodeFrame(frame, state)
+        assert header['kind'] == (KEY if seq % KEYFRAME_INTERVAL == 0 or seq == 1 else DELTA)
+        keyX, keySpeed = decodeFrame(encodeFrame(snapshot(x, speed, avs), 0)[0], {})[1:3]
+        assert numpy.array_equal(decodedX, keyX)
+        assert numpy.array_equal(decodedSpeed, keySpeed)
+        assert numpy.array_equal(decodedAvs, avs)
+
+def test_malformed_frames():
+    frame = encodeFrame(snapshot([1, 2], [3, 4], [False, True]), 1)[0]
+    with pytest.raises(ValueError):
+        decodeFrame(frame[:10], {})
+    with pytest.raises(ValueError):
+        decodeFrame(b'XXXX' + frame[4:], {})
+    with pytest.raises(ValueError):
+        decodeFrame(frame[:-3], {})
+    delta = encodeFrame(snapshot([1, 2], [3, 4], [False, True]), 2, encodeFrame(snapshot([1, 2], [3, 4], [False, True]), 1)[1])[0]
+    with pytest.raises(ValueError):
+        decodeFrame(delta, {})
+
+def test_error_frame():
+    header, x, speed, avs = decodeFrame(encodeError("max_acc expects a number"), {})
+    assert header['kind'] == ERROR and header['error'] == "max_acc expects a number"
+    assert len(x) == len(speed) == len(avs) == 0
+
+@pytest.mark.parametrize('command, expected', [
+    ({'cmd': 'max_acc', 'value': 5}, ('max_acc', 5.0)),
+    ({'cmd': 'topspeed', 'value': '120'}, ('topspeed', 120.0)),
+    ({'cmd': 'noise', 'value': True}, ('noise', True)),
+    ({'cmd': 'noise', 'value': 0}, ('noise', False)),
+    ({'cmd': 'noise', 'value': 'on'}, ('noise', True)),
+    ({'cmd': 'reset'}, ('reset', None)),
+])
+def test_valid_commands(command, expected):
+    assert parseCommand(command) == expected
+
+@pytest.mark.parametrize('command', [
+    {'cmd': 'max_acc', 'value': 'abc'},
+    {'cmd': 'max_acc', 'value': None},
+    {'cmd': 'max_acc', 'value': [1]},
+    {'cmd': 'cars', 'value': float('nan')},
+    {'cmd': 'cars', 'value': float('inf')},
+    {'cmd': 'noise', 'value': 'maybe'},
+    {'cmd': 'noise', 'value': 2},
+    {'cmd': 'shutdown', 'value': 1},
+    {'value': 1},
+    [1, 2],
+    'topspeed',
+])
+def test_malformed_commands(command):
+    with pytest.raises(ValueError):
+        parseCommand(command)
+
+# Invalid commands are answered with an error frame and never reach the simulation, an over-long line closes the client
+def test_server_rejects_invalid_commands():
+    server = StateServer(port=0)
+    client = StateClient(port=server.port)
+    try:
+        client.socket.sendall(json.dumps({'cmd': 'max_acc', 'value': 'abc'}).encode() + b'\nnot json\n'
+                              + json.dumps({'cmd': 'topspeed', 'value': 120}).encode() + b'\n')
+        for i in range(2):
+            assert client.read()[0]['kind'] == ERROR
+        client.socket.sendall(b'x'*(1 << 17) + b'\n')
+        client.socket.settimeout(5)
+        with pytest.raises(ConnectionError):
+            while True:
+                client.read()
+        assert server.getCommands() == [('topspeed', 120.0)]
+        assert not server.clients
+    finally:
+        client.close()
+        server.close()
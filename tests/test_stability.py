@@ -0,0 +1,50 @@
+import numpy
+
+from engine import CONST_T, CONST_TOPSPEED
+from headless import runScenario
+from stability import predict, ringGrowth, STABLE, UNSTABLE, BORDERLINE
+
+# Growth rate of the slowest decaying mode of the linearised ring, from the eigenvalues of the full system
+# Car i follows car i + 1: gap' = u[i+1] - u[i], u[i]' = fs*gap + fv*u[i] + fdv*(u[i] - u[i+1])
+def eigenGrowth(fs, fv, fdv, n):
+    system = numpy.zeros((2*n, 2*n))
+    for i in range(n):
+        leader = (i + 1) % n
+        system[i, n + leader] += 1
+        system[i, n + i] -= 1
+        system[n + i, i] = fs
+        system[n + i, n + i] = fv + fdv
+        system[n + i, n + leader] = -fdv
+    eigenvalues = numpy.linalg.eigvals(system)
+    return numpy.sort(eigenvalues.real)[-2]   # The largest is the shift of the whole ring (0)
+
+def test_ring_growth_matches_eigenvalues():
+    for fs, fv, fdv in [(0.05, -0.3, -0.4), (0.2, -0.1, -0.2), (0.01, -0.05, -0.9)]:
+        for n in (3, 8, 25):
+            assert abs(ringGrowth(fs, fv, fdv, n) - eigenGrowth(fs, fv, fdv, n)) < 1e-8
+
+# The default ring of humans without noise turns unstable at 13 cars
+def test_boundary_of_the_default_ring():
+    cars = numpy.arange(5, 40)
+    prediction = predict(cars)
+    state = dict(zip(cars.tolist(), prediction['state']))
+    assert all(state[n] == STABLE for n in range(5, 13))
+    assert state[13] == BORDERLINE
+    assert all(state[n] == UNSTABLE for n in range(14, 40))
+    growth = dict(zip(cars.tolist(), prediction['human_growth']))
+    assert growth[12] < 0 < growth[13]
+    assert numpy.all(numpy.diff(prediction['lap_gain'][:8]) > 0)
+
+# A longer time gap and AVs move the boundary to denser rings, noise to sparser ones
+def test_boundary_moves():
+    assert predict(14, timeGap=2*CONST_T)['lap_gain'] < 1 < predict(14)['lap_gain']
+    assert predict(20, avs=2)['state'] == STABLE
+    assert predict(12, noise=True)['lap_gain'] > predict(12)['lap_gain']
+
+# The simulation agrees on both sides of the boundary
+def test_simulation_agrees():
+    for cars, stable in [(10, True), (20, False)]:
+        sim = runScenario(cars, CONST_TOPSPEED, noise=False, finalTime=300, record=False, start='equilibrium',
+                          perturbation=6)
+        assert (numpy.ptp(sim.engine.speed) < 0.01) == stable
+        assert (numpy.ptp(sim.engine.speed) > 10) != stable
@@ -0,0 +1,85 @@
+import csv
+
+from sweep import buildGrid, runPoint, runSweep, runKey, loadFinished, pruneRuns, FIELDS, PREDICTED
+
+TIME = 20       # Simulated seconds of the test runs
+
+def grid(cars, repeats=1, seed=0):
+    return buildGrid(cars, [180.0], [1.5], [4.38], [0, 2], [True], repeats, seed)
+
+def readTable(path):
+    with open(path, newline='') as f:
+        return list(csv.DictReader(f))
+
+def test_grid():
+    runs = grid([1, 10], repeats=2)
+    assert [run['run'] for run in runs] == list(range(len(runs)))
+    assert len(runs) == 6       # 2 AVs do not fit on the ring of 1 car
+    assert all(run['avs'] <= run['cars'] for run in runs)
+    assert len({run['seed'] for run in runs}) == len(runs)
+
+# Seeds belong to the grid point, not to its position in the grid or the other points
+def test_seeds_follow_the_point():
+    small = {runKey(run): run['seed'] for run in grid([10])}
+    large = {runKey(run): run['seed'] for run in grid([5, 10, 20], repeats=3)}
+    assert all(large[key] == seed for key, seed in small.items())
+    other = {runKey(run): run['seed'] for run in grid([10], seed=1)}
+    assert all(other[key] != seed for key, seed in small.items())
+
+def test_runs_are_deterministic():
+    run = grid([12])[1]
+    first, second = runPoint(run, TIME), runPoint(run, TIME)
+    first.pop('elapsed'), second.pop('elapsed')
+    assert first == second
+
+# Repeating the command only runs the new points of the grid
+def test_resume(tmp_path, capsys):
+    table = tmp_path/'sweep.csv'
+    runSweep(grid([10]), table, TIME, workers=1)
+    rows = readTable(table)
+    assert len(rows) == 2 and list(rows[0]) == FIELDS
+
+    runSweep(grid([10]), table, TIME, workers=1)
+    assert len(readTable(table)) == 2
+    assert "2 runs, 2 already finished" in capsys.readouterr().out
+
+    runSweep(grid([10, 12]), table, TIME, workers=1)
+    rows = readTable(table)
+    assert sorted(row['cars'] for row in rows) == ['10', '10', '12', '12']
+    assert len({runKey(row) for row in rows}) == 4
+    assert loadFinished(table) == {runKey(run) for run in grid([10, 12])}
+
+# Cars 10, 13 and 20 of the default ring are stable, borderline and unstable (see test_stability)
+def prunedSweep(table):
+    runs = buildGrid([10, 13, 20], [180.0], [1.5], [4.38], [0], [False], 1, 0)
+    simulate, predicted = pruneRuns(runs)
+    assert [run['cars'] for run in simulate] == [13]
+    runSweep(simulate, table, TIME, workers=1, predicted=predicted, prune=True)
+    return runs
+
+def test_prune(tmp_path):
+    table = tmp_path/'sweep.csv'
+    prunedSweep(table)
+    states = {row['cars']: row['state'] for row in readTable(table)}
+    assert states['10'] == PREDICTED + 'stable' and states['20'] == PREDICTED + 'unstable'
+    assert not states['13'].startswith(PREDICTED)
+
+# Resuming with --prune keeps the predicted rows
+def test_resume_pruned(tmp_path):
+    table = tmp_path/'sweep.csv'
+    runs = prunedSweep(table)
+    simulate, predicted = pruneRuns(runs)
+    runSweep(simulate, table, TIME, workers=1, predicted=predicted, prune=True)
+    assert len(readTable(table)) == 3
+
+# Resuming without --prune simulates the predicted points and appends their measured rows
+def test_resume_without_prune(tmp_path):
+    table = tmp_path/'sweep.csv'
+    runs = prunedSweep(table)
+    runSweep(runs, table, TIME, workers=1)
+    rows = readTable(table)
+    assert len(rows) == 5
+    measured = [row for row in rows if not row['state'].startswith(PREDICTED)]
+    assert sorted(row['cars'] for row in measured) == ['10', '13', '20']
+    runSweep(runs, table, TIME, workers=1)
+    assert len(readTable(table)) == 5
@@ -0,0 +1,24 @@
+import math
+import os
+
+import pytest
+
+from engine import RingEngine
+from vehicles import Car, Obstacle
+from visualise import Draw
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# On a ring drawn as a heat band the car sprites are not updated, so their cached angles are stale.
+# The obstacle is still placed 60 units ahead of the leading car, at the angle of its engine position.
+def test_obstacle_ahead_of_leading_car_on_band_ring(monkeypatch):
+    monkeypatch.chdir(ROOT)     # Textures are loaded relative to the repository
+    engine = RingEngine(400, roadRadius=3000)
+    assert Draw.useBand(engine.n)
+    cars = [Car(engine, i) for i in range(engine.n)]
+    for i in range(600):
+        engine.step()
+    leading = max(cars, key=lambda car: car.x)
+    obstacle = Obstacle(math.pi/2, cars)
+    assert obstacle.x == pytest.approx(leading.x + 60)
+    assert obstacle.angle == pytest.approx(((leading.x + 60)/engine.roadRadius) % (2*math.pi))
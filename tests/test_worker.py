@@ -0,0 +1,45 @@
+import time
+
+import numpy
+import pytest
+
+from managers import EngineProxy
+from simulation import Simulation
+from worker import SimWorker, StateBuffer, ARRAYS
+
+@pytest.fixture
+def worker():
+    worker = SimWorker(capacity=10)
+    yield worker
+    worker.close()
+
+# Wait until the proxy sees the ring of the worker
+def synced(proxy):
+    deadline = time.monotonic() + 20
+    while time.monotonic() < deadline:
+        header = proxy.sync()
+        if header is not None:
+            return header
+        time.sleep(0.01)
+    raise AssertionError("the worker did not publish the ring")
+
+def test_publish_and_read():
+    state = StateBuffer(bytearray(StateBuffer.size(40)), 40)
+    sim = Simulation()
+    state.publish(sim, 10)
+    header, arrays = state.read()
+    assert header['seq'] == 2 and header['n'] == sim.engine.n
+    for row, name in enumerate(ARRAYS):
+        numpy.testing.assert_array_equal(arrays[row], getattr(sim.engine, name))
+
+def test_buffer_grows_with_the_ring(worker):
+    proxy = EngineProxy(50, worker)
+    assert synced(proxy)['n'] == 50
+    assert worker.state.capacity >= 50
+    assert proxy.x.shape == (50,)
+
+def test_equilibrium_returns_the_applied_perturbation(worker):
+    proxy = EngineProxy(30, worker)
+    assert proxy.setEquilibrium(6) == 6
+    applied = proxy.setEquilibrium(1e6)
+    assert 0 < applied < 1e6
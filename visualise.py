@@ -1,5 +1,8 @@
+import math
+import numpy
 import pygame
 import pygame_widgets
+from assets import Assets
 
 # Defining constants
 SCREEN_WIDTH = 1280
@@ -12,216 +15,422 @@ BLACK = (0, 0, 0)
 GRAY = (220, 220, 220)
 GREEN = (0, 255, 0)
 ORANGE = (220, 100, 0)
+ROAD = (51, 102, 204)
 
 CONST_CIRCLE_CENTRE = (SCREEN_WIDTH/2 + 240,SCREEN_HEIGHT/2)
+LABEL_CACHE_SIZE = 512  # Maximum number of rendered labels kept in the cache
+
+# Level of detail, vehicles are drawn as a heat band once their sprites would overlap on the ring
+SCREEN_RADIUS = 300     # Radius of the drawn ring [px]
+SPRITE_LENGTH = 30      # Length of a car sprite [px]
+BAND_BINS = 720         # Angular bins of the heat band
+BAND_SMOOTHING = 2      # Neighbouring bins on each side averaged into a bin
+BAND_RADII = (286, 318) # Inner and outer radius of the heat band [px]
+BAND_COLOURS = [(200, 30, 30), (240, 200, 40), (40, 190, 70)]   # Slowest, medium and fastest bin
+
+# Screen areas repainted every frame: the ring with the cars, the sliders and the noise toggle
+RING_RECT = pygame.Rect(CONST_CIRCLE_CENTRE[0] - 345, CONST_CIRCLE_CENTRE[1] - 345, 690, 690)
+WIDGET_RECTS = [pygame.Rect(28, y - 12, 424, 34) for y in (200, 280, 360, 440, 520)]
+WIDGET_RECTS += [pygame.Rect(258, 588, 194, 34), pygame.Rect(25, 585, 95, 35)]
+OVERLAY_POS = (1040, 10)    # Top left corner of the timing overlay
+OVERLAY_LABEL = 70          # Width of the first overlay column
+OVERLAY_COLUMN = 52         # Width of the other overlay columns
+OVERLAY_ROW = 20            # Height of an overlay row
+
+# Fonts and images, loaded by the asset registry on their first use
+FONT_TITLE = ('fonts/Roboto-Bold.ttf', 47)
+FONT_SUBTITLE = ('fonts/Roboto-Medium.ttf', 24)
+FONT = ('fonts/Roboto-Regular.ttf', 24)
+FONT_SMALL = ('fonts/Roboto-Regular.ttf', 16)
+IMG_CONE = 'images/cone.png'
+IMG_CAR = 'images/car.png'
+IMG_CAR_BREAKING = 'images/car_breaking.png'
+IMG_AC = 'images/ac.png'
+IMG_AC_BREAKING = 'images/ac_breaking.png'
 
-# Define simulation window
-SCREEN = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.RESIZABLE)
-pygame.display.set_caption('IDM Traffic Simulator')     # Set window title 
+# Draw class is responsible for visualising of the simulation
+# The static parts are rendered once into a background surface, every frame only the
+# ring, the widgets, the buttons and the changed labels are repainted and updated on the display
+class Draw:
+    background = None   # Pre-rendered grid, road, menu panels and legend
+    labelCache = {}     # Rendered label surfaces keyed by font and string
+    labelRects = {}     # Screen area of every dynamic label drawn in the previous frame
+    labelTexts = {}     # String of every dynamic label drawn in the previous frame
+    fullRedraw = True   # Update the whole display in the next frame
+    overlayRect = None  # Screen area of the timing overlay drawn in the previous frame
+    bandPixels = None   # Screen coordinates and angular bin of every heat band pixel
+    bandPalette = None  # Colour of every speed level of the heat band
 
-# Define fonts
-fontTitle = pygame.font.Font('fonts/Roboto-Bold.ttf', 47)
-fontSubTitle = pygame.font.Font('fonts/Roboto-Medium.ttf', 24)
-font = pygame.font.Font('fonts/Roboto-Regular.ttf',24)
-img_cone = pygame.image.load('images/cone.png')
+     # The main draw function, draws the whole simulation
+    def drawSimulation(self, cars, texts, bm, events, obstacles, overlay=None, band=None):
+        screen = Assets.getScreen()
+        for event in events:
+            if event.type in (pygame.VIDEORESIZE, pygame.WINDOWEXPOSED):
+                Draw.fullRedraw = True
+
+        if Draw.background is None:
+            self.drawBackground(self)
+        if Draw.fullRedraw:
+            screen.blit(Draw.background, (0, 0))
+            Draw.labelRects = {}
+            Draw.labelTexts = {}
+
+        # Restore the background below the moving parts
+        dirty = [RING_RECT] + WIDGET_RECTS
+        if Draw.overlayRect is not None:
+            dirty.append(Draw.overlayRect)
+            Draw.overlayRect = None
+        for rect in dirty:
+            screen.blit(Draw.background, rect, rect)
 
-# Load car textures
-img_car = pygame.image.load('images/car.png')
-img_car_breaking = pygame.image.load('images/car_breaking.png')
-img_ac = pygame.image.load('images/ac.png')
-img_ac_breaking = pygame.image.load('images/ac_breaking.png')
+        self.drawSliders(events)
+        if band is not None:
+            self.drawBand(self, band)
+        else:
+            self.drawCars(cars)
+        self.drawObstacle(obstacles)
+        dirty += self.drawMenu(self, texts, bm)
+        if overlay:
+            dirty.append(self.drawOverlay(overlay))
 
-# Draw class is responsible for visualising of the simulation
-class Draw: 
+        if Draw.fullRedraw:
+            pygame.display.flip()
+            Draw.fullRedraw = False
+        else:
+            pygame.display.update(dirty)
 
-     # The main draw function, draws the whole simulation
-    def drawSimulation(self, cars, texts, bm, events, obstacles):
-        SCREEN.fill(WHITE)
+    # Render the static parts of the window once
+    def drawBackground(self):
+        screen = Assets.getScreen()
+        screen.fill(WHITE)
         self.drawGrid()
-        self.drawMenu(self, texts, bm)
-        self.drawSliders(events)
         self.drawCircle()
-        self.drawCars(cars)
-        self.drawObstacle(obstacles)
-        pygame.display.flip()
-        pygame.display.update()
+        self.drawMenuPanels(self)
+        Draw.background = screen.copy()
 
     # Draw the grid       
     def drawGrid():
+        screen = Assets.getScreen()
         blockSize = 40 # Set the size of the grid block
         for x in range(0, SCREEN_WIDTH, blockSize):
             for y in range(0, SCREEN_HEIGHT, blockSize):
                 rect = pygame.Rect(x, y, blockSize, blockSize)
-                pygame.draw.rect(SCREEN, GRAY, rect, 1)
+                pygame.draw.rect(screen, GRAY, rect, 1)
 
     # Draw cars
     def drawCars(cars):
+        screen = Assets.getScreen()
         for car in cars:
             if car.visible:
-                SCREEN.blit(car.rotatedImage , car.rect)
+                screen.blit(car.rotatedImage , car.rect)
+
+    # True if the sprites of the given number of vehicles would overlap on the ring
+    def useBand(n):
+        return n*SPRITE_LENGTH > 2*math.pi*SCREEN_RADIUS
+
+    # Draw the vehicles of the engine as a heat band along the road.
+    # Every angular bin is coloured by the mean speed of its vehicles, relative to the fastest bin,
+    # and blended with the road colour by its density relative to a standing queue (car length plus s0).
+    # The cost depends on the number of road pixels, not on the number of vehicles.
+    def drawBand(self, engine):
+        if Draw.bandPixels is None:
+            self.buildBand()
+        xs, ys, bins = Draw.bandPixels
+
+        b = (engine.getAngles()*(BAND_BINS/(2*math.pi))).astype(int) % BAND_BINS
+        count = self.smoothBins(numpy.bincount(b, minlength=BAND_BINS))
+        speed = self.smoothBins(numpy.bincount(b, weights=engine.speed, minlength=BAND_BINS))/numpy.maximum(count, 1e-9)
+        queue = self.smoothBins(numpy.bincount(b, weights=engine.l + engine.s0, minlength=BAND_BINS))
+        occupancy = numpy.minimum(queue*BAND_BINS/engine.roadLength, 1)
+
+        level = (speed*(len(Draw.bandPalette) - 1)/max(speed.max(), 1e-9)).astype(int)
+        colours = ROAD + occupancy[:, None]*(Draw.bandPalette[level] - ROAD)
+
+        pixels = pygame.surfarray.pixels3d(Assets.getScreen())
+        pixels[xs, ys] = colours[bins]
+        del pixels  # Unlock the screen
+
+    # Average every bin with its neighbours around the ring
+    def smoothBins(values):
+        k = BAND_SMOOTHING
+        padded = numpy.concatenate([values[-k:], values, values[:k]])
+        return numpy.convolve(padded, numpy.ones(2*k + 1)/(2*k + 1), 'same')[k:-k]
+
+    # Find the pixels of the heat band and build the colour palette
+    def buildBand():
+        cx, cy = int(CONST_CIRCLE_CENTRE[0]), int(CONST_CIRCLE_CENTRE[1])
+        r = BAND_RADII[1]
+        xs, ys = numpy.mgrid[cx - r:cx + r + 1, cy - r:cy + r + 1]
+        radius = numpy.hypot(xs - cx, ys - cy)
+        inside = (radius >= BAND_RADII[0]) & (radius < BAND_RADII[1])
+        angle = numpy.mod(numpy.arctan2(ys - cy, xs - cx), 2*math.pi)
+        bins = (angle*(BAND_BINS/(2*math.pi))).astype(int) % BAND_BINS
+        Draw.bandPixels = (xs[inside], ys[inside], bins[inside])
+
+        levels = numpy.linspace(0, 1, 256)
+        stops = numpy.linspace(0, 1, len(BAND_COLOURS))
+        Draw.bandPalette = numpy.column_stack([numpy.interp(levels, stops, [c[i] for c in BAND_COLOURS]) for i in range(3)])
 
     # Draw obstacles
     def drawObstacle(obstacles):
         if not obstacles:
             pass
         else:
+            screen = Assets.getScreen()
             for obstacle in obstacles:
-                SCREEN.blit(img_cone, (obstacle.positionX-10, obstacle.positionY-10))
+                screen.blit(Assets.getImage(IMG_CONE), (obstacle.positionX-10, obstacle.positionY-10))
 
     # Draw the roundabout
     def drawCircle():
-        pygame.draw.circle(SCREEN, (51, 102, 204), CONST_CIRCLE_CENTRE, 320, width=40)
-        pygame.draw.circle(SCREEN, (50, 50, 50), CONST_CIRCLE_CENTRE, 324, width=5)
-        pygame.draw.circle(SCREEN, (50, 50, 50), CONST_CIRCLE_CENTRE, 284, width=5)
+        screen = Assets.getScreen()
+        pygame.draw.circle(screen, (51, 102, 204), CONST_CIRCLE_CENTRE, 320, width=40)
+        pygame.draw.circle(screen, (50, 50, 50), CONST_CIRCLE_CENTRE, 324, width=5)
+        pygame.draw.circle(screen, (50, 50, 50), CONST_CIRCLE_CENTRE, 284, width=5)
 
-    # Draw the user interface and texts
-    def drawMenu(self, texts, bm):
+    # Draw the menu panels, titles and the legend
+    def drawMenuPanels(self):
+        screen = Assets.getScreen()
 
         # Drawing main menu panels
-        pygame.draw.rect(SCREEN, WHITE, pygame.Rect(0, 0, 480, 720))
-        pygame.draw.rect(SCREEN, GRAY, pygame.Rect(0, 0, 480, 52))
-        pygame.draw.rect(SCREEN, GRAY, pygame.Rect(20, 80, 440, 60))
-        pygame.draw.rect(SCREEN, GRAY, pygame.Rect(20, 160, 440, 60))
-        pygame.draw.rect(SCREEN, GRAY, pygame.Rect(20, 240, 440, 60))
-        pygame.draw.rect(SCREEN, GRAY, pygame.Rect(20, 320, 440, 60))
-        pygame.draw.rect(SCREEN, GRAY, pygame.Rect(20, 400, 440, 60))
-        pygame.draw.rect(SCREEN, GRAY, pygame.Rect(20, 480, 440, 60))
-        pygame.draw.rect(SCREEN, GRAY, pygame.Rect(20, 560, 210, 60))
-        pygame.draw.rect(SCREEN, GRAY, pygame.Rect(250, 560, 210, 60))
-        pygame.draw.rect(SCREEN, WHITE, pygame.Rect(1080, 680, 200, 40))
-        pygame.draw.rect(SCREEN, WHITE, pygame.Rect(720, 240, 320, 200))
-        pygame.draw.rect(SCREEN, GRAY, pygame.Rect(720, 240, 320, 40))
+        pygame.draw.rect(screen, WHITE, pygame.Rect(0, 0, 480, 720))
+        pygame.draw.rect(screen, GRAY, pygame.Rect(0, 0, 480, 52))
+        pygame.draw.rect(screen, GRAY, pygame.Rect(20, 80, 440, 60))
+        pygame.draw.rect(screen, GRAY, pygame.Rect(20, 160, 440, 60))
+        pygame.draw.rect(screen, GRAY, pygame.Rect(20, 240, 440, 60))
+        pygame.draw.rect(screen, GRAY, pygame.Rect(20, 320, 440, 60))
+        pygame.draw.rect(screen, GRAY, pygame.Rect(20, 400, 440, 60))
+        pygame.draw.rect(screen, GRAY, pygame.Rect(20, 480, 440, 60))
+        pygame.draw.rect(screen, GRAY, pygame.Rect(20, 560, 210, 60))
+        pygame.draw.rect(screen, GRAY, pygame.Rect(250, 560, 210, 60))
+        pygame.draw.rect(screen, WHITE, pygame.Rect(1080, 680, 200, 40))
 
         # Title
-        title = Text((0, 0),'IDM Traffic Simulator')
-        title.text = fontTitle.render(' IDM Traffic Simulator ', True, BLACK)
-        self.drawText(title)
+        screen.blit(Assets.getFont(*FONT_TITLE).render(' IDM Traffic Simulator ', True, BLACK), (0, 0))
 
         # Traffic Flow
-        text = Text((30, 80),'Traffic Flow Q [cars/min]:')
-        text.text = fontSubTitle.render('Traffic Flow Q [cars/min]:', True, BLACK)
-        self.drawText(text)
+        screen.blit(Assets.getFont(*FONT_SUBTITLE).render('Traffic Flow Q [cars/min]:', True, BLACK), (30, 80))
 
-        text = Text((30, 110),'')
-        text.text = font.render(texts[0], True, BLACK)
-        self.drawText(text)
+        # Parameter noise
+        screen.blit(Assets.getFont(*FONT_SUBTITLE).render('Parameter noise', True, BLACK), (30, 560))
+
+        self.drawLegend()
+
+    # Draw the legend of the road objects
+    def drawLegend():
+        screen = Assets.getScreen()
+        pygame.draw.rect(screen, WHITE, pygame.Rect(720, 240, 320, 200))
+        pygame.draw.rect(screen, GRAY, pygame.Rect(720, 240, 320, 40))
+
+        # Title: legend
+        screen.blit(Assets.getFont(*FONT_SUBTITLE).render('Legend', True, BLACK), (730, 245))
+
+        # Images
+        screen.blit(Assets.getImage(IMG_CAR), (735, 300))
+        screen.blit(Assets.getImage(IMG_CAR_BREAKING), (775, 300))
+        screen.blit(Assets.getImage(IMG_AC), (735, 350))
+        screen.blit(Assets.getImage(IMG_AC_BREAKING), (775, 350))
+        screen.blit(Assets.getImage(IMG_CONE), (785, 400))
+
+        # Titles
+        screen.blit(Assets.getFont(*FONT).render('Default car', True, BLACK), (815, 295))
+        screen.blit(Assets.getFont(*FONT).render('Autonomous car', True, BLACK), (815, 345))
+        screen.blit(Assets.getFont(*FONT).render('Road obstacle', True, BLACK), (815, 395))
+
+    # Draw the labels and buttons of the user interface, returns the updated screen areas
+    def drawMenu(self, texts, bm):
+        dirty = []
+
+        # Traffic Flow
+        dirty += self.drawLabel(self, 'flow', Assets.getFont(*FONT), texts[0], (30, 110))
 
         # Number of cars
-        text = Text((30, 160),'')
-        text.text = fontSubTitle.render('Number of cars: '+ texts[1], True, BLACK)
-        self.drawText(text)
+        dirty += self.drawLabel(self, 'cars', Assets.getFont(*FONT_SUBTITLE), 'Number of cars: '+ texts[1], (30, 160))
 
         # Max speed
-        text = Text((30, 240),'')
-        text.text = fontSubTitle.render('Maximum speed [m/s]: '+ texts[2], True, BLACK)
-        self.drawText(text)
+        dirty += self.drawLabel(self, 'speed', Assets.getFont(*FONT_SUBTITLE), 'Maximum speed [m/s]: '+ texts[2], (30, 240))
 
         # Time gap
-        text = Text((30, 320),'')
-        text.text = fontSubTitle.render('Time gap [s]: '+ texts[3], True, BLACK)
-        self.drawText(text)
+        dirty += self.drawLabel(self, 'gap', Assets.getFont(*FONT_SUBTITLE), 'Time gap [s]: '+ texts[3], (30, 320))
 
         # Max acceleration
-        text = Text((30, 400),'')
-        text.text = fontSubTitle.render('Maximum acceleration [m/s^2]: ' + texts[4], True, BLACK)
-        self.drawText(text)
-
-        # Time multiplier
-        text = Text((30, 480),'')
-        text.text = fontSubTitle.render('Time multiplier: ' + texts[5], True, BLACK)
-        self.drawText(text)
+        dirty += self.drawLabel(self, 'acc', Assets.getFont(*FONT_SUBTITLE), 'Maximum acceleration [m/s^2]: ' + texts[4], (30, 400))
 
-        # Parameter noise
-        text = Text((30, 560),'')
-        text.text = fontSubTitle.render('Parameter noise', True, BLACK)
-        self.drawText(text)
+        # Achieved speed-up and the time multiplier
+        dirty += self.drawLabel(self, 'multiplier', Assets.getFont(*FONT_SUBTITLE), 'Speed-up: ' + texts[5], (30, 480))
 
         # Simulation time
-        text = Text((1090, 685),'')
-        text.text = fontSubTitle.render('Time [s]: ' + texts[6], True, BLACK)
-        self.drawText(text)
+        dirty += self.drawLabel(self, 'time', Assets.getFont(*FONT_SUBTITLE), 'Time [s]: ' + texts[6], (1090, 685))
 
         # Number of AVs
-        text = Text((260, 560),'')
-        text.text = fontSubTitle.render('AV: ' + texts[7] + ' out of ' + texts[1], True, BLACK)
-        self.drawText(text)
-
-        # Title: legend
-        text = Text((730, 245),'')
-        text.text = fontSubTitle.render('Legend', True, BLACK)
-        self.drawText(text)
+        dirty += self.drawLabel(self, 'avs', Assets.getFont(*FONT_SUBTITLE), 'AV: ' + texts[7] + ' out of ' + texts[1], (260, 560))
 
         # Buttons
-        surf = fontSubTitle.render('Quit', True, 'white')
         a,b = pygame.mouse.get_pos()
-        if bm.button_quit.x <= a <= bm.button_quit.x + 210 and bm.button_quit.y <= b <= bm.button_quit.y +60:
-            pygame.draw.rect(SCREEN,(180,180,180),bm.button_quit)
-        else:
-            pygame.draw.rect(SCREEN, (110,110,110),bm.button_quit)
-
-        SCREEN.blit(surf,(bm.button_quit.x + 80, bm.button_quit.y+10))
+        self.drawButton(bm.button_quit, 'Quit', (80, 10), (a, b))
+        self.drawButton(bm.button_reset, 'Reset', (80, 10), (a, b))
+        self.drawButton(bm.button_obstacle, 'Place', (40, 5), (a, b))
+        Assets.getScreen().blit(Assets.getImage(IMG_CONE),(bm.button_obstacle.x+110, bm.button_obstacle.y+10))
+        dirty += [bm.button_quit, bm.button_reset, bm.button_obstacle]
+
+        return dirty
+
+    # Draw a frame of a replay, texts: file name, time, playback state and mean speed
+    # Uses the same background, label and dirty area handling as the simulation
+    def drawReplay(self, cars, texts, bm, events, band=None):
+        screen = Assets.getScreen()
+        for event in events:
+            if event.type in (pygame.VIDEORESIZE, pygame.WINDOWEXPOSED):
+                Draw.fullRedraw = True
+
+        if Draw.background is None:
+            self.drawReplayBackground(self)
+        if Draw.fullRedraw:
+            screen.blit(Draw.background, (0, 0))
+            Draw.labelRects = {}
+            Draw.labelTexts = {}
+
+        # Restore the background below the ring and the time slider
+        dirty = [RING_RECT, WIDGET_RECTS[0]]
+        for rect in dirty:
+            screen.blit(Draw.background, rect, rect)
 
-        surf = fontSubTitle.render('Reset', True, 'white')
-        a,b = pygame.mouse.get_pos()
-        if bm.button_reset.x <= a <= bm.button_reset.x + 210 and bm.button_reset.y <= b <= bm.button_reset.y +60:
-            pygame.draw.rect(SCREEN,(180,180,180),bm.button_reset)
+        self.drawSliders(events)
+        if band is not None:
+            self.drawBand(self, band)
         else:
-            pygame.draw.rect(SCREEN, (110,110,110),bm.button_reset)
+            self.drawCars(cars)
 
-        SCREEN.blit(surf,(bm.button_reset.x + 80, bm.button_reset.y+10))
+        dirty += self.drawLabel(self, 'file', Assets.getFont(*FONT), texts[0], (30, 110))
+        dirty += self.drawLabel(self, 'time', Assets.getFont(*FONT_SUBTITLE), 'Time [s]: ' + texts[1], (30, 160))
+        dirty += self.drawLabel(self, 'playback', Assets.getFont(*FONT_SUBTITLE), 'Playback: ' + texts[2], (30, 240))
+        dirty += self.drawLabel(self, 'speed', Assets.getFont(*FONT_SUBTITLE), 'Mean speed [m/s]: ' + texts[3], (30, 320))
 
-        surf = fontSubTitle.render('Place', True, 'white')
-        a,b = pygame.mouse.get_pos()
-        if bm.button_obstacle.x <= a <= bm.button_obstacle.x + 160 and bm.button_obstacle.y <= b <= bm.button_obstacle.y + 40:
-            pygame.draw.rect(SCREEN,(180,180,180),bm.button_obstacle)
+        self.drawButton(bm.button_quit, 'Quit', (80, 10), pygame.mouse.get_pos())
+        dirty.append(bm.button_quit)
+
+        if Draw.fullRedraw:
+            pygame.display.flip()
+            Draw.fullRedraw = False
         else:
-            pygame.draw.rect(SCREEN, (110,110,110),bm.button_obstacle)
+            pygame.display.update(dirty)
 
-        SCREEN.blit(surf,(bm.button_obstacle.x+40, bm.button_obstacle.y+5))
-        SCREEN.blit(img_cone,(bm.button_obstacle.x+110, bm.button_obstacle.y+10))
-        
-        # -----------------------------------
-        # Legend
-        # -----------------------------------
+    # Render the static parts of the replay window once
+    def drawReplayBackground(self):
+        screen = Assets.getScreen()
+        screen.fill(WHITE)
+        self.drawGrid()
+        self.drawCircle()
 
-        # Images
-        SCREEN.blit(img_car, (735, 300))
-        SCREEN.blit(img_car_breaking, (775, 300))
-        SCREEN.blit(img_ac, (735, 350))
-        SCREEN.blit(img_ac_breaking, (775, 350))
-        SCREEN.blit(img_cone, (785, 400))
+        pygame.draw.rect(screen, WHITE, pygame.Rect(0, 0, 480, 720))
+        pygame.draw.rect(screen, GRAY, pygame.Rect(0, 0, 480, 52))
+        pygame.draw.rect(screen, GRAY, pygame.Rect(20, 80, 440, 60))
+        pygame.draw.rect(screen, GRAY, pygame.Rect(20, 160, 440, 60))
+        pygame.draw.rect(screen, GRAY, pygame.Rect(20, 240, 440, 60))
+        pygame.draw.rect(screen, GRAY, pygame.Rect(20, 320, 440, 60))
+        pygame.draw.rect(screen, GRAY, pygame.Rect(20, 400, 440, 220))
+        screen.blit(Assets.getFont(*FONT_TITLE).render(' IDM Traffic Simulator ', True, BLACK), (0, 0))
+        screen.blit(Assets.getFont(*FONT_SUBTITLE).render('Replay:', True, BLACK), (30, 80))
+
+        # Controls
+        screen.blit(Assets.getFont(*FONT_SUBTITLE).render('Controls', True, BLACK), (30, 400))
+        screen.blit(Assets.getFont(*FONT).render('Space: play / pause', True, BLACK), (30, 440))
+        screen.blit(Assets.getFont(*FONT).render('Left / Right: back / forward 10 s', True, BLACK), (30, 475))
+        screen.blit(Assets.getFont(*FONT).render('Up / Down: faster / slower', True, BLACK), (30, 510))
+        screen.blit(Assets.getFont(*FONT).render('Home / End: first / last frame', True, BLACK), (30, 545))
+        screen.blit(Assets.getFont(*FONT).render('Drag the time slider to seek', True, BLACK), (30, 580))
+
+        self.drawLegend()
+        Draw.background = screen.copy()
+
+    # Draw a whole frame of a video export into the screen surface, texts: title, time, mean speed and AVs
+    # Nothing is shown on the display, the caller reads the pixels of the screen surface
+    def drawExport(self, cars, texts, band=None):
+        screen = Assets.getScreen()
+        if Draw.background is None:
+            self.drawExportBackground(self)
+        screen.blit(Draw.background, (0, 0))
+
+        if band is not None:
+            self.drawBand(self, band)
+        else:
+            self.drawCars(cars)
 
-        # Titles
-        text = Text((815, 295),'')
-        text.text = font.render('Default car', True, BLACK)
-        self.drawText(text)
+        screen.blit(self.renderLabel(Assets.getFont(*FONT), texts[0], BLACK), (30, 110))
+        screen.blit(self.renderLabel(Assets.getFont(*FONT_SUBTITLE), 'Time [s]: ' + texts[1], BLACK), (30, 160))
+        screen.blit(self.renderLabel(Assets.getFont(*FONT_SUBTITLE), 'Mean speed [m/s]: ' + texts[2], BLACK), (30, 240))
+        screen.blit(self.renderLabel(Assets.getFont(*FONT_SUBTITLE), 'AV: ' + texts[3], BLACK), (30, 320))
 
-        text = Text((815, 345),'')
-        text.text = font.render('Autonomous car', True, BLACK)
-        self.drawText(text)
+    # Render the static parts of an exported frame once
+    def drawExportBackground(self):
+        screen = Assets.getScreen()
+        screen.fill(WHITE)
+        self.drawGrid()
+        self.drawCircle()
 
-        text = Text((815, 395),'')
-        text.text = font.render('Road obstacle', True, BLACK)
-        self.drawText(text)
+        pygame.draw.rect(screen, WHITE, pygame.Rect(0, 0, 480, 720))
+        pygame.draw.rect(screen, GRAY, pygame.Rect(0, 0, 480, 52))
+        pygame.draw.rect(screen, GRAY, pygame.Rect(20, 80, 440, 60))
+        pygame.draw.rect(screen, GRAY, pygame.Rect(20, 160, 440, 60))
+        pygame.draw.rect(screen, GRAY, pygame.Rect(20, 240, 440, 60))
+        pygame.draw.rect(screen, GRAY, pygame.Rect(20, 320, 440, 60))
+        screen.blit(Assets.getFont(*FONT_TITLE).render(' IDM Traffic Simulator ', True, BLACK), (0, 0))
+
+        self.drawLegend()
+        Draw.background = screen.copy()
+
+    # Draw a button, highlighted when the mouse is above it
+    def drawButton(button, text, offset, mouse):
+        screen = Assets.getScreen()
+        if button.collidepoint(mouse):
+            pygame.draw.rect(screen,(180,180,180),button)
+        else:
+            pygame.draw.rect(screen, (110,110,110),button)
+
+        screen.blit(Draw.renderLabel(Assets.getFont(*FONT_SUBTITLE), text, 'white'), (button.x + offset[0], button.y + offset[1]))
+
+    # Draw a label which changes during the simulation, returns the updated screen areas
+    # A label is only repainted if its text changed or the ring was repainted over it
+    def drawLabel(self, key, labelFont, text, pos):
+        screen = Assets.getScreen()
+        oldRect = Draw.labelRects.get(key)
+        changed = Draw.labelTexts.get(key) != text
+        if not changed and not oldRect.colliderect(RING_RECT):
+            return []
+
+        surf = self.renderLabel(labelFont, text, BLACK)
+        rect = surf.get_rect(topleft=pos)
+        dirty = [rect]
+        if changed and oldRect is not None:
+            screen.blit(Draw.background, oldRect, oldRect)   # Clear the old text
+            dirty.append(oldRect)
+
+        screen.blit(surf, rect)
+        Draw.labelRects[key] = rect
+        Draw.labelTexts[key] = text
+        return dirty
+
+    # Return the rendered label from the cache, rendering it on the first use
+    def renderLabel(labelFont, text, colour):
+        key = (labelFont, text, colour)
+        if key not in Draw.labelCache:
+            if len(Draw.labelCache) >= LABEL_CACHE_SIZE:
+                Draw.labelCache.clear()
+            Draw.labelCache[key] = labelFont.render(text, True, colour)
+        return Draw.labelCache[key]
+
+    # Draw the timing overlay, a table given as rows of strings, returns the updated screen area
+    def drawOverlay(rows):
+        screen = Assets.getScreen()
+        rect = pygame.Rect(OVERLAY_POS, (OVERLAY_LABEL + OVERLAY_COLUMN*(len(rows[0]) - 1) + 10, OVERLAY_ROW*len(rows) + 10))
+        pygame.draw.rect(screen, WHITE, rect)
+        pygame.draw.rect(screen, GRAY, rect, 1)
+        for i, row in enumerate(rows):
+            for j, text in enumerate(row):
+                x = rect.x + 5 + (OVERLAY_LABEL + OVERLAY_COLUMN*(j - 1) if j else 0)
+                screen.blit(Draw.renderLabel(Assets.getFont(*FONT_SMALL), text, BLACK), (x, rect.y + 5 + OVERLAY_ROW*i))
+        Draw.overlayRect = rect
+        return rect
 
     # Draw and update sliders
     def drawSliders(events):
         pygame_widgets.update(events)
-
-    # Support function for visualising Text objects
-    def drawText(text):
-        SCREEN.blit(text.text, text.textRect)  
-
-# Text class
-class Text:
-    def __init__(self, pos, txt):
-        # Create a font object
-        self.font = pygame.font.Font('freesansbold.ttf', 20)
-        
-        # Create a text surface object, on which text is drawn
-        self.text = self.font.render(txt, True, BLACK, GRAY)
-        
-        # Create a rectangular object for the text surface object
-        self.textRect = self.text.get_rect()
-        
-        self.textRect.topleft = pos # Set the center of the rectangular object
\ No newline at end of file
@@ -0,0 +1,168 @@
+import multiprocessing
+import queue
+import time
+from multiprocessing import shared_memory
+
+import numpy
+
+from engine import RingEngine, FPS
+from simulation import Simulation
+from scheduler import FrameScheduler
+
+DEF_CAPACITY = 1000     # Initial capacity of the shared state buffer, it grows with the ring
+REPLY_TIMEOUT = 5       # Seconds to wait for the result of a call
+DEF_TIME_MULTIPLIER = 10
+
+# Layout of the shared state buffer: header values followed by one row per published array
+HEADER = ['seq', 'n', 'simTime', 'totalLaps', 'wallTime', 'multiplier']
+ARRAYS = ['x', 'speed', 'a', 'autonomous']
+
+# Vehicle state shared between the simulation worker and the GUI.
+# Writes are guarded by a sequence counter which is odd while the worker is writing,
+# readers retry until they see the same even counter before and after copying.
+class StateBuffer:
+    def __init__(self, buf, capacity):
+        self.capacity = capacity
+        self.header = numpy.ndarray(len(HEADER), dtype=numpy.float64, buffer=buf)
+        self.arrays = numpy.ndarray((len(ARRAYS), capacity), dtype=numpy.float64, buffer=buf,
+                                    offset=self.header.nbytes)
+
+    # Size of the buffer in bytes
+    def size(capacity):
+        return 8*(len(HEADER) + len(ARRAYS)*capacity)
+
+    # Publish the state of the simulation
+    def publish(self, sim, multiplier):
+        engine = sim.engine
+        n = min(engine.n, self.capacity)
+        self.header[0] += 1
+        self.header[1:] = [n, sim.simTime, sim.lapCounter.totalLaps, time.monotonic(), multiplier]
+        for row, name in enumerate(ARRAYS):
+            self.arrays[row, :n] = getattr(engine, name)[:n]
+        self.header[0] += 1
+
+    # Return a consistent copy of the header values and the arrays of the published cars
+    def read(self):
+        while True:
+            seq = self.header[0]
+            if not seq % 2:
+                header = dict(zip(HEADER, self.header.tolist()))
+                arrays = self.arrays[:, :int(header['n'])].copy()
+                if self.header[0] == seq:
+                    return header, arrays
+            time.sleep(0)       # Let the worker finish writing
+
+# Apply a command sent by the GUI, returns False when the worker should stop
+def applyCommand(sim, command):
+    kind = command[0]
+    if kind == 'quit':
+        return False
+    if kind == 'cars':
+        sim.engine = RingEngine(*command[1:])     # Number of cars and road radius
+    elif kind == 'reset':
+        sim.simTime = 0
+    elif kind == 'engine':
+        getattr(sim.engine, command[1])(*command[2])
+    elif kind == 'sim':
+        getattr(sim, command[1])(*command[2])
+    return True
+
+# Worker process main loop, advances the simulation at the GUI frame rate and publishes every frame
+# Calls answer on the results queue, a buffer command switches to a larger shared state buffer
+def runWorker(shmName, capacity, commands, results):
+    shm = shared_memory.SharedMemory(name=shmName)
+    state = StateBuffer(shm.buf, capacity)
+    sim = Simulation()
+    multiplier = DEF_TIME_MULTIPLIER     # None lets the scheduler fill the frame budget
+    scheduler = FrameScheduler(FPS)
+    nextFrame = time.monotonic()
+
+    running = True
+    while running:
+        while running:
+            try:
+                command = commands.get_nowait()
+            except queue.Empty:
+                break
+            if command[0] == 'multiplier':
+                multiplier = command[1]
+            elif command[0] == 'call':
+                results.put(getattr(sim.engine, command[1])(*command[2]))
+            elif command[0] == 'buffer':
+                del state
+                shm.close()
+                shm = shared_memory.SharedMemory(name=command[1])
+                state = StateBuffer(shm.buf, command[2])
+            else:
+                running = applyCommand(sim, command)
+
+        steps = scheduler.steps if multiplier is None else multiplier
+        start = time.perf_counter()
+        sim.simStep(steps)
+        stepped = time.perf_counter()
+        state.publish(sim, steps)
+        if multiplier is None:
+            scheduler.update(stepped - start, steps, time.perf_counter() - stepped)
+
+        # Keep the simulated time in step with the wall clock, do not catch up after falling behind
+        nextFrame += 1/FPS
+        delay = nextFrame - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            nextFrame = time.monotonic()
+
+    del state
+    shm.close()
+
+# Owns the worker process, the shared state buffer and the command queue
+class SimWorker:
+    def __init__(self, capacity=DEF_CAPACITY):
+        ctx = multiprocessing.get_context('spawn')
+        self.shm, self.state = self.allocate(capacity)
+        self.retired = []       # Replaced buffers, the worker may not have switched yet
+        self.commands = ctx.Queue()
+        self.results = ctx.Queue()
+        self.process = ctx.Process(target=runWorker, args=(self.shm.name, capacity, self.commands, self.results),
+                                   daemon=True)
+        self.process.start()
+
+    # Create an empty shared state buffer for capacity cars
+    def allocate(self, capacity):
+        shm = shared_memory.SharedMemory(create=True, size=StateBuffer.size(capacity))
+        state = StateBuffer(shm.buf, capacity)
+        state.header[:] = 0
+        return shm, state
+
+    # Send a command to the worker
+    def send(self, *command):
+        self.commands.put(command)
+
+    # Call an engine method in the worker and return its result, None if the worker does not answer in time
+    def call(self, name, *args):
+        self.send('call', name, args)
+        try:
+            return self.results.get(timeout=REPLY_TIMEOUT)
+        except queue.Empty:
+            return None
+
+    # Make room for n cars in the shared state buffer, the worker switches to the new buffer
+    # before its next command, until then readers see an empty ring. The capacity at least doubles.
+    def reserve(self, n):
+        if n <= self.state.capacity:
+            return
+        capacity = max(n, 2*self.state.capacity)
+        shm, state = self.allocate(capacity)
+        self.send('buffer', shm.name, capacity)
+        del self.state
+        self.retired.append(self.shm)
+        self.shm, self.state = shm, state
+
+    # Stop the worker and release the shared memory
+    def close(self):
+        self.send('quit')
+        self.process.join(timeout=5)
+        del self.state
+        for shm in self.retired + [self.shm]:
+            shm.close()
+            shm.unlink()